@@ -0,0 +1,80 @@
+"""Micro-benchmark: pydantic chat models vs. slotted records.
+
+Measures construct, serialize (to a chat_sessions document) and deserialize
+(from a document) throughput for one session of N messages.
+
+    python -m benchmarks.chat_model_benchmark --messages 10000
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.chat_model import ChatRecord, ChatSession, Message, MessageRecord
+
+
+def _best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(n_messages: int, repeat: int):
+    query = '{\n  "collection": "holdings",\n  "operation": "countDocuments"\n}'
+    rows = [
+        ("user" if i % 2 == 0 else "assistant", f"message {i}", [query] if i % 2 else None)
+        for i in range(n_messages)
+    ]
+    now = datetime.utcnow()
+
+    def build_pydantic():
+        session = ChatSession()
+        session.messages = [
+            Message(role=role, content=content, query_used=q) for role, content, q in rows
+        ]
+        return session
+
+    def build_record():
+        record = ChatRecord()
+        record.messages = [MessageRecord(role, content, now, q) for role, content, q in rows]
+        return record
+
+    session = build_pydantic()
+    record = build_record()
+    session_doc = session.to_dict()
+    record_doc = record.to_document()
+
+    cases = [
+        ("construct", build_pydantic, build_record),
+        ("serialize", session.to_dict, record.to_document),
+        (
+            "deserialize",
+            lambda: ChatSession.from_dict(session_doc),
+            lambda: ChatRecord.from_document(record_doc),
+        ),
+    ]
+
+    print(f"{n_messages} messages, best of {repeat}")
+    print(f"{'operation':<12} {'pydantic msg/s':>16} {'slotted msg/s':>16} {'speedup':>8}")
+    for name, pydantic_fn, record_fn in cases:
+        pydantic_s = _best_of(pydantic_fn, repeat)
+        record_s = _best_of(record_fn, repeat)
+        print(
+            f"{name:<12} {n_messages / pydantic_s:>16,.0f} "
+            f"{n_messages / record_s:>16,.0f} {pydantic_s / record_s:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.messages, args.repeat)
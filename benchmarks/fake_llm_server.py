@@ -0,0 +1,98 @@
+"""Local OpenAI-compatible chat completions server with injectable faults.
+
+Used to exercise the LLM client's retries, hedging and circuit breaker without
+calling the real API:
+
+    python benchmarks/fake_llm_server.py --port 8080 --latency-ms 200 \
+        --slow-rate 0.1 --error-rate 0.2 --rate-limit-rate 0.1
+
+    LLM_BASE_URL=http://localhost:8080/v1 streamlit run src/ui/app.py
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def completion(model: str, content: str) -> dict:
+    return {
+        "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+    }
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    config: argparse.Namespace
+
+    def _send(self, status: int, body: dict, headers: dict = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        config = self.config
+
+        if not self.path.endswith("/chat/completions"):
+            self._send(404, {"error": {"message": "not found"}})
+            return
+
+        delay = config.latency_ms
+        if random.random() < config.slow_rate:
+            delay = config.slow_ms
+        time.sleep(delay / 1000)
+
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            self._send(
+                429,
+                {"error": {"message": "rate limited", "type": "rate_limit_error"}},
+                {"Retry-After": str(config.retry_after)},
+            )
+        elif roll < config.rate_limit_rate + config.error_rate:
+            self._send(503, {"error": {"message": "upstream unavailable"}})
+        else:
+            question = next(
+                (m.get("content") for m in reversed(request.get("messages", []))
+                 if m.get("role") == "user"),
+                "",
+            )
+            self._send(200, completion(request.get("model", "fake"), f"Echo: {question}"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--slow-ms", type=float, default=5000)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1)
+    args = parser.parse_args()
+
+    FakeLLMHandler.config = args
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), FakeLLMHandler)
+    print(f"Fake LLM server on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,147 @@
+"""In-process caches shared by the tools."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from src.core.cache_store import CacheStore
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl_seconds``.
+
+    With a ``store`` factory, entries are also mirrored to disk and can be
+    restored after a restart with ``warm``. The store is only created on the
+    first write or ``warm``, so importing a module that defines a cache never
+    touches the disk.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        ttl_seconds: float,
+        store: Optional[Callable[[], Optional["CacheStore"]]] = None,
+    ):
+        self.name = name
+        self._store_factory = store
+        self._store: Optional["CacheStore"] = None
+        self._store_lock = threading.Lock()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, value, tag); the tag describes what the entry
+        # depends on so it can be evicted selectively.
+        self._data: "OrderedDict[str, Tuple[float, Any, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    @property
+    def store(self) -> Optional["CacheStore"]:
+        if self._store_factory is not None:
+            with self._store_lock:
+                if self._store_factory is not None:
+                    factory, self._store_factory = self._store_factory, None
+                    # Called once: a failing store leaves the cache memory-only.
+                    self._store = factory()
+        return self._store
+
+    def set(
+        self, key: str, value: Any, ttl_seconds: Optional[float] = None, tag: Any = None
+    ):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._insert(key, value, ttl, tag)
+        if self.store is not None:
+            self.store.put(self.name, key, value, tag, ttl)
+
+    def _insert_locked(self, key: str, value: Any, ttl: float, tag: Any) -> List[str]:
+        self._data[key] = (time.monotonic() + ttl, value, tag)
+        self._data.move_to_end(key)
+        dropped = []
+        while len(self._data) > self.max_entries:
+            dropped.append(self._data.popitem(last=False)[0])
+        return dropped
+
+    def _insert(self, key: str, value: Any, ttl: float, tag: Any):
+        with self._lock:
+            dropped = self._insert_locked(key, value, ttl, tag)
+        if dropped and self.store is not None:
+            # The disk copy mirrors memory, so invalidation reaches every entry.
+            self.store.delete(self.name, dropped)
+
+    def warm(self, is_valid: Callable[[Any], bool]) -> int:
+        """Reload persisted entries whose tag passes ``is_valid``; returns the count."""
+        store = self.store
+        if store is None:
+            return 0
+        loaded, stale, dropped = 0, [], []
+        # Oldest first, so the newest entries end up most recently used.
+        for key, value, tag, ttl in reversed(store.load(self.name, self.max_entries)):
+            if not is_valid(tag):
+                stale.append(key)
+                continue
+            with self._lock:
+                # A result computed since startup is newer than the disk copy.
+                if key in self._data:
+                    continue
+                dropped.extend(self._insert_locked(key, value, ttl, tag))
+            loaded += 1
+        store.delete(self.name, stale + dropped)
+        return loaded
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.store is not None:
+            self.store.delete(self.name, [key])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.store is not None:
+            self.store.clear(self.name)
+
+    def evict_where(self, predicate: Callable[[Any], bool]) -> int:
+        """Drop every entry whose tag matches ``predicate``; returns the count."""
+        with self._lock:
+            stale = [key for key, (_, _, tag) in self._data.items() if predicate(tag)]
+            for key in stale:
+                del self._data[key]
+            self.evictions += len(stale)
+        if stale and self.store is not None:
+            self.store.delete(self.name, stale)
+        return len(stale)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
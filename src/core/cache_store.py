@@ -0,0 +1,192 @@
+"""On-disk copy of in-process caches, for warm starts after a restart.
+
+Entries written to a persistent ``TTLCache`` are mirrored into a local SQLite
+file by a background writer thread, off the request path. On startup the
+cache reloads the most recent unexpired rows in the background, keeping only
+those whose tag still matches the live data version. A redeploy therefore
+starts with yesterday's morning queries already answered instead of
+recomputing them.
+
+Writes made outside ingestion while the app was down do not change the data
+version, so restored entries are still bounded by their remaining TTL.
+"""
+
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+from bson import json_util
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    cache TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    tag TEXT,
+    expires_at REAL NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (cache, key)
+)
+"""
+
+
+class CacheStore:
+
+    def __init__(self, path: str, flush_seconds: Optional[float] = None):
+        self.path = path
+        self.flush_seconds = (
+            settings.cache_store_flush_seconds if flush_seconds is None else flush_seconds
+        )
+        self._queue: "queue.Queue[Tuple[str, Any]]" = queue.Queue(maxsize=10_000)
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.loaded = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        # Several app processes may share the file.
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop, name="cache-store", daemon=True
+                )
+                self._writer.start()
+
+    def _submit(self, op: str, payload: Any):
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((op, payload))
+        except queue.Full:
+            # Persistence is best effort; never block a request on disk.
+            self.dropped += 1
+
+    def put(self, cache: str, key: str, value: Any, tag: Any, ttl_seconds: float):
+        try:
+            row = (
+                cache,
+                key,
+                json.dumps(value, separators=(",", ":")),
+                json_util.dumps(tag),
+                time.time() + ttl_seconds,
+                time.time(),
+            )
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Not persisting {cache} entry: {e}")
+            return
+        self._submit("put", row)
+
+    def delete(self, cache: str, keys: Iterable[str]):
+        keys = list(keys)
+        if keys:
+            self._submit("delete", (cache, keys))
+
+    def clear(self, cache: str):
+        self._submit("clear", cache)
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._apply(conn, batch)
+            except sqlite3.Error as e:
+                logger.warning(f"Cache store write failed: {e}")
+
+    def _apply(self, conn: sqlite3.Connection, batch: List[Tuple[str, Any]]):
+        with conn:
+            for op, payload in batch:
+                if op == "put":
+                    conn.execute(
+                        "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?, ?)",
+                        payload,
+                    )
+                    self.written += 1
+                elif op == "delete":
+                    cache, keys = payload
+                    conn.executemany(
+                        "DELETE FROM cache_entries WHERE cache = ? AND key = ?",
+                        [(cache, key) for key in keys],
+                    )
+                elif op == "clear":
+                    conn.execute("DELETE FROM cache_entries WHERE cache = ?", (payload,))
+
+    def load(self, cache: str, limit: int) -> List[Tuple[str, Any, Any, float]]:
+        """Newest unexpired entries as (key, value, tag, remaining_ttl)."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM cache_entries WHERE cache = ? AND expires_at < ?", (cache, now)
+            )
+            rows = conn.execute(
+                "SELECT key, value, tag, expires_at FROM cache_entries "
+                "WHERE cache = ? ORDER BY stored_at DESC LIMIT ?",
+                (cache, limit),
+            ).fetchall()
+        entries = []
+        for key, value, tag, expires_at in rows:
+            try:
+                entries.append((key, json.loads(value), json_util.loads(tag), expires_at - now))
+            except ValueError:
+                continue
+        self.loaded += len(entries)
+        return entries
+
+    def get_stats(self):
+        return {
+            "written": self.written,
+            "loaded": self.loaded,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+        }
+
+
+_cache_store: Optional[CacheStore] = None
+_cache_store_failed = False
+_cache_store_lock = threading.Lock()
+
+
+def get_cache_store() -> Optional[CacheStore]:
+    """The shared store, or None when ``CACHE_STORE_PATH`` is empty or unusable."""
+    global _cache_store, _cache_store_failed
+    if not settings.cache_store_path:
+        return None
+    with _cache_store_lock:
+        if _cache_store is None and not _cache_store_failed:
+            try:
+                _cache_store = CacheStore(settings.cache_store_path)
+            except (sqlite3.Error, OSError) as e:
+                # e.g. a read-only data directory; warm starts are optional,
+                # so stay disabled instead of failing every cache write.
+                _cache_store_failed = True
+                logger.warning(f"Cache store unavailable ({e}); caches start cold")
+        return _cache_store
@@ -0,0 +1,230 @@
+"""Invalidation events for caches and rollups built on the data collections.
+
+A background thread follows a MongoDB change stream on ``holdings`` and
+``trades`` and publishes one ``ChangeEvent`` per write, carrying the affected
+portfolio and date when the changed document shows them. Subscribers (the
+tool-result cache, the time-series rollups, the schema catalogue) evict or
+refresh only what the event touches, so writes made outside ingestion no
+longer leave stale answers behind.
+
+Standalone servers have no change streams. There the watcher falls back to
+polling ``data_versions`` and publishes collection-wide events on each reload.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from src.core.config import settings
+from src.core.database import get_db
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ["holdings", "trades"]
+
+# Field giving the business date of a document in each collection.
+DATE_FIELDS = {"holdings": "AsOfDate", "trades": "TradeDate"}
+
+PORTFOLIO_FIELD = "PortfolioName"
+
+# Whole-collection operations: a reload, or anything that replaced the data.
+COLLECTION_OPERATIONS = {"drop", "rename", "dropDatabase", "invalidate", "reload"}
+
+# "$changeStream stage is only supported on replica sets"
+CHANGE_STREAMS_UNSUPPORTED = {40573, 40324}
+CHANGE_STREAM_HISTORY_LOST = 286
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """A write to ``collection``; None portfolio/date means "any"."""
+
+    collection: str
+    operation: str
+    portfolio: Optional[str] = None
+    date: Optional[datetime] = None
+
+    @property
+    def collection_wide(self) -> bool:
+        return self.operation in COLLECTION_OPERATIONS
+
+
+def event_from_change(change: Dict[str, Any]) -> Optional[ChangeEvent]:
+    operation = change.get("operationType", "")
+    namespace = change.get("ns") or {}
+    collection = namespace.get("coll")
+    if operation == "rename":
+        # Ingestion swaps staging collections in by renaming them.
+        collection = (change.get("to") or {}).get("coll")
+    if collection not in WATCHED_COLLECTIONS:
+        return None
+    if operation in COLLECTION_OPERATIONS:
+        return ChangeEvent(collection, operation)
+
+    document = change.get("fullDocument") or {}
+    date_field = DATE_FIELDS.get(collection, "")
+    portfolio = document.get(PORTFOLIO_FIELD)
+    date = document.get(date_field)
+    # Without pre-images an update or replace moving a row to another
+    # portfolio or date only shows the new values, so the old ones are unknown.
+    before = change.get("fullDocumentBeforeChange")
+    if operation == "replace":
+        changed = {PORTFOLIO_FIELD, date_field}
+    else:
+        changed = set((change.get("updateDescription") or {}).get("updatedFields") or {})
+    if before is not None:
+        # Pre-images enabled: only fields whose value really changed count.
+        changed = {name for name in changed if before.get(name) != document.get(name)}
+    if PORTFOLIO_FIELD in changed:
+        portfolio = None
+    if date_field in changed:
+        date = None
+    return ChangeEvent(
+        collection,
+        operation,
+        portfolio if isinstance(portfolio, str) else None,
+        date if isinstance(date, datetime) else None,
+    )
+
+
+class ChangeWatcher:
+
+    def __init__(self, collections: Optional[List[str]] = None):
+        self.collections = collections or WATCHED_COLLECTIONS
+        self.enabled = settings.change_watch_enabled
+        self.poll_seconds = settings.change_poll_seconds
+        self.pre_images = settings.change_watch_pre_images
+
+        self._subscribers: List[Callable[[ChangeEvent], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._resume_token: Optional[Dict[str, Any]] = None
+
+        self.mode = "stopped"
+        self.events = 0
+        self.errors = 0
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None]):
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+
+    def publish(self, event: ChangeEvent):
+        self.events += 1
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Change subscriber {callback!r} failed on {event}: {e}")
+
+    def start(self):
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="change-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.mode = "stopped"
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                self._watch()
+                return
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    logger.warning(
+                        "Change streams need a replica set; polling data_versions "
+                        f"every {self.poll_seconds}s instead (only reloads are seen)"
+                    )
+                    self._poll()
+                    return
+                if e.code == CHANGE_STREAM_HISTORY_LOST:
+                    # Events were missed: everything may be stale.
+                    self._resume_token = None
+                    self._publish_all("invalidate")
+                self.errors += 1
+                logger.warning(f"Change stream failed: {e}; retrying in {backoff:.0f}s")
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Change stream failed: {e}; retrying in {backoff:.0f}s")
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def _watch(self):
+        db = get_db()
+        pipeline = [
+            {
+                "$match": {
+                    "$or": [
+                        {"ns.coll": {"$in": self.collections}},
+                        {"to.coll": {"$in": self.collections}},
+                    ]
+                }
+            }
+        ]
+        options: Dict[str, Any] = {}
+        if self.pre_images:
+            options["full_document_before_change"] = "whenAvailable"
+        with db.db.watch(
+            pipeline,
+            full_document="updateLookup",
+            resume_after=self._resume_token,
+            max_await_time_ms=1000,
+            **options,
+        ) as stream:
+            self.mode = "change_stream"
+            logger.info(f"Watching changes on {', '.join(self.collections)}")
+            while not self._stop.is_set():
+                change = stream.try_next()
+                if change is None:
+                    continue
+                self._resume_token = stream.resume_token
+                event = event_from_change(change)
+                if event is not None:
+                    self.publish(event)
+
+    def _poll(self):
+        self.mode = "polling"
+        db = get_db()
+        last = db.get_live_data_versions(max_age_ms=0)
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                versions = db.get_live_data_versions(max_age_ms=0)
+            except PyMongoError as e:
+                self.errors += 1
+                logger.warning(f"Polling data_versions failed: {e}")
+                continue
+            for collection in self.collections:
+                if versions.get(collection) != last.get(collection):
+                    self.publish(ChangeEvent(collection, "reload"))
+            last = versions
+
+    def _publish_all(self, operation: str):
+        for collection in self.collections:
+            self.publish(ChangeEvent(collection, operation))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "events": self.events, "errors": self.errors}
+
+
+change_watcher = ChangeWatcher()
+
+
+def get_change_watcher() -> ChangeWatcher:
+    return change_watcher
@@ -1,3 +1,4 @@
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
@@ -75,3 +76,109 @@ class ChatSession(BaseModel):
             created_at=data.get("created_at", datetime.utcnow()),
             updated_at=data.get("updated_at", datetime.utcnow()),
         )
+
+
+# Lightweight records for the request hot path. They map one-to-one onto the
+# documents in chat_sessions and convert without validation or copying; the
+# pydantic models above remain the validating representation.
+
+
+@dataclass(slots=True)
+class MessageRecord:
+
+    role: str
+    content: Optional[str]
+    timestamp: datetime
+    query_used: Optional[Any] = None
+    data: Optional[List[Dict[str, Any]]] = None
+    # Answer diagnostics, set on assistant messages only.
+    success: Optional[bool] = None
+    latency_ms: Optional[float] = None
+    failed_queries: Optional[List[str]] = None
+
+    def to_document(self) -> Dict[str, Any]:
+        doc = {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": self.timestamp,
+            "query_used": self.query_used,
+            "data": self.data,
+        }
+        if self.role == "assistant":
+            doc["success"] = self.success
+            doc["latency_ms"] = self.latency_ms
+            doc["failed_queries"] = self.failed_queries
+        return doc
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "MessageRecord":
+        return cls(
+            doc["role"],
+            doc.get("content"),
+            doc.get("timestamp"),
+            doc.get("query_used"),
+            doc.get("data"),
+            doc.get("success"),
+            doc.get("latency_ms"),
+            doc.get("failed_queries"),
+        )
+
+
+@dataclass(slots=True)
+class ChatRecord:
+
+    id: Optional[str] = None
+    title: str = "New Chat"
+    messages: List[MessageRecord] = field(default_factory=list)
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    updated_at: datetime = field(default_factory=datetime.utcnow)
+    # Messages appended since the record was loaded, written with $push.
+    pending: List[MessageRecord] = field(default_factory=list)
+
+    def add_message(
+        self,
+        role: str,
+        content: str,
+        query_used: Optional[Any] = None,
+        data: Optional[List[Dict[str, Any]]] = None,
+        now: Optional[datetime] = None,
+        **diagnostics: Any,
+    ) -> MessageRecord:
+        now = now or datetime.utcnow()
+        message = MessageRecord(role, content, now, query_used, data, **diagnostics)
+        self.messages.append(message)
+        self.pending.append(message)
+        self.updated_at = now
+
+        if role == "user" and len(self.messages) == 1:
+            self.title = content
+        return message
+
+    def history(self) -> List[Dict[str, Optional[str]]]:
+        return [{"role": m.role, "content": m.content} for m in self.messages]
+
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "title": self.title,
+            "messages": [m.to_document() for m in self.messages],
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    def pending_update(self) -> Dict[str, Any]:
+        """Update that appends only the new messages instead of rewriting all."""
+        return {
+            "$push": {"messages": {"$each": [m.to_document() for m in self.pending]}},
+            "$set": {"title": self.title, "updated_at": self.updated_at},
+        }
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "ChatRecord":
+        chat_id = doc.get("_id")
+        return cls(
+            str(chat_id) if chat_id is not None else None,
+            doc.get("title", "New Chat"),
+            [MessageRecord.from_document(m) for m in doc.get("messages", [])],
+            doc.get("created_at") or datetime.utcnow(),
+            doc.get("updated_at") or datetime.utcnow(),
+        )
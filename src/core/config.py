@@ -20,7 +20,94 @@ class Settings(BaseSettings):
     llm_temperature: float = 0.1
     llm_max_tokens: int = 2048
 
-    allowed_collections: list[str] = ["holdings", "trades"]
+    llm_base_url: Optional[str] = None
+    llm_attempt_timeout_seconds: float = 30.0
+    llm_connect_timeout_seconds: float = 5.0
+    llm_max_retries: int = 3
+    llm_backoff_base_seconds: float = 0.5
+    llm_backoff_max_seconds: float = 8.0
+    llm_retry_after_max_seconds: float = 30.0
+    llm_hedge_enabled: bool = False
+    llm_hedge_min_delay_ms: int = 2000
+    llm_breaker_failure_threshold: int = 5
+    llm_breaker_reset_seconds: float = 30.0
+
+    model_routing_enabled: bool = True
+    # Unset tiers use llm_model / llm_max_tokens.
+    llm_model_fast: Optional[str] = None
+    llm_max_tokens_fast: Optional[int] = None
+    llm_model_advanced: Optional[str] = None
+    llm_max_tokens_advanced: Optional[int] = None
+    model_escalate_after_errors: int = 1
+
+    llm_max_turns: int = 5
+    llm_max_prompt_tokens: int = 16000
+    tool_result_compact_chars: int = 1500
+    tool_result_compact_rows: int = 5
+
+    data_version_ttl_ms: int = 1000
+
+    # Safe to raise when the change watcher runs on a replica set.
+    query_cache_ttl_seconds: int = 300
+    query_cache_max_entries: int = 512
+    cache_store_path: str = "data/cache.sqlite3"  # empty disables warm starts
+    cache_store_flush_seconds: float = 1.0
+
+    change_watch_enabled: bool = True
+    change_poll_seconds: float = 5.0
+    # Needs MongoDB 6.0+ and changeStreamPreAndPostImages on the collections.
+    change_watch_pre_images: bool = False
+    rollup_refresh_debounce_seconds: float = 5.0
+
+    prefetch_enabled: bool = True
+    prefetch_max_workers: int = 2
+    prefetch_max_queries_per_minute: int = 30
+    prefetch_top_k: int = 3
+    prefetch_min_support: int = 2
+    prefetch_history_sessions: int = 500
+    prefetch_refresh_seconds: int = 900
+
+    scheduler_max_concurrent_llm: int = 4
+    scheduler_max_queue: int = 32
+    scheduler_max_wait_seconds: float = 20.0
+    user_llm_tokens_per_minute: int = 60000
+    user_db_cost_per_minute: int = 120
+    llm_tokens_per_question_estimate: int = 4000
+
+    fast_path_enabled: bool = True
+    fast_path_min_confidence: float = 0.75
+
+    few_shot_top_k: int = 3
+
+    schema_sample_size: int = 1000
+    schema_enum_max_values: int = 25
+
+    ingest_workers: int = 0  # 0 = one per CPU core
+    ingest_chunk_mb: int = 32
+    ingest_batch_size: int = 1000
+    ingest_intermediate_dir: str = "data/intermediate"  # empty disables
+
+    result_inline_rows: int = 50
+
+    summarize_threshold_rows: int = 200
+    summary_sample_rows: int = 5
+    summary_top_k: int = 5
+    summary_histogram_buckets: int = 5
+
+    page_cursor_ttl_seconds: float = 120.0
+    page_cursor_max_open: int = 64
+
+    chat_list_page_size: int = 20
+    chat_list_cache_ttl_seconds: int = 30
+
+    chat_render_window: int = 20
+
+    allowed_collections: list[str] = [
+        "holdings",
+        "trades",
+        "holdings_timeseries",
+        "portfolio_timeseries",
+    ]
     allowed_operations: list[str] = ["find", "aggregate", "countDocuments", "distinct"]
 
     class Config:
@@ -1,18 +1,36 @@
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument
 from pymongo.database import Database
 from pymongo.collection import Collection
-from typing import Optional
+from typing import Dict, Iterator, Optional
+from datetime import datetime, timezone
+import contextlib
+import contextvars
 import logging
+import threading
+import time
 from src.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Collections rebuilt from another one share its data version.
+DERIVED_COLLECTIONS = {
+    "holdings_timeseries": "holdings",
+    "portfolio_timeseries": "holdings",
+}
+
+_pinned_versions: contextvars.ContextVar[Optional[Dict[str, int]]] = (
+    contextvars.ContextVar("pinned_data_versions", default=None)
+)
+
 
 class MongoDB:
     
     def __init__(self):
         self.client: Optional[MongoClient] = None
         self.db: Optional[Database] = None
+        self._versions_lock = threading.Lock()
+        self._versions_read_at = 0.0
+        self._versions: Dict[str, int] = {}
         
     def connect(self):
         try:
@@ -28,6 +46,12 @@ class MongoDB:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
     
+    def ensure_indexes(self):
+        # Sidebar listing pages through sessions newest-first by keyset.
+        self.chat_sessions.create_index(
+            [("updated_at", DESCENDING), ("_id", DESCENDING)]
+        )
+
     def disconnect(self):
         if self.client:
             self.client.close()
@@ -46,10 +70,92 @@ class MongoDB:
     def trades(self) -> Collection:
         return self.get_collection("trades")
     
+    @property
+    def holdings_timeseries(self) -> Collection:
+        return self.get_collection("holdings_timeseries")
+
+    @property
+    def portfolio_timeseries(self) -> Collection:
+        return self.get_collection("portfolio_timeseries")
+
     @property
     def chat_sessions(self) -> Collection:
         return self.get_collection("chat_sessions")
 
+    @property
+    def data_versions(self) -> Collection:
+        return self.get_collection("data_versions")
+
+    @property
+    def schema_catalog(self) -> Collection:
+        return self.get_collection("schema_catalog")
+
+    def get_live_data_versions(self, max_age_ms: Optional[int] = None) -> Dict[str, int]:
+        """Read the version registry, reusing a read younger than ``max_age_ms``."""
+        if max_age_ms is None:
+            max_age_ms = settings.data_version_ttl_ms
+        with self._versions_lock:
+            if (time.monotonic() - self._versions_read_at) * 1000 < max_age_ms:
+                return dict(self._versions)
+
+        versions = {doc["_id"]: doc["version"] for doc in self.data_versions.find({})}
+        with self._versions_lock:
+            self._versions = versions
+            self._versions_read_at = time.monotonic()
+        return dict(versions)
+
+    def get_data_versions(self) -> Dict[str, int]:
+        """Versions pinned for the current run, or the live ones outside a run."""
+        pinned = _pinned_versions.get()
+        if pinned is not None:
+            return pinned
+        return self.get_live_data_versions()
+
+    def get_data_version(self, collection: str) -> int:
+        source = DERIVED_COLLECTIONS.get(collection, collection)
+        return self.get_data_versions().get(source, 0)
+
+    def is_version_current(self, collection: str, max_age_ms: Optional[int] = None) -> bool:
+        source = DERIVED_COLLECTIONS.get(collection, collection)
+        return self.get_data_version(collection) == self.get_live_data_versions(
+            max_age_ms
+        ).get(source, 0)
+
+    def bump_data_version(self, collection: str) -> int:
+        doc = self.data_versions.find_one_and_update(
+            {"_id": collection},
+            {
+                "$inc": {"version": 1},
+                "$set": {"updated_at": datetime.now(timezone.utc)},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        with self._versions_lock:
+            self._versions_read_at = 0.0
+        logger.info(f"Data version of {collection} is now {doc['version']}")
+        return doc["version"]
+
+    def swap_collection(self, staging: str, target: str):
+        """Atomically replace ``target`` with the fully loaded ``staging`` collection."""
+        self.get_collection(staging).rename(target, dropTarget=True)
+        logger.info(f"Swapped {staging} into {target}")
+
+    @contextlib.contextmanager
+    def pin_data_versions(self) -> Iterator[Dict[str, int]]:
+        """Pin the data versions seen by everything inside the block."""
+        pinned = _pinned_versions.get()
+        if pinned is not None:
+            yield pinned
+            return
+
+        versions = self.get_live_data_versions(max_age_ms=0)
+        token = _pinned_versions.set(versions)
+        try:
+            yield versions
+        finally:
+            _pinned_versions.reset(token)
+
 
 mongodb = MongoDB()
 
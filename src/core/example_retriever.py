@@ -0,0 +1,71 @@
+"""Lexical retrieval of few-shot query examples.
+
+A small BM25 index over the example questions picks the examples closest to
+the user's question so they can be injected into the prompt.
+"""
+
+import math
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from src.core.config import settings
+from src.core.text_utils import tokenize
+from src.prompts.query_examples import QUERY_EXAMPLES
+
+
+class ExampleRetriever:
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, examples: Optional[List[Dict[str, Any]]] = None):
+        self.examples = examples if examples is not None else QUERY_EXAMPLES
+        self.top_k = settings.few_shot_top_k
+
+        self._docs = [Counter(self._document_tokens(e)) for e in self.examples]
+        self._lengths = [sum(doc.values()) for doc in self._docs]
+        self._avg_length = (
+            sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        )
+
+        doc_freq: Counter = Counter()
+        for doc in self._docs:
+            doc_freq.update(doc.keys())
+        n = len(self._docs)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    @staticmethod
+    def _document_tokens(example: Dict[str, Any]) -> List[str]:
+        # The collection name helps "trade" questions find trade examples.
+        return tokenize(example["question"]) + [example["tool_call"]["collection"]]
+
+    def _score(self, query_terms: List[str], index: int) -> float:
+        doc = self._docs[index]
+        norm = self.K1 * (1 - self.B + self.B * self._lengths[index] / self._avg_length)
+        score = 0.0
+        for term in query_terms:
+            tf = doc.get(term)
+            if tf:
+                score += self._idf[term] * tf * (self.K1 + 1) / (tf + norm)
+        return score
+
+    def retrieve(self, question: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        k = self.top_k if k is None else k
+        query_terms = tokenize(question)
+        if not query_terms or k <= 0:
+            return []
+
+        scored = [(self._score(query_terms, i), i) for i in range(len(self.examples))]
+        scored = [item for item in scored if item[0] > 0]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [self.examples[i] for _, i in scored[:k]]
+
+
+example_retriever = ExampleRetriever()
+
+
+def get_example_retriever() -> ExampleRetriever:
+    return example_retriever
@@ -0,0 +1,445 @@
+"""Deterministic fast path for common questions.
+
+Questions that always map to the same simple query (counts, top-N rankings,
+totals) are matched against a catalogue of parameterized templates and
+answered directly, skipping the LLM. Anything the router is not confident
+about falls through to ``LLMEngine``.
+"""
+
+import json
+import logging
+import re
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.core.config import settings
+from src.core.database import get_db
+from src.core.scheduler import SchedulerBusy
+from src.core.schema_catalog import get_schema_catalog
+from src.core.text_utils import normalize_question
+from src.tools.mongodb_tool import execute_mongodb_query
+
+logger = logging.getLogger(__name__)
+
+PL_FIELDS = {"dtd": "PL_DTD", "mtd": "PL_MTD", "qtd": "PL_QTD", "ytd": "PL_YTD"}
+
+_PORTFOLIO = r"(?: (?:in|for) (?:the )?(?P<portfolio>.+?)(?: portfolio| fund)?)?"
+_DATE = r"(?: (?:on|as of) (?P<date>\d{4}-\d{2}-\d{2}))?"
+
+
+def _format_number(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return str(value)
+
+
+def _scope(slots: Dict[str, Any]) -> str:
+    parts = []
+    if slots.get("portfolio"):
+        parts.append(f" in {slots['portfolio']}")
+    if slots.get("date"):
+        parts.append(f" on {slots['date'].strftime('%Y-%m-%d')}")
+    return "".join(parts)
+
+
+def _holdings_filter(slots: Dict[str, Any], active: bool = True) -> Dict[str, Any]:
+    match: Dict[str, Any] = {"CloseDate": None} if active else {}
+    if slots.get("portfolio"):
+        match["PortfolioName"] = slots["portfolio"]
+    if slots.get("date"):
+        match["AsOfDate"] = slots["date"]
+    return match
+
+
+def _trades_filter(slots: Dict[str, Any]) -> Dict[str, Any]:
+    match: Dict[str, Any] = {}
+    if slots.get("portfolio"):
+        match["PortfolioName"] = slots["portfolio"]
+    if slots.get("date"):
+        match["TradeDate"] = slots["date"]
+    return match
+
+
+def _date_conditions(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Top-level filter fields the query compares to a date or to null."""
+    query = params["query"]
+    if isinstance(query, list):
+        query = query[0].get("$match", {}) if query else {}
+    return {
+        name: value
+        for name, value in query.items()
+        if value is None or isinstance(value, datetime)
+    }
+
+
+class IntentTemplate:
+
+    def __init__(
+        self,
+        name: str,
+        pattern: str,
+        build_query: Callable[[Dict[str, Any]], Dict[str, Any]],
+        render_answer: Callable[[List[Dict[str, Any]], Dict[str, Any]], str],
+    ):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.build_query = build_query
+        self.render_answer = render_answer
+
+
+def _render_active_count(data, slots):
+    count = data[0]["count"] if data else 0
+    return (
+        f"There are {_format_number(count)} active holdings{_scope(slots)} "
+        f"(positions without a close date)."
+    )
+
+
+def _render_trade_count(data, slots):
+    count = data[0]["count"] if data else 0
+    return f"There are {_format_number(count)} trades{_scope(slots)}."
+
+
+def _render_trades_by_type(data, slots):
+    if not data:
+        return f"No trades were found{_scope(slots)}."
+    lines = [f"- {row['_id']}: {_format_number(row['count'])}" for row in data]
+    return f"Number of trades by type{_scope(slots)}:\n\n" + "\n".join(lines)
+
+
+def _render_top_holdings(data, slots):
+    if not data:
+        return f"No active holdings were found{_scope(slots)}."
+    lines = [
+        f"{i}. {row.get('SecName')} ({row.get('PortfolioName')}, "
+        f"{row.get('SecurityTypeName')}): {_format_number(row.get('MV_Base'))}"
+        for i, row in enumerate(data, start=1)
+    ]
+    return (
+        f"Top {len(data)} active holdings by market value (base currency)"
+        f"{_scope(slots)}:\n\n" + "\n".join(lines)
+    )
+
+
+def _render_total_pl(data, slots):
+    total = data[0]["total"] if data else 0
+    scope = _scope(slots) or " across all portfolios"
+    return (
+        f"The total {slots['metric'].upper()} P&L{scope} is "
+        f"{_format_number(float(total))} (active positions only)."
+    )
+
+
+def _render_security_types(data, slots):
+    values = sorted(v for v in (data[0]["values"] if data else []) if v)
+    if not values:
+        return "No active security types were found."
+    return (
+        f"We currently hold {len(values)} security types: " + ", ".join(values) + "."
+    )
+
+
+def _render_portfolio_ranking(data, slots):
+    if not data:
+        return "No active positions were found."
+    metric = slots["metric"].upper()
+    lines = [
+        f"{i}. {row['_id']}: {_format_number(float(row['total']))}"
+        for i, row in enumerate(data, start=1)
+    ]
+    return (
+        f"Top {len(data)} portfolios by {metric} P&L (active positions):\n\n"
+        + "\n".join(lines)
+    )
+
+
+INTENT_TEMPLATES = [
+    IntentTemplate(
+        "active_holdings_count",
+        r"how many (?:active|current|open) (?:holdings|positions)"
+        r"(?: do we have| are there| do we hold)?" + _PORTFOLIO + _DATE,
+        lambda s: {
+            "collection": "holdings",
+            "operation": "countDocuments",
+            "query": _holdings_filter(s),
+        },
+        _render_active_count,
+    ),
+    IntentTemplate(
+        "trades_by_type",
+        r"(?:count (?:the )?(?:number of )?|how many )trades(?: are there)?"
+        r" (?:by|per|for each) (?:trade )?type" + _PORTFOLIO + _DATE,
+        lambda s: {
+            "collection": "trades",
+            "operation": "aggregate",
+            "query": [
+                {"$match": _trades_filter(s)},
+                {"$group": {"_id": "$TradeTypeName", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+            ],
+        },
+        _render_trades_by_type,
+    ),
+    IntentTemplate(
+        "trade_count",
+        r"how many trades(?: did (?:we|i) make| were made| are there| do we have)?"
+        + _PORTFOLIO
+        + _DATE,
+        lambda s: {
+            "collection": "trades",
+            "operation": "countDocuments",
+            "query": _trades_filter(s),
+        },
+        _render_trade_count,
+    ),
+    IntentTemplate(
+        "top_holdings_by_market_value",
+        r"(?:show me |list |what are )?(?:the |my |our )?top (?P<n>\d+) holdings"
+        r" by (?:market value|mv)" + _PORTFOLIO + _DATE,
+        lambda s: {
+            "collection": "holdings",
+            "operation": "aggregate",
+            "query": [
+                {"$match": _holdings_filter(s)},
+                {"$sort": {"MV_Base": -1}},
+                {"$limit": s["n"]},
+                {
+                    "$project": {
+                        "_id": 0,
+                        "SecName": 1,
+                        "PortfolioName": 1,
+                        "SecurityTypeName": 1,
+                        "MV_Base": 1,
+                    }
+                },
+            ],
+        },
+        _render_top_holdings,
+    ),
+    IntentTemplate(
+        "total_pl",
+        r"(?:what's|what is|show me) (?:the |our )?total (?P<metric>dtd|mtd|qtd|ytd)"
+        r" p&?l(?: across all portfolios)?" + _PORTFOLIO,
+        lambda s: {
+            "collection": "holdings",
+            "operation": "aggregate",
+            "query": [
+                {"$match": _holdings_filter(s)},
+                {
+                    "$group": {
+                        "_id": None,
+                        "total": {"$sum": f"${PL_FIELDS[s['metric']]}"},
+                    }
+                },
+            ],
+        },
+        _render_total_pl,
+    ),
+    IntentTemplate(
+        "security_types",
+        r"what (?:types|kinds) of securities do we (?:hold|have)",
+        lambda s: {
+            "collection": "holdings",
+            "operation": "distinct",
+            "query": {"CloseDate": None},
+            "field": "SecurityTypeName",
+        },
+        _render_security_types,
+    ),
+    IntentTemplate(
+        "portfolio_ranking",
+        r"which portfolios have the (?:best|highest) (?P<metric>dtd|mtd|qtd|ytd)"
+        r" (?:performance|p&?l)",
+        lambda s: {
+            "collection": "holdings",
+            "operation": "aggregate",
+            "query": [
+                {"$match": {"CloseDate": None}},
+                {
+                    "$group": {
+                        "_id": "$PortfolioName",
+                        "total": {"$sum": f"${PL_FIELDS[s['metric']]}"},
+                    }
+                },
+                {"$sort": {"total": -1}},
+                {"$limit": 5},
+            ],
+        },
+        _render_portfolio_ranking,
+    ),
+]
+
+
+class IntentRouter:
+
+    def __init__(self, templates: Optional[List[IntentTemplate]] = None):
+        self.templates = templates if templates is not None else INTENT_TEMPLATES
+        self.enabled = settings.fast_path_enabled
+        self.min_confidence = settings.fast_path_min_confidence
+
+        self._lock = threading.Lock()
+        self.total = 0
+        self.hits = 0
+        self.hits_by_template: Dict[str, int] = {}
+
+    def _known_portfolios(self) -> List[str]:
+        names = set()
+        for collection in ("holdings", "trades"):
+            values = get_schema_catalog().enum_values(collection, "PortfolioName")
+            if values is None:
+                # Too many portfolios to enumerate; served from the
+                # tool-result cache after the first lookup.
+                result = json.loads(
+                    execute_mongodb_query(
+                        collection=collection,
+                        operation="distinct",
+                        query={},
+                        field="PortfolioName",
+                    )
+                )
+                values = result["data"][0]["values"] if result.get("success") else []
+            names.update(values)
+        return [n for n in names if isinstance(n, str)]
+
+    def _resolve_portfolio(self, text: str) -> Tuple[Optional[str], float]:
+        """Map a lowercased portfolio mention to its stored name and a confidence."""
+        known = self._known_portfolios()
+        exact = [n for n in known if n.lower() == text]
+        if exact:
+            return exact[0], 1.0
+        partial = [n for n in known if text in n.lower()]
+        if len(partial) == 1:
+            return partial[0], 0.8
+        return None, 0.0
+
+    def _dates_comparable(self, params: Dict[str, Any]) -> bool:
+        """Whether the stored fields can answer the template's date/null filters.
+
+        Dates loaded as raw strings never equal a datetime, and a string
+        CloseDate is never null, so such a template would confidently report
+        zero rows; leave those questions to the LLM.
+        """
+        fields = get_schema_catalog().get(params["collection"])["fields"]
+        for name, value in _date_conditions(params).items():
+            types = fields.get(name, {}).get("types", [])
+            if "string" in types or (value is not None and "date" not in types):
+                logger.info(f"Fast path skipped: {params['collection']}.{name} is not a date field")
+                return False
+        return True
+
+    def match(self, question: str) -> Optional[Dict[str, Any]]:
+        """Return the best template match with extracted slots, or None."""
+        normalized = normalize_question(question)
+        for template in self.templates:
+            m = template.pattern.fullmatch(normalized)
+            if not m:
+                continue
+
+            groups = m.groupdict()
+            slots: Dict[str, Any] = {}
+            confidence = 1.0
+
+            if groups.get("portfolio"):
+                slots["portfolio"], confidence = self._resolve_portfolio(
+                    groups["portfolio"].strip()
+                )
+            if groups.get("date"):
+                try:
+                    slots["date"] = datetime.strptime(groups["date"], "%Y-%m-%d")
+                except ValueError:
+                    confidence = 0.0
+            if groups.get("n"):
+                slots["n"] = min(int(groups["n"]), settings.max_result_size)
+                if slots["n"] <= 0:
+                    confidence = 0.0
+            if groups.get("metric"):
+                slots["metric"] = groups["metric"]
+
+            return {"template": template, "slots": slots, "confidence": confidence}
+
+        return None
+
+    def _record(self, template_name: Optional[str]):
+        with self._lock:
+            self.total += 1
+            if template_name:
+                self.hits += 1
+                self.hits_by_template[template_name] = (
+                    self.hits_by_template.get(template_name, 0) + 1
+                )
+            hit_rate = self.hits / self.total
+        logger.info(
+            f"Fast path {'hit: ' + template_name if template_name else 'miss'} "
+            f"(hit rate {hit_rate:.1%} over {self.total} questions)"
+        )
+
+    def route(self, question: str) -> Optional[Dict[str, Any]]:
+        """Answer ``question`` directly, or return None to fall back to the LLM.
+
+        Raises ``SchedulerBusy`` when the user's query budget is spent.
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            with get_db().pin_data_versions():
+                return self._route(question)
+        except SchedulerBusy:
+            self._record(None)
+            raise
+        except Exception as e:
+            logger.warning(f"Fast path routing failed, falling back to LLM: {e}")
+            self._record(None)
+            return None
+
+    def _route(self, question: str) -> Optional[Dict[str, Any]]:
+        matched = self.match(question)
+        if not matched or matched["confidence"] < self.min_confidence:
+            self._record(None)
+            return None
+
+        template = matched["template"]
+        slots = matched["slots"]
+        params = template.build_query(slots)
+        if not self._dates_comparable(params):
+            self._record(None)
+            return None
+        result = json.loads(execute_mongodb_query(**params))
+        if result.get("busy"):
+            raise SchedulerBusy(result["error"], result["retry_after"])
+        if not result.get("success"):
+            logger.warning(
+                f"Fast path query failed for {template.name}: {result.get('error')}"
+            )
+            self._record(None)
+            return None
+
+        answer = template.render_answer(result["data"], slots)
+
+        self._record(template.name)
+        return {
+            "answer": answer,
+            "success": True,
+            "data": None,
+            "query_used": [json.dumps(params, indent=2, default=str)],
+            "fast_path": template.name,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "questions": self.total,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.total if self.total else 0.0,
+                "hits_by_template": dict(self.hits_by_template),
+            }
+
+
+intent_router = IntentRouter()
+
+
+def get_intent_router() -> IntentRouter:
+    return intent_router
@@ -0,0 +1,272 @@
+"""Resilient wrapper around the OpenAI chat completions client.
+
+One client (and so one HTTP connection pool) is shared by the whole process.
+Each attempt has its own timeout; rate limits, timeouts and 5xx responses are
+retried with jittered exponential backoff that honors ``Retry-After``. When
+enabled, a slow attempt is hedged with a second request after the observed
+p95 latency. A circuit breaker fails fast while the upstream keeps failing.
+
+Point ``LLM_BASE_URL`` at a local fake server to exercise all of this in tests.
+"""
+
+import concurrent.futures
+import logging
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+import openai
+from openai import OpenAI
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS
+    return False
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            # Half open: let one trial request through to probe the upstream.
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            retry_in = self.reset_seconds - (time.monotonic() - self.opened_at)
+        raise CircuitOpenError(
+            f"LLM service is unavailable after repeated failures; "
+            f"retrying in {max(retry_in, 0):.0f}s"
+        )
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            trial_failed = self._trial_in_flight
+            self._trial_in_flight = False
+            if trial_failed or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"LLM circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+
+class ResilientLLMClient:
+
+    def __init__(self, client: Optional[OpenAI] = None):
+        self.client = client or OpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.llm_base_url or None,
+            timeout=openai.Timeout(
+                settings.llm_attempt_timeout_seconds,
+                connect=settings.llm_connect_timeout_seconds,
+            ),
+            # Retries are handled here so backoff, hedging and the breaker
+            # see every attempt.
+            max_retries=0,
+            http_client=openai.DefaultHttpxClient(),
+        )
+        self.max_retries = settings.llm_max_retries
+        self.backoff_base = settings.llm_backoff_base_seconds
+        self.backoff_max = settings.llm_backoff_max_seconds
+        self.retry_after_max = settings.llm_retry_after_max_seconds
+        self.hedge_enabled = settings.llm_hedge_enabled
+        self.hedge_min_delay = settings.llm_hedge_min_delay_ms / 1000
+        self.breaker = CircuitBreaker(
+            settings.llm_breaker_failure_threshold, settings.llm_breaker_reset_seconds
+        )
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=8, thread_name_prefix="llm-hedge"
+        )
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=200)
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    def _timed_call(self, create: Callable[..., Any], kwargs: dict) -> Any:
+        started = time.monotonic()
+        response = create(**kwargs)
+        with self._lock:
+            self._latencies.append(time.monotonic() - started)
+        return response
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge_enabled:
+            return None
+        with self._lock:
+            if len(self._latencies) < 20:
+                return None
+            ordered = sorted(self._latencies)
+        p95 = ordered[int(len(ordered) * 0.95) - 1]
+        return max(p95, self.hedge_min_delay)
+
+    def _attempt(self, kwargs: dict) -> Any:
+        create = self.client.chat.completions.create
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._timed_call(create, kwargs)
+
+        primary = self._executor.submit(self._timed_call, create, kwargs)
+        try:
+            return primary.result(timeout=delay)
+        except concurrent.futures.TimeoutError:
+            pass
+
+        # The primary is slower than p95: race a second identical request and
+        # take whichever finishes first. The loser's response is discarded.
+        hedge = self._executor.submit(self._timed_call, create, kwargs)
+        with self._lock:
+            self.hedges += 1
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Full jitter, but never earlier than the server asked for.
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def create(self, **kwargs) -> Any:
+        """``chat.completions.create`` with retries, hedging and the breaker."""
+        with self._lock:
+            self.calls += 1
+
+        for attempt in range(self.max_retries + 1):
+            self.breaker.before_call()
+            with self._lock:
+                self.attempts += 1
+            try:
+                response = self._attempt(kwargs)
+            except Exception as e:
+                retryable = _is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # e.g. a 400: the upstream is answering, the request is bad.
+                    self.breaker.record_success()
+                if not retryable or attempt == self.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+
+                delay = self._backoff(attempt, e)
+                if delay > self.retry_after_max:
+                    with self._lock:
+                        self.failures += 1
+                    logger.warning(f"LLM asked to retry after {delay:.1f}s; giving up")
+                    raise
+                logger.warning(
+                    f"LLM attempt {attempt + 1} failed ({type(e).__name__}); "
+                    f"retrying in {delay:.2f}s"
+                )
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                continue
+
+            self.breaker.record_success()
+            return response
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            ordered = sorted(self._latencies)
+            return {
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "failures": self.failures,
+                "p95_latency_ms": (
+                    ordered[int(len(ordered) * 0.95) - 1] * 1000 if len(ordered) >= 20 else None
+                ),
+                "circuit": self.breaker.state,
+            }
+
+
+llm_client = ResilientLLMClient()
+
+
+def get_llm_client() -> ResilientLLMClient:
+    return llm_client
@@ -1,32 +1,93 @@
 """LLM Engine using OpenAI SDK with Automatic Function Calling."""
 
 import logging
+import threading
+import time
 from typing import List, Dict, Any, Optional
 import json
-from openai import OpenAI
 from src.core.config import settings
+from src.core.database import get_db
+from src.core.example_retriever import get_example_retriever
+from src.core.intent_router import get_intent_router
+from src.core.llm_client import get_llm_client
+from src.core.model_router import get_model_router
+from src.core.result_store import result_store_scope
+from src.core.schema_catalog import get_schema_catalog
+from src.core.scheduler import SchedulerBusy, get_scheduler, user_scope
+from src.core.single_flight import SingleFlight, canonical_key
+from src.core.text_utils import normalize_question
+from src.core.turn_controller import TurnController
+from src.prompts.query_examples import format_examples
 from src.prompts.system_prompt import get_system_prompt
 from src.tools.mongodb_tool import execute_mongodb_query, MONGODB_TOOL_SCHEMA
 from src.tools.calculator_tool import execute_calculator, CALCULATOR_TOOL_SCHEMA
 
 logger = logging.getLogger(__name__)
 
+# Runs restarted on the new data when a collection is reloaded mid-answer.
+MAX_RELOAD_RESTARTS = 1
+
+
+class _DataReloaded(Exception):
+    """A query read a collection swapped after the run pinned its version."""
+
+    def __init__(self, tokens_used: int):
+        super().__init__("Data reloaded during the answer")
+        self.tokens_used = tokens_used
+
+
+def _busy_answer(error: SchedulerBusy) -> Dict[str, Any]:
+    retry_after = max(1, round(error.retry_after))
+    return {
+        "answer": (
+            "I'm handling a lot of questions right now and couldn't get to "
+            f"this one. Please try again in about {retry_after} seconds."
+        ),
+        "success": False,
+        "error": str(error),
+        "busy": True,
+        "retry_after": retry_after,
+        "data": None,
+        "query_used": None,
+    }
+
 
 class LLMEngine:
 
     def __init__(self):
-        self.model = settings.llm_model
         self.temperature = settings.llm_temperature
-        self.max_tokens = settings.llm_max_tokens
         self.system_prompt = get_system_prompt()
 
-        self.client = OpenAI(api_key=settings.openai_api_key)
+        self.client = get_llm_client()
+        self.question_flight = SingleFlight("llm_question")
+        self.intent_router = get_intent_router()
+        self.example_retriever = get_example_retriever()
+        self.schema_catalog = get_schema_catalog()
+        self.model_router = get_model_router()
+        self.scheduler = get_scheduler()
+
+        self._stats_lock = threading.Lock()
+        self.answers = 0
+        self.total_turns = 0
+        self.forced_final_answers = 0
 
     def _format_messages(
         self, user_query: str, history: Optional[List[Dict[str, str]]] = None
     ) -> List[Dict[str, str]]:
         messages = [{"role": "system", "content": self.system_prompt}]
 
+        # Changes only when the data is reloaded, so it stays cacheable too.
+        try:
+            messages.append({"role": "system", "content": self.schema_catalog.summary()})
+        except Exception as e:
+            logger.warning(f"Data catalogue unavailable: {e}")
+
+        # Kept separate from the static system prompt so that prefix stays
+        # identical across requests.
+        examples = self.example_retriever.retrieve(user_query)
+        if examples:
+            messages.append({"role": "system", "content": format_examples(examples)})
+
         if history:
             for msg in history:
                 messages.append({"role": msg["role"], "content": msg["content"]})
@@ -35,90 +96,231 @@ class LLMEngine:
         return messages
 
     def process_query(
-        self, user_query: str, history: Optional[List[Dict[str, str]]] = None
+        self,
+        user_query: str,
+        history: Optional[List[Dict[str, str]]] = None,
+        user_id: Optional[str] = None,
     ) -> Dict[str, Any]:
+        # Database queries below are charged to this user's query budget.
+        with user_scope(user_id):
+            try:
+                routed = self.intent_router.route(user_query)
+            except SchedulerBusy as e:
+                # Shed rather than fall back to the costlier LLM run.
+                return _busy_answer(e)
+            if routed is not None:
+                return routed
+
+            # The same question asked concurrently in the same conversational
+            # context shares one LLM run instead of each paying for the tool loop.
+            history_key = [(m["role"], m["content"]) for m in history or []]
+            key = canonical_key(normalize_question(user_query), history_key)
+            result, shared = self.question_flight.do(
+                key, lambda: self._scheduled_run(user_query, history, user_id)
+            )
+        if shared:
+            logger.info(f"Reused in-flight answer for: {user_query[:100]}")
+            return dict(result)
+        return result
 
+    def _scheduled_run(
+        self,
+        user_query: str,
+        history: Optional[List[Dict[str, str]]],
+        user_id: Optional[str],
+    ) -> Dict[str, Any]:
         try:
-            current_messages = self._format_messages(user_query, history)
+            with self.scheduler.llm_slot(user_id) as ticket:
+                result = self._run_tool_loop(user_query, history)
+                ticket.charge(result.get("tokens_used"))
+                return result
+        except SchedulerBusy as e:
+            return _busy_answer(e)
+
+    def _run_tool_loop(
+        self, user_query: str, history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        # Reads go to the live collection, so once a reload lands mid-run the
+        # remaining queries would mix the new data with results cached from
+        # the old; start over pinned to the new version instead.
+        tokens_used = 0
+        for _ in range(MAX_RELOAD_RESTARTS + 1):
+            try:
+                result = self._run_pinned(user_query, history)
+            except _DataReloaded as e:
+                tokens_used += e.tokens_used
+                logger.warning("Data was reloaded during the answer, restarting the run")
+                continue
+            if tokens_used:
+                result["tokens_used"] = result.get("tokens_used", 0) + tokens_used
+            return result
 
-            logger.info(f"Processing query: {user_query[:100]}...")
+        return {
+            "answer": "The data was reloaded while I was answering. Please ask again.",
+            "success": False,
+            "error": "Data reloaded during the answer",
+            "data": None,
+            "query_used": None,
+            "tokens_used": tokens_used,
+        }
 
-            tools = [MONGODB_TOOL_SCHEMA, CALCULATOR_TOOL_SCHEMA]
+    def _run_pinned(
+        self, user_query: str, history: Optional[List[Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
 
+        # Tool results of this run are addressable by handle (r1, r2, ...), and
+        # every query in it reads the same data version.
+        with result_store_scope(), get_db().pin_data_versions():
             queries_used = []
-            max_turns = 5
-            for turn in range(max_turns):
-                logger.info(f"LLM Loop Turn: {turn + 1}")
-
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=current_messages,
-                    tools=tools,
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                )
-
-                response_message = response.choices[0].message
-
-                if response_message.tool_calls:
-                    current_messages.append(response_message)
-
-                    for tool_call in response_message.tool_calls:
-                        function_name = tool_call.function.name
-                        function_args = json.loads(tool_call.function.arguments)
-
-                        logger.info(
-                            f"LLM requested tool: {function_name} with args: {function_args}"
-                        )
-
-                        tool_result_json = "{}"
-                        if function_name == "execute_mongodb_query":
-                            formatted_query = json.dumps(function_args, indent=2)
-                            queries_used.append(formatted_query)
-                            tool_result_json = execute_mongodb_query(**function_args)
-                        elif function_name == "execute_calculator":
-                            tool_result_json = execute_calculator(**function_args)
-                        else:
-                            tool_result_json = json.dumps(
+            failed_queries = []
+            try:
+                current_messages = self._format_messages(user_query, history)
+                controller = TurnController(question_index=len(current_messages) - 1)
+
+                logger.info(f"Processing query: {user_query[:100]}...")
+
+                tools = [MONGODB_TOOL_SCHEMA, CALCULATOR_TOOL_SCHEMA]
+                tier = self.model_router.select(user_query)
+                tool_errors = 0
+                tokens_used = 0
+
+                for turn in range(controller.max_turns):
+                    logger.info(f"LLM Loop Turn: {turn + 1}")
+
+                    # Compacts consumed tool results, enforces the prompt
+                    # budget and, on the last turn, disables tool calls.
+                    turn_options = controller.prepare(current_messages, turn)
+
+                    started = time.perf_counter()
+                    response = self.client.create(
+                        model=tier.model,
+                        messages=current_messages,
+                        tools=tools,
+                        temperature=self.temperature,
+                        max_tokens=tier.max_tokens,
+                        **turn_options,
+                    )
+                    self.model_router.record_call(
+                        tier, (time.perf_counter() - started) * 1000, response.usage
+                    )
+                    tokens_used += getattr(response.usage, "total_tokens", 0) or 0
+
+                    response_message = response.choices[0].message
+
+                    if response_message.tool_calls:
+                        current_messages.append(response_message)
+
+                        for tool_call in response_message.tool_calls:
+                            function_name = tool_call.function.name
+                            function_args = json.loads(tool_call.function.arguments)
+
+                            logger.info(
+                                f"LLM requested tool: {function_name} with args: {function_args}"
+                            )
+
+                            tool_result_json = "{}"
+                            if function_name == "execute_mongodb_query":
+                                formatted_query = json.dumps(function_args, indent=2)
+                                queries_used.append(formatted_query)
+                                tool_result_json = execute_mongodb_query(**function_args)
+                                tool_result = json.loads(tool_result_json)
+                                if tool_result.get("query_info", {}).get("data_version_changed"):
+                                    raise _DataReloaded(tokens_used)
+                                if tool_result.get("busy"):
+                                    # The user's query budget is spent: stop the
+                                    # run instead of letting the model retry.
+                                    raise SchedulerBusy(
+                                        tool_result["error"], tool_result["retry_after"]
+                                    )
+                                if not tool_result.get("success"):
+                                    failed_queries.append(formatted_query)
+                                    tool_errors += 1
+                            elif function_name == "execute_calculator":
+                                tool_result_json = execute_calculator(**function_args)
+                                if not json.loads(tool_result_json).get("success"):
+                                    tool_errors += 1
+                            else:
+                                tool_errors += 1
+                                tool_result_json = json.dumps(
+                                    {
+                                        "success": False,
+                                        "error": f"Unknown tool {function_name}",
+                                    }
+                                )
+
+                            current_messages.append(
                                 {
-                                    "success": False,
-                                    "error": f"Unknown tool {function_name}",
+                                    "tool_call_id": tool_call.id,
+                                    "role": "tool",
+                                    "name": function_name,
+                                    "content": tool_result_json,
                                 }
                             )
 
-                        current_messages.append(
-                            {
-                                "tool_call_id": tool_call.id,
-                                "role": "tool",
-                                "name": function_name,
-                                "content": tool_result_json,
-                            }
-                        )
-                    continue
+                        # A smaller model that keeps producing failing tool
+                        # calls is retried on the next tier up.
+                        if tool_errors >= self.model_router.escalate_after_errors:
+                            tier = self.model_router.escalate(tier)
+                            tool_errors = 0
+                        continue
+
+                    self._record_turns(turn + 1, controller.forced_final)
+                    return {
+                        "answer": response_message.content,
+                        "success": True,
+                        "data": None,
+                        "query_used": queries_used if queries_used else None,
+                        "failed_queries": failed_queries or None,
+                        "model_tier": tier.name,
+                        "tokens_used": tokens_used,
+                    }
 
+                self._record_turns(controller.max_turns, controller.forced_final)
                 return {
-                    "answer": response_message.content,
-                    "success": True,
+                    "answer": "I apologize, but I couldn't complete the task within the maximum number of attempts limit.",
+                    "success": False,
+                    "error": "Max tool turns reached",
                     "data": None,
-                    "query_used": queries_used if queries_used else None,
+                    "query_used": queries_used or None,
+                    "failed_queries": failed_queries or None,
+                    "model_tier": tier.name,
+                    "tokens_used": tokens_used,
                 }
 
-            return {
-                "answer": "I apologize, but I couldn't complete the task within the maximum number of attempts limit.",
-                "success": False,
-                "error": "Max tool turns reached",
-                "data": None,
-                "query_used": None,
-            }
+            except (_DataReloaded, SchedulerBusy):
+                raise
+            except Exception as e:
+                logger.error(f"LLM processing failed: {e}")
+                return {
+                    "answer": f"I encountered an error processing your query: {str(e)}",
+                    "success": False,
+                    "error": str(e),
+                    "data": None,
+                    "query_used": queries_used or None,
+                    "failed_queries": failed_queries or None,
+                }
 
-        except Exception as e:
-            logger.error(f"LLM processing failed: {e}")
+    def _record_turns(self, turns: int, forced_final: bool = False):
+        with self._stats_lock:
+            self.answers += 1
+            self.total_turns += turns
+            self.forced_final_answers += int(forced_final)
+            average = self.total_turns / self.answers
+        logger.info(f"Answered in {turns} turn(s), average {average:.2f} per answer")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
             return {
-                "answer": f"I encountered an error processing your query: {str(e)}",
-                "success": False,
-                "error": str(e),
-                "data": None,
-                "query_used": None,
+                "answers": self.answers,
+                "avg_turns_per_answer": (
+                    self.total_turns / self.answers if self.answers else 0.0
+                ),
+                "forced_final_answers": self.forced_final_answers,
+                "fast_path": self.intent_router.get_stats(),
+                "coalescing": self.question_flight.get_stats(),
+                "model_tiers": self.model_router.get_stats(),
+                "llm_client": self.client.get_stats(),
+                "scheduler": self.scheduler.get_stats(),
             }
 
 
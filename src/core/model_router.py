@@ -0,0 +1,190 @@
+"""Model tier selection by question complexity.
+
+Questions are scored with cheap local features (length, entity mentions,
+calculation and multi-step wording, collections involved) and sent to a model
+tier with a matching max-token budget. A run that keeps hitting tool errors is
+escalated to the next tier. Latency, token usage and cost are tracked per tier.
+"""
+
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from src.core.config import settings
+from src.core.text_utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M (input, output) tokens; models not listed are reported at zero cost.
+MODEL_PRICING = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+CALCULATION_TERMS = {
+    "percent", "percentage", "ratio", "average", "weight", "weighted", "growth",
+    "return", "change", "difference", "increase", "decrease", "contribution",
+    "share", "proportion", "mean", "median",
+}
+MULTI_STEP_TERMS = {
+    "compare", "comparison", "versu", "vs", "attribution", "breakdown", "trend",
+    "over", "why", "each", "per", "between", "correlation", "driver", "explain",
+    "rank", "ranking",
+}
+TRADE_TERMS = {"trade", "buy", "sell", "bought", "sold", "settlement", "principal"}
+HOLDING_TERMS = {"holding", "position", "market", "mv", "p&l", "pl", "exposure"}
+
+# Quoted names, dates, and capitalized words that do not start a sentence.
+_ENTITY = re.compile(
+    r"\"[^\"]+\"|'[^']+'|\b\d{1,4}[-/]\d{1,2}[-/]\d{1,4}\b|(?<!^)(?<![.?!] )\b[A-Z][\w&-]+"
+)
+_FOLLOW_ON = re.compile(r"\b(?:and then|then|also)\b")
+
+
+class ModelTier:
+
+    def __init__(self, name: str, model: str, max_tokens: int):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        input_price, output_price = MODEL_PRICING.get(self.model, (0.0, 0.0))
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1e6
+
+
+def default_tiers() -> List[ModelTier]:
+    return [
+        ModelTier(
+            "fast",
+            settings.llm_model_fast or settings.llm_model,
+            settings.llm_max_tokens_fast or settings.llm_max_tokens,
+        ),
+        ModelTier("standard", settings.llm_model, settings.llm_max_tokens),
+        ModelTier(
+            "advanced",
+            settings.llm_model_advanced or settings.llm_model,
+            settings.llm_max_tokens_advanced or settings.llm_max_tokens,
+        ),
+    ]
+
+
+def question_features(question: str) -> Dict[str, Any]:
+    terms = set(tokenize(question))
+    return {
+        "words": len(question.split()),
+        "entities": len(_ENTITY.findall(question)),
+        "calculation": len(terms & CALCULATION_TERMS),
+        "multi_step": len(terms & MULTI_STEP_TERMS),
+        "collections": int(bool(terms & TRADE_TERMS)) + int(bool(terms & HOLDING_TERMS)),
+        "clauses": question.count("?") + len(_FOLLOW_ON.findall(question.lower())),
+    }
+
+
+def complexity_score(features: Dict[str, Any]) -> int:
+    score = 0
+    if features["words"] > 25:
+        score += 1
+    if features["words"] > 50:
+        score += 1
+    if features["entities"] >= 2:
+        score += 1
+    if features["calculation"]:
+        score += 1
+    score += min(features["multi_step"], 2)
+    if features["collections"] > 1:
+        score += 1
+    if features["clauses"] > 1:
+        score += 1
+    return score
+
+
+class ModelRouter:
+
+    def __init__(self, tiers: Optional[List[ModelTier]] = None):
+        self.tiers = tiers if tiers is not None else default_tiers()
+        self.enabled = settings.model_routing_enabled
+        self.escalate_after_errors = settings.model_escalate_after_errors
+
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {
+            tier.name: {
+                "questions": 0,
+                "calls": 0,
+                "escalations": 0,
+                "latency_ms": 0.0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cost_usd": 0.0,
+            }
+            for tier in self.tiers
+        }
+        if self.enabled and len({tier.model for tier in self.tiers}) == 1:
+            logger.info(
+                f"Model routing is on but every tier uses {self.tiers[0].model}; "
+                "set LLM_MODEL_FAST / LLM_MODEL_ADVANCED to route by complexity"
+            )
+
+    def _tier(self, name: str) -> ModelTier:
+        return next(tier for tier in self.tiers if tier.name == name)
+
+    def select(self, question: str) -> ModelTier:
+        """Pick the tier for a new question."""
+        if not self.enabled:
+            tier = self._tier("standard")
+        else:
+            score = complexity_score(question_features(question))
+            if score == 0:
+                tier = self.tiers[0]
+            elif score <= 2:
+                tier = self.tiers[1]
+            else:
+                tier = self.tiers[-1]
+            logger.info(f"Complexity score {score}, routing to {tier.name} tier ({tier.model})")
+
+        with self._lock:
+            self._stats[tier.name]["questions"] += 1
+        return tier
+
+    def escalate(self, tier: ModelTier) -> ModelTier:
+        """Next tier up, or ``tier`` itself when it is already the top one."""
+        index = self.tiers.index(tier)
+        if not self.enabled or index == len(self.tiers) - 1:
+            return tier
+        upper = self.tiers[index + 1]
+        with self._lock:
+            self._stats[tier.name]["escalations"] += 1
+        logger.info(f"Escalating from {tier.name} to {upper.name} tier after tool errors")
+        return upper
+
+    def record_call(self, tier: ModelTier, latency_ms: float, usage: Any = None):
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        with self._lock:
+            stats = self._stats[tier.name]
+            stats["calls"] += 1
+            stats["latency_ms"] += latency_ms
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["cost_usd"] += tier.cost(prompt_tokens, completion_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {}
+            for tier in self.tiers:
+                tier_stats = dict(self._stats[tier.name])
+                calls = tier_stats["calls"]
+                tier_stats["avg_latency_ms"] = tier_stats["latency_ms"] / calls if calls else 0.0
+                stats[tier.name] = {"model": tier.model, "max_tokens": tier.max_tokens, **tier_stats}
+            return stats
+
+
+model_router = ModelRouter()
+
+
+def get_model_router() -> ModelRouter:
+    return model_router
@@ -0,0 +1,181 @@
+"""Continuation tokens for paging through large query results.
+
+A page token records the sort key and ``_id`` of the last row returned, so
+the next ``find`` page is a keyset range query (``(sort, _id) > last``) that
+costs the same at any depth, unlike ``skip``. While a token is fresh, the
+server-side cursor that produced the page is also kept open, so the next page
+just continues it. Tokens stay valid after that cursor expires: ``find`` falls
+back to the keyset query, ``aggregate`` to ``$skip`` over the rows already
+returned.
+"""
+
+import base64
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SortSpec = List[Tuple[str, int]]
+
+
+def keyset_sort(sort: Optional[Dict[str, int]]) -> SortSpec:
+    """The requested sort with ``_id`` appended as a unique tiebreaker."""
+    spec = [(name, 1 if direction >= 0 else -1) for name, direction in (sort or {}).items()]
+    if not any(name == "_id" for name, _ in spec):
+        spec.append(("_id", spec[-1][1] if spec else 1))
+    return spec
+
+
+def _get_path(row: Dict[str, Any], path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(row, dict):
+            return None
+        row = row.get(part)
+    return row
+
+
+def sort_values(row: Dict[str, Any], spec: SortSpec) -> List[Any]:
+    return [_get_path(row, name) for name, _ in spec]
+
+
+def keyset_filter(spec: SortSpec, after: List[Any]) -> Dict[str, Any]:
+    """Rows strictly after ``after`` in ``spec`` order.
+
+    For sort (a, b, _id) this is a > A or (a = A and b > B) or (a = A and
+    b = B and _id > ID), with > flipped to < for descending keys. MongoDB
+    sorts null and missing values last on a descending key, but ``$lt``
+    never matches them, so descending keys also get an ``a = null`` branch.
+    ``after`` must not contain None.
+    """
+    branches = []
+    for i, (name, direction) in enumerate(spec):
+        equal = {spec[j][0]: after[j] for j in range(i)}
+        branches.append({**equal, name: {"$gt" if direction > 0 else "$lt": after[i]}})
+        if direction < 0 and name != "_id":
+            branches.append({**equal, name: None})
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+
+def with_sort_fields(
+    projection: Optional[Dict[str, Any]], spec: SortSpec
+) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """Make sure an inclusion projection returns the sort keys.
+
+    Returns the projection to use and the fields to strip from the output
+    because the caller did not ask for them.
+    """
+    if not projection:
+        return projection, []
+    inclusive = any(v not in (0, False) for k, v in projection.items() if k != "_id")
+    hidden = []
+    projection = dict(projection)
+    for name, _ in spec:
+        if name == "_id":
+            if projection.get("_id") in (0, False):
+                projection.pop("_id")
+                hidden.append("_id")
+        elif inclusive and name not in projection:
+            projection[name] = 1
+            hidden.append(name)
+        elif not inclusive and projection.get(name) in (0, False):
+            projection.pop(name)
+            hidden.append(name)
+    return projection, hidden
+
+
+def encode_token(state: Dict[str, Any]) -> str:
+    payload = json_util.dumps(state, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_token(token: str) -> Dict[str, Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        state = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor token; rerun the query without 'cursor'")
+    if not isinstance(state, dict) or "key" not in state:
+        raise ValueError("Invalid cursor token; rerun the query without 'cursor'")
+    return state
+
+
+class CursorRegistry:
+    """Open server-side cursors between pages, closed after ``ttl_seconds``."""
+
+    def __init__(self, max_open: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_open = max_open or settings.page_cursor_max_open
+        self.ttl_seconds = ttl_seconds or settings.page_cursor_ttl_seconds
+        self._lock = threading.Lock()
+        # id -> (expires_at, query key, cursor, rows read ahead of the page).
+        # Ids are random: tokens outlive the process (persisted caches), and
+        # a restarted registry must never hand one query's cursor to another.
+        self._cursors: "OrderedDict[str, Tuple[float, str, Any, List[Any]]]" = OrderedDict()
+        self.resumed = 0
+        self.expired = 0
+
+    def _close(self, cursor: Any):
+        try:
+            cursor.close()
+        except Exception as e:
+            logger.debug(f"Closing page cursor failed: {e}")
+
+    def _prune(self) -> List[Any]:
+        now = time.monotonic()
+        stale = [cid for cid, (expires, _, _, _) in self._cursors.items() if expires < now]
+        while len(self._cursors) - len(stale) > self.max_open:
+            oldest = next(cid for cid in self._cursors if cid not in stale)
+            stale.append(oldest)
+        closing = [self._cursors.pop(cid)[2] for cid in stale]
+        self.expired += len(closing)
+        return closing
+
+    def put(self, key: str, cursor: Any, read_ahead: List[Any]) -> str:
+        with self._lock:
+            cursor_id = secrets.token_hex(8)
+            self._cursors[cursor_id] = (
+                time.monotonic() + self.ttl_seconds,
+                key,
+                cursor,
+                read_ahead,
+            )
+            closing = self._prune()
+        for stale in closing:
+            self._close(stale)
+        return cursor_id
+
+    def take(self, cursor_id: Optional[str], key: str) -> Optional[Tuple[Any, List[Any]]]:
+        """Claim the live cursor of ``key`` (each token resumes it at most once)."""
+        with self._lock:
+            closing = self._prune()
+            entry = self._cursors.get(cursor_id) if cursor_id else None
+            if entry is not None and entry[1] == key:
+                del self._cursors[cursor_id]
+                self.resumed += 1
+            else:
+                entry = None
+        for stale in closing:
+            self._close(stale)
+        return (entry[2], entry[3]) if entry else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open": len(self._cursors),
+                "resumed": self.resumed,
+                "expired": self.expired,
+            }
+
+
+cursor_registry = CursorRegistry()
+
+
+def get_cursor_registry() -> CursorRegistry:
+    return cursor_registry
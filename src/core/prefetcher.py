@@ -0,0 +1,201 @@
+"""Speculative prefetch of likely follow-up queries.
+
+Transitions between consecutive answers' ``query_used`` lists are learned from
+``chat_sessions``. After an answer, the most common follow-up queries are run
+in the background so they land in the tool-result cache before the user asks.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.core.database import get_db
+from src.core.single_flight import canonical_key
+from src.core.text_utils import QUERY_PARAM_KEYS, parse_queries_used
+from src.tools.mongodb_tool import execute_mongodb_query
+
+logger = logging.getLogger(__name__)
+
+
+def query_params_key(params: Dict[str, Any]) -> str:
+    return canonical_key(*(params.get(k) for k in QUERY_PARAM_KEYS))
+
+
+def _add_transitions(
+    transitions: Dict[str, Counter],
+    params: Dict[str, Dict[str, Any]],
+    previous: List[Dict],
+    following: List[Dict],
+):
+    for prev in previous:
+        prev_key = query_params_key(prev)
+        for nxt in following:
+            nxt_key = query_params_key(nxt)
+            if nxt_key == prev_key:
+                continue
+            transitions[prev_key][nxt_key] += 1
+            params[nxt_key] = nxt
+
+
+class QueryPrefetcher:
+
+    def __init__(self):
+        self.enabled = settings.prefetch_enabled
+        self.top_k = settings.prefetch_top_k
+        self.min_support = settings.prefetch_min_support
+        self.max_workers = settings.prefetch_max_workers
+        self.max_queries_per_minute = settings.prefetch_max_queries_per_minute
+
+        self._lock = threading.Lock()
+        self._transitions: Dict[str, Counter] = defaultdict(Counter)
+        self._params: Dict[str, Dict[str, Any]] = {}
+        self._learned_at: Optional[float] = None
+        self._learning = False
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="prefetch"
+        )
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._issued: deque = deque()
+        self._recent = TTLCache(
+            "prefetch_recent",
+            max_entries=settings.query_cache_max_entries,
+            ttl_seconds=settings.query_cache_ttl_seconds,
+        )
+
+        self.prefetched = 0
+        self.skipped_budget = 0
+
+    def observe(self, previous_queries: Any, queries_used: Any):
+        """Record a live transition so the model improves between refreshes."""
+        previous = parse_queries_used(previous_queries)
+        following = parse_queries_used(queries_used)
+        if previous and following:
+            with self._lock:
+                _add_transitions(self._transitions, self._params, previous, following)
+
+    def learn_from_history(self):
+        """Rebuild the transition table from recent ``chat_sessions``."""
+        db = get_db()
+        cursor = (
+            db.chat_sessions.find({}, {"messages.role": 1, "messages.query_used": 1})
+            .sort("updated_at", -1)
+            .limit(settings.prefetch_history_sessions)
+        )
+
+        transitions: Dict[str, Counter] = defaultdict(Counter)
+        params: Dict[str, Dict[str, Any]] = {}
+        sessions = 0
+        for session in cursor:
+            sessions += 1
+            previous: List[Dict] = []
+            for message in session.get("messages", []):
+                if message.get("role") != "assistant":
+                    continue
+                current = parse_queries_used(message.get("query_used"))
+                if not current:
+                    continue
+                _add_transitions(transitions, params, previous, current)
+                previous = current
+
+        with self._lock:
+            self._transitions = transitions
+            self._params = params
+            self._learned_at = time.monotonic()
+
+        logger.info(
+            f"Prefetcher learned {sum(len(c) for c in transitions.values())} "
+            f"transitions from {sessions} sessions"
+        )
+
+    def _ensure_learned(self):
+        with self._lock:
+            learned_at = self._learned_at
+            fresh = (
+                learned_at is not None
+                and time.monotonic() - learned_at <= settings.prefetch_refresh_seconds
+            )
+            # Concurrent workers predict from the current table rather than
+            # each starting a full relearn.
+            if fresh or self._learning:
+                return
+            self._learning = True
+        try:
+            self.learn_from_history()
+        finally:
+            with self._lock:
+                self._learning = False
+
+    def predict(self, queries_used: Any) -> List[Dict[str, Any]]:
+        scores: Counter = Counter()
+        with self._lock:
+            for params in parse_queries_used(queries_used):
+                for nxt_key, count in self._transitions.get(
+                    query_params_key(params), {}
+                ).items():
+                    scores[nxt_key] += count
+            return [
+                self._params[key]
+                for key, count in scores.most_common(self.top_k)
+                if count >= self.min_support
+            ]
+
+    def _take_budget(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._issued and now - self._issued[0] > 60:
+                self._issued.popleft()
+            if len(self._issued) >= self.max_queries_per_minute:
+                return False
+            self._issued.append(now)
+            return True
+
+    def _run(self, queries_used: Any):
+        try:
+            self._ensure_learned()
+            for params in self.predict(queries_used):
+                key = query_params_key(params)
+                if key in self._recent:
+                    continue
+                if not self._take_budget():
+                    self.skipped_budget += 1
+                    logger.info("Prefetch budget exhausted, skipping remaining")
+                    break
+                self._recent.set(key, True)
+                execute_mongodb_query(**params)
+                self.prefetched += 1
+        except Exception as e:
+            logger.warning(f"Prefetch failed: {e}")
+        finally:
+            self._slots.release()
+
+    def prefetch_after(self, queries_used: Any):
+        """Warm the cache with likely follow-ups; never blocks the caller."""
+        if not self.enabled or not queries_used:
+            return
+        # Drop the request rather than queue it when all workers are busy, so
+        # prefetching never builds a backlog of load on the database.
+        if not self._slots.acquire(blocking=False):
+            self.skipped_budget += 1
+            return
+        self._executor.submit(self._run, queries_used)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "transitions": sum(len(c) for c in self._transitions.values()),
+                "prefetched": self.prefetched,
+                "skipped_budget": self.skipped_budget,
+            }
+
+
+query_prefetcher = QueryPrefetcher()
+
+
+def get_prefetcher() -> QueryPrefetcher:
+    return query_prefetcher
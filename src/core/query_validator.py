@@ -104,10 +104,19 @@ class QueryValidator:
         if options is None:
             options = {}
 
+        # "clamped" marks results cut short by the cap rather than by the
+        # caller's own limit; only those are worth paging through.
         if "limit" not in options:
             options["limit"] = self.MAX_RESULTS
+            options["clamped"] = True
         else:
-            options["limit"] = min(options["limit"], self.MAX_RESULTS)
+            limit = options["limit"]
+            if isinstance(limit, float) and limit.is_integer():
+                limit = int(limit)
+            if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+                raise ValueError(f"limit must be a positive integer, got {limit!r}")
+            options["limit"] = min(limit, self.MAX_RESULTS)
+            options["clamped"] = limit > self.MAX_RESULTS
 
         options["maxTimeMS"] = self.MAX_EXECUTION_TIME
 
@@ -0,0 +1,100 @@
+"""Per-request store of tool results addressable by handle.
+
+Query results are kept server-side under short handles (``r1``, ``r2``...) for
+the duration of one ``LLMEngine`` run, so later tool calls can reference a
+column such as ``r1.MV_Base`` instead of the model copying numbers around.
+"""
+
+import contextlib
+import contextvars
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+_current_store: contextvars.ContextVar[Optional["ResultStore"]] = contextvars.ContextVar(
+    "result_store", default=None
+)
+
+
+def _get_path(row: Any, path: List[str]) -> Any:
+    for part in path:
+        if not isinstance(row, dict):
+            return None
+        row = row.get(part)
+    return row
+
+
+class ResultStore:
+
+    def __init__(self):
+        self._results: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, rows: List[Dict[str, Any]]) -> str:
+        with self._lock:
+            handle = f"r{len(self._results) + 1}"
+            self._results[handle] = rows
+        return handle
+
+    def get(self, handle: str) -> List[Dict[str, Any]]:
+        if handle not in self._results:
+            available = ", ".join(self._results) or "none"
+            raise ValueError(f"Unknown result handle: {handle} (available: {available})")
+        return self._results[handle]
+
+    def column(self, reference: str) -> List[Any]:
+        """Resolve ``"r1.MV_Base"`` (or nested ``"r1._id.portfolio"``) to a list."""
+        handle, _, path = reference.partition(".")
+        if not path:
+            raise ValueError(f"Reference must name a field, e.g. '{handle}.MV_Base'")
+        parts = path.split(".")
+        rows = self.get(handle)
+        values = [_get_path(row, parts) for row in rows]
+        if rows and all(v is None for v in values):
+            raise ValueError(
+                f"Field '{path}' not found in {handle}. "
+                f"Available fields: {', '.join(summarize_rows(rows)['fields'])}"
+            )
+        return values
+
+
+def summarize_rows(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Small description of a result: fields plus stats for numeric columns."""
+    fields: List[str] = []
+    for row in rows:
+        if isinstance(row, dict):
+            for key in row:
+                if key not in fields:
+                    fields.append(key)
+
+    numeric: Dict[str, Dict[str, Any]] = {}
+    for name in fields:
+        values = [
+            row.get(name)
+            for row in rows
+            if isinstance(row, dict)
+            and isinstance(row.get(name), (int, float))
+            and not isinstance(row.get(name), bool)
+        ]
+        if values:
+            numeric[name] = {
+                "count": len(values),
+                "sum": sum(values),
+                "min": min(values),
+                "max": max(values),
+            }
+
+    return {"rows": len(rows), "fields": fields, "numeric": numeric}
+
+
+def get_current_store() -> Optional[ResultStore]:
+    return _current_store.get()
+
+
+@contextlib.contextmanager
+def result_store_scope() -> Iterator[ResultStore]:
+    store = ResultStore()
+    token = _current_store.set(store)
+    try:
+        yield store
+    finally:
+        _current_store.reset(token)
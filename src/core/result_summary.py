@@ -0,0 +1,116 @@
+"""Database-side summaries of results too large to send to the model.
+
+Instead of shipping hundreds of raw rows for the model to add up, the tool
+runs one companion ``$facet`` over the same match: counts, sums, min, max and
+average of the key numeric fields, the top groups by count, and a histogram
+per numeric field. The model gets exact totals over every matching row in a
+payload of a few hundred bytes, plus a small sample of rows.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from src.core.config import settings
+
+# Numeric fields worth totalling, per collection.
+SUMMARY_NUMERIC_FIELDS = {
+    "holdings": ["MV_Base", "PL_DTD", "PL_MTD", "PL_QTD", "PL_YTD"],
+    "trades": ["Principal", "TotalCash", "Quantity"],
+}
+
+# Low-cardinality fields to break the totals down by.
+SUMMARY_GROUP_FIELDS = {
+    "holdings": ["PortfolioName", "SecurityTypeName"],
+    "trades": ["PortfolioName", "TradeTypeName"],
+}
+
+MAX_DETECTED_FIELDS = 5
+
+
+def detect_fields(rows: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Numeric and string fields of arbitrary rows (e.g. aggregation output)."""
+    numeric: List[str] = []
+    strings: List[str] = []
+    for row in rows:
+        for name, value in row.items():
+            if name == "_id" or name in numeric or name in strings:
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                numeric.append(name)
+            elif isinstance(value, str):
+                strings.append(name)
+    return {
+        "numeric": numeric[:MAX_DETECTED_FIELDS],
+        "group": strings[:2],
+    }
+
+
+def summary_facet(
+    numeric_fields: List[str],
+    group_fields: List[str],
+    top_k: Optional[int] = None,
+    buckets: Optional[int] = None,
+) -> Dict[str, Any]:
+    """The ``$facet`` stage computing every summary in one pass."""
+    top_k = top_k or settings.summary_top_k
+    buckets = buckets or settings.summary_histogram_buckets
+
+    totals: Dict[str, Any] = {"_id": None, "count": {"$sum": 1}}
+    for name in numeric_fields:
+        totals[f"{name}__sum"] = {"$sum": f"${name}"}
+        totals[f"{name}__min"] = {"$min": f"${name}"}
+        totals[f"{name}__max"] = {"$max": f"${name}"}
+        totals[f"{name}__avg"] = {"$avg": f"${name}"}
+    facets: Dict[str, List[Dict[str, Any]]] = {"totals": [{"$group": totals}]}
+
+    for name in group_fields:
+        group: Dict[str, Any] = {"_id": f"${name}", "count": {"$sum": 1}}
+        if numeric_fields:
+            group["sum"] = {"$sum": f"${numeric_fields[0]}"}
+        facets[f"top__{name}"] = [
+            {"$group": group},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": top_k},
+        ]
+
+    for name in numeric_fields:
+        facets[f"histogram__{name}"] = [
+            {"$match": {name: {"$type": "number"}}},
+            {"$bucketAuto": {"groupBy": f"${name}", "buckets": buckets}},
+        ]
+    return {"$facet": facets}
+
+
+def _round(value: Any) -> Any:
+    return round(value, 2) if isinstance(value, float) else value
+
+
+def format_summary(
+    facet: Dict[str, Any], numeric_fields: List[str], group_fields: List[str]
+) -> Dict[str, Any]:
+    totals = (facet.get("totals") or [{}])[0]
+    summary: Dict[str, Any] = {"count": totals.get("count", 0), "fields": {}}
+    for name in numeric_fields:
+        summary["fields"][name] = {
+            stat: _round(totals.get(f"{name}__{stat}"))
+            for stat in ("sum", "min", "max", "avg")
+        }
+        summary["fields"][name]["histogram"] = [
+            {
+                "min": _round(bucket["_id"]["min"]),
+                "max": _round(bucket["_id"]["max"]),
+                "count": bucket["count"],
+            }
+            for bucket in facet.get(f"histogram__{name}", [])
+        ]
+    if group_fields:
+        summary["top"] = {}
+        for name in group_fields:
+            summary["top"][name] = [
+                {
+                    "value": group["_id"],
+                    "count": group["count"],
+                    **({f"{numeric_fields[0]}_sum": _round(group["sum"])} if "sum" in group else {}),
+                }
+                for group in facet.get(f"top__{name}", [])
+            ]
+    return summary
@@ -0,0 +1,242 @@
+"""Per-user rate limits and fair scheduling of LLM runs and database queries.
+
+Each user has two token buckets: LLM tokens per minute and database query cost
+per minute. LLM runs share a fixed number of concurrent slots. When the slots
+are full, waiting runs are granted in weighted fair queuing order, so one user
+firing many questions only delays their own later questions. Requests that
+would exceed a bucket, overflow the queue or wait too long are shed with
+``SchedulerBusy`` instead of piling up.
+"""
+
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ANONYMOUS_USER = "anonymous"
+
+_current_user: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "scheduler_user", default=None
+)
+
+
+class SchedulerBusy(Exception):
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount: float) -> float:
+        """Take ``amount`` and return 0, or return the seconds until it is available."""
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (amount - self.tokens) / self.rate
+
+    def adjust(self, amount: float):
+        # Reconcile an estimate with actual usage; may go negative (debt).
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+def query_cost(operation: str, query: Any) -> int:
+    """Rough database cost of one query: 1, plus one per aggregation stage."""
+    if operation == "aggregate" and isinstance(query, list):
+        return 1 + len(query)
+    return 1
+
+
+class Ticket:
+
+    def __init__(self, scheduler: "FairScheduler", user_id: str, estimated_tokens: int):
+        self.scheduler = scheduler
+        self.user_id = user_id
+        self.estimated_tokens = estimated_tokens
+        self.waited = 0.0
+
+    def charge(self, actual_tokens: Optional[int]):
+        """Settle the admission estimate against the tokens the run really used."""
+        if actual_tokens is None:
+            return
+        self.scheduler._refund_llm(self.user_id, self.estimated_tokens - actual_tokens)
+
+
+class FairScheduler:
+
+    def __init__(self):
+        self.max_concurrent = settings.scheduler_max_concurrent_llm
+        self.max_queue = settings.scheduler_max_queue
+        self.max_wait = settings.scheduler_max_wait_seconds
+        self.llm_tokens_per_minute = settings.user_llm_tokens_per_minute
+        self.db_cost_per_minute = settings.user_db_cost_per_minute
+        self.estimated_tokens = settings.llm_tokens_per_question_estimate
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._queue: List[tuple] = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._llm_buckets: Dict[str, TokenBucket] = {}
+        self._db_buckets: Dict[str, TokenBucket] = {}
+
+        self._waits: deque = deque(maxlen=500)
+        self.admitted = 0
+        self.shed: Dict[str, int] = {"llm_rate": 0, "db_rate": 0, "queue_full": 0, "timeout": 0}
+
+    def _bucket(self, buckets: Dict[str, TokenBucket], user_id: str, per_minute: float) -> TokenBucket:
+        bucket = buckets.get(user_id)
+        if bucket is None:
+            if len(buckets) > 10_000:
+                # Full buckets carry no state worth keeping.
+                for idle in [u for u, b in buckets.items() if b.full]:
+                    del buckets[idle]
+            bucket = buckets[user_id] = TokenBucket(per_minute)
+        return bucket
+
+    def _refund_llm(self, user_id: str, amount: float):
+        with self._cond:
+            self._bucket(self._llm_buckets, user_id, self.llm_tokens_per_minute).adjust(amount)
+
+    def _shed(self, reason: str, message: str, retry_after: float):
+        self.shed[reason] += 1
+        logger.warning(f"Shedding request ({reason}): {message}")
+        raise SchedulerBusy(message, retry_after)
+
+    @contextlib.contextmanager
+    def llm_slot(
+        self, user_id: Optional[str] = None, weight: float = 1.0
+    ) -> Iterator[Ticket]:
+        """Hold one of the shared LLM slots for the duration of a run."""
+        user_id = user_id or ANONYMOUS_USER
+        estimate = self.estimated_tokens
+        ticket = Ticket(self, user_id, estimate)
+        started = time.monotonic()
+
+        with self._cond:
+            bucket = self._bucket(self._llm_buckets, user_id, self.llm_tokens_per_minute)
+            wait = bucket.take(estimate)
+            if wait > 0:
+                self._shed("llm_rate", f"LLM token budget exhausted for {user_id}", wait)
+
+            start = max(self._virtual_time, self._last_finish.get(user_id, 0.0))
+            finish = start + estimate / weight
+            self._last_finish[user_id] = finish
+
+            if self._active >= self.max_concurrent or self._queue:
+                if len(self._queue) >= self.max_queue:
+                    bucket.adjust(estimate)
+                    self._shed("queue_full", "Request queue is full", self.max_wait)
+
+                entry = (finish, next(self._seq), user_id)
+                heapq.heappush(self._queue, entry)
+                deadline = started + self.max_wait
+                while self._active >= self.max_concurrent or self._queue[0] is not entry:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._queue.remove(entry)
+                        heapq.heapify(self._queue)
+                        bucket.adjust(estimate)
+                        self._cond.notify_all()
+                        self._shed("timeout", "Timed out waiting for an LLM slot", self.max_wait)
+                    self._cond.wait(remaining)
+                heapq.heappop(self._queue)
+                # The next waiter may be able to take another free slot.
+                self._cond.notify_all()
+
+            self._active += 1
+            self._virtual_time = max(self._virtual_time, start)
+            self.admitted += 1
+            ticket.waited = time.monotonic() - started
+            self._waits.append(ticket.waited)
+            self._prune_finish_tags()
+
+        try:
+            yield ticket
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def _prune_finish_tags(self):
+        if len(self._last_finish) > 10_000:
+            # Tags behind the virtual clock no longer affect ordering.
+            self._last_finish = {
+                u: t for u, t in self._last_finish.items() if t > self._virtual_time
+            }
+
+    def charge_db(self, operation: str, query: Any):
+        """Charge the current user's database budget; raises ``SchedulerBusy``."""
+        user_id = _current_user.get()
+        if user_id is None:
+            # Background work (prefetch, ingestion) is not attributed to a user.
+            return
+        cost = query_cost(operation, query)
+        with self._cond:
+            bucket = self._bucket(self._db_buckets, user_id, self.db_cost_per_minute)
+            wait = bucket.take(cost)
+            if wait > 0:
+                self._shed(
+                    "db_rate",
+                    f"Query budget exhausted; try again in {wait:.0f}s",
+                    wait,
+                )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "active": self._active,
+                "queued": len(self._queue),
+                "admitted": self.admitted,
+                "shed": dict(self.shed),
+                "p95_wait_ms": waits[int(len(waits) * 0.95) - 1] * 1000 if len(waits) >= 20 else None,
+            }
+
+
+@contextlib.contextmanager
+def user_scope(user_id: Optional[str]) -> Iterator[None]:
+    """Attribute database queries issued in this context to ``user_id``."""
+    token = _current_user.set(user_id or ANONYMOUS_USER)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+scheduler = FairScheduler()
+
+
+def get_scheduler() -> FairScheduler:
+    return scheduler
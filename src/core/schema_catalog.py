@@ -0,0 +1,216 @@
+"""Sampled field catalogue of the data collections.
+
+After each load a sample of the collection is read to record every field's
+type, null share and cardinality, and the exact values of low-cardinality
+fields (portfolios, security types, trade types...). Entries are stored in
+``schema_catalog`` keyed by data version, so the prompt always describes the
+data the run is pinned to and the model can filter on exact spellings without
+exploratory ``distinct`` calls.
+"""
+
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from src.core.change_watcher import PORTFOLIO_FIELD, ChangeEvent
+from src.core.config import settings
+from src.core.database import get_db
+
+logger = logging.getLogger(__name__)
+
+CATALOG_COLLECTIONS = ["holdings", "trades"]
+
+# Bookkeeping fields written by ingestion, not useful to the model.
+IGNORED_FIELDS = {"_id", "created_at", "updated_at"}
+
+# Entries kept in memory per collection, so runs pinned to the data version
+# before a reload keep the catalogue of that data.
+KEEP_VERSIONS = 2
+
+
+def _type_name(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, datetime):
+        return "date"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "array"
+    return "object"
+
+
+def introspect_collection(collection: str) -> Dict[str, Any]:
+    db = get_db()
+    coll = db.get_collection(collection)
+    enum_max = settings.schema_enum_max_values
+    sample = list(
+        coll.aggregate([{"$sample": {"size": settings.schema_sample_size}}])
+    )
+
+    types: Dict[str, Counter] = {}
+    values: Dict[str, set] = {}
+    ranges: Dict[str, List[datetime]] = {}
+    for doc in sample:
+        for name, value in doc.items():
+            if name in IGNORED_FIELDS:
+                continue
+            kind = _type_name(value)
+            types.setdefault(name, Counter())[kind] += 1
+            if kind == "string":
+                seen = values.setdefault(name, set())
+                if len(seen) <= enum_max:
+                    seen.add(value)
+            elif kind == "date":
+                low_high = ranges.setdefault(name, [value, value])
+                low_high[0] = min(low_high[0], value)
+                low_high[1] = max(low_high[1], value)
+
+    fields: Dict[str, Dict[str, Any]] = {}
+    for name, counts in types.items():
+        present = sum(counts.values())
+        entry: Dict[str, Any] = {
+            "types": [t for t, _ in counts.most_common() if t != "null"] or ["null"],
+            "null_fraction": round(
+                (counts["null"] + len(sample) - present) / len(sample), 2
+            ),
+        }
+        seen = values.get(name, set())
+        if seen and len(seen) <= enum_max:
+            # The sample can miss rare values; confirm against the whole collection.
+            exact = [v for v in coll.distinct(name) if isinstance(v, str)]
+            entry["cardinality"] = len(exact)
+            if len(exact) <= enum_max:
+                entry["values"] = sorted(exact)
+        elif seen:
+            entry["cardinality"] = f">{enum_max}"
+        if name in ranges:
+            entry["min"], entry["max"] = (d.strftime("%Y-%m-%d") for d in ranges[name])
+        fields[name] = entry
+
+    return {
+        "_id": collection,
+        # The sample reads live data, whatever version the caller is pinned to.
+        "data_version": db.get_live_data_versions().get(collection, 0),
+        "count": coll.estimated_document_count(),
+        "sampled": len(sample),
+        "fields": fields,
+        "built_at": datetime.now(timezone.utc),
+    }
+
+
+def format_catalog(entries: List[Dict[str, Any]]) -> str:
+    versions = ", ".join(f"{e['_id']} v{e['data_version']}" for e in entries)
+    lines = [
+        f"DATA CATALOGUE ({versions})",
+        "Field types and, for low-cardinality fields, every exact value. "
+        "Use these spellings in filters instead of querying distinct values.",
+    ]
+    for entry in entries:
+        lines.append(f"\n{entry['_id']} ({entry['count']:,} documents):")
+        for name, field in entry["fields"].items():
+            if field["types"] == ["null"]:
+                lines.append(f"- {name} [always null]")
+                continue
+            details = "/".join(field["types"])
+            if "min" in field:
+                details += f" {field['min']}..{field['max']}"
+            if field["null_fraction"]:
+                details += f", {field['null_fraction']:.0%} null"
+            if "values" in field:
+                lines.append(f"- {name} [{details}]: {', '.join(field['values'])}")
+            elif "cardinality" in field:
+                lines.append(f"- {name} [{details}, {field['cardinality']} values]")
+            else:
+                lines.append(f"- {name} [{details}]")
+    return "\n".join(lines)
+
+
+class SchemaCatalog:
+
+    def __init__(self, collections: Optional[List[str]] = None):
+        self.collections = collections or CATALOG_COLLECTIONS
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self._summaries: Dict[tuple, str] = {}
+
+    def refresh(self, collection: str) -> Dict[str, Any]:
+        entry = introspect_collection(collection)
+        get_db().schema_catalog.replace_one(
+            {"_id": collection}, entry, upsert=True
+        )
+        with self._lock:
+            self._remember(entry)
+            self._summaries = {}
+        logger.info(
+            f"Catalogued {collection} v{entry['data_version']}: "
+            f"{len(entry['fields'])} fields from {entry['sampled']} sampled documents"
+        )
+        return entry
+
+    def _remember(self, entry: Dict[str, Any]):
+        versions = self._entries.setdefault(entry["_id"], {})
+        versions[entry["data_version"]] = entry
+        for stale in sorted(versions)[:-KEEP_VERSIONS]:
+            del versions[stale]
+
+    def get(self, collection: str) -> Dict[str, Any]:
+        """Catalogue entry matching the collection's (pinned) data version."""
+        db = get_db()
+        version = db.get_data_version(collection)
+        with self._lock:
+            cached = self._entries.get(collection, {}).get(version)
+        if cached:
+            return cached
+
+        stored = db.schema_catalog.find_one({"_id": collection})
+        if stored and stored["data_version"] == version:
+            with self._lock:
+                self._remember(stored)
+            return stored
+        if stored and version != db.get_live_data_versions().get(collection, 0):
+            # Pinned to data replaced before this process catalogued it: the
+            # old documents are gone, so there is nothing left to sample.
+            logger.warning(
+                f"No catalogue of {collection} v{version}; "
+                f"describing v{stored['data_version']} instead"
+            )
+            return stored
+        # Missing or built for another version (e.g. data loaded by an older
+        # ingestion run): sample it now.
+        return self.refresh(collection)
+
+    def enum_values(self, collection: str, field: str) -> Optional[List[str]]:
+        """Exact values of a low-cardinality field, or None if not enumerated."""
+        return self.get(collection)["fields"].get(field, {}).get("values")
+
+    def on_change(self, event: ChangeEvent):
+        """Re-sample when a write introduces a portfolio the catalogue lacks."""
+        if event.collection not in self.collections or event.collection_wide:
+            return
+        if event.portfolio is None:
+            return
+        known = self.enum_values(event.collection, PORTFOLIO_FIELD)
+        if known is not None and event.portfolio not in known:
+            self.refresh(event.collection)
+
+    def summary(self) -> str:
+        entries = [self.get(c) for c in self.collections]
+        key = tuple((e["_id"], e["data_version"]) for e in entries)
+        with self._lock:
+            if key not in self._summaries:
+                self._summaries = {key: format_catalog(entries)}
+            return self._summaries[key]
+
+
+schema_catalog = SchemaCatalog()
+
+
+def get_schema_catalog() -> SchemaCatalog:
+    return schema_catalog
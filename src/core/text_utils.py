@@ -0,0 +1,52 @@
+"""Text helpers shared by the question-handling layers."""
+
+import json
+import re
+from typing import Dict, List, Optional, Union
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?.! ")
+
+
+STOPWORDS = {
+    "a", "an", "and", "are", "by", "can", "do", "does", "for", "have", "how",
+    "i", "in", "is", "it", "me", "my", "of", "on", "our", "show", "the", "to",
+    "we", "what", "which", "with", "you",
+}
+
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = re.findall(r"[a-z0-9&]+", text.lower())
+    return [_stem(t) for t in tokens if t not in STOPWORDS]
+
+
+QUERY_PARAM_KEYS = ("collection", "operation", "query", "options", "field")
+
+
+def parse_queries_used(queries_used: Optional[Union[str, List[str]]]) -> List[Dict]:
+    """Turn the formatted ``query_used`` strings back into tool parameters."""
+    if not queries_used:
+        return []
+    if isinstance(queries_used, str):
+        queries_used = [queries_used]
+
+    parsed = []
+    for raw in queries_used:
+        try:
+            params = json.loads(raw) if isinstance(raw, str) else dict(raw)
+        except (TypeError, ValueError):
+            continue
+        if not isinstance(params, dict) or "collection" not in params:
+            continue
+        parsed.append({k: params.get(k) for k in QUERY_PARAM_KEYS if k in params})
+    return parsed
@@ -0,0 +1,145 @@
+"""Turn and prompt budget for one run of the LLM tool loop.
+
+Tool results the model has already responded to are compacted to a short
+summary (row count, result handle, numeric stats and a few preview rows), the
+oldest chat history is dropped when the prompt would exceed its token cap, and
+the last allowed turn (or an over-budget turn after at least one tool call) is
+forced to answer without tools.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List
+
+from src.core.config import settings
+from src.core.result_store import summarize_rows
+
+logger = logging.getLogger(__name__)
+
+FINAL_TURN_INSTRUCTION = (
+    "No more tool calls are available for this question. Answer now using the "
+    "results gathered so far, and say briefly if anything could not be determined."
+)
+
+
+def _message_role(message: Any) -> str:
+    return message["role"] if isinstance(message, dict) else message.role
+
+
+def _message_text(message: Any) -> str:
+    if isinstance(message, dict):
+        return message.get("content") or ""
+    text = message.content or ""
+    for tool_call in message.tool_calls or []:
+        text += tool_call.function.arguments
+    return text
+
+
+def estimate_tokens(messages: List[Any]) -> int:
+    # Roughly 4 characters per token for English and JSON; close enough for a cap.
+    return sum(len(_message_text(m)) // 4 + 4 for m in messages)
+
+
+def compact_tool_result(content: str, preview_rows: int) -> str:
+    try:
+        result = json.loads(content)
+    except ValueError:
+        return content[: settings.tool_result_compact_chars]
+    if not isinstance(result, dict):
+        return content[: settings.tool_result_compact_chars]
+
+    compact: Dict[str, Any] = {"success": result.get("success"), "compacted": True}
+    for key in ("error", "count", "result_id", "result", "expression"):
+        if key in result:
+            compact[key] = result[key]
+
+    data = result.get("data")
+    if isinstance(data, list):
+        compact["summary"] = result.get("summary") or summarize_rows(data)
+        compact["preview"] = data[:preview_rows]
+    if "results" in result:
+        compact["results"] = result["results"]
+    if compact.get("result_id"):
+        compact["note"] = (
+            f"Earlier result compacted; use {compact['result_id']}.<field> "
+            "in the calculator for its full columns."
+        )
+    return json.dumps(compact, default=str)
+
+
+class TurnController:
+
+    def __init__(self, question_index: int):
+        # Messages before question_index are system prompt and chat history.
+        self.question_index = question_index
+        self.max_turns = settings.llm_max_turns
+        self.max_prompt_tokens = settings.llm_max_prompt_tokens
+        self.compact_chars = settings.tool_result_compact_chars
+        self.preview_rows = settings.tool_result_compact_rows
+        self._compacted_ids = set()
+        self.dropped_history = 0
+        self.forced_final = False
+
+    @property
+    def compacted(self) -> int:
+        return len(self._compacted_ids)
+
+    def _compact(self, messages: List[Any], end: int):
+        for i in range(self.question_index + 1, end):
+            message = messages[i]
+            if (
+                isinstance(message, dict)
+                and message.get("role") == "tool"
+                and message.get("tool_call_id") not in self._compacted_ids
+                and len(message.get("content") or "") > self.compact_chars
+            ):
+                message["content"] = compact_tool_result(message["content"], self.preview_rows)
+                self._compacted_ids.add(message.get("tool_call_id"))
+
+    def _drop_history(self, messages: List[Any]) -> bool:
+        first = next(
+            (i for i, m in enumerate(messages) if _message_role(m) != "system"),
+            self.question_index,
+        )
+        if first >= self.question_index:
+            return False
+        # Drop the oldest exchange (user + assistant) together.
+        count = min(2, self.question_index - first)
+        del messages[first : first + count]
+        self.question_index -= count
+        self.dropped_history += count
+        return True
+
+    def prepare(self, messages: List[Any], turn: int) -> Dict[str, Any]:
+        """Trim ``messages`` in place and return extra request arguments for ``turn``."""
+        # Results before the latest assistant message have been read already.
+        last_assistant = max(
+            (i for i, m in enumerate(messages) if _message_role(m) == "assistant"),
+            default=-1,
+        )
+        self._compact(messages, last_assistant)
+        while estimate_tokens(messages) > self.max_prompt_tokens and self._drop_history(messages):
+            pass
+
+        over_budget = estimate_tokens(messages) > self.max_prompt_tokens
+        if over_budget:
+            self._compact(messages, len(messages))
+        # Answering before any data was fetched would only produce made-up
+        # figures, so the budget ends a run only once a tool has run.
+        tool_ran = any(_message_role(m) == "tool" for m in messages[self.question_index + 1 :])
+        if turn < self.max_turns - 1 and not (over_budget and tool_ran):
+            if over_budget:
+                logger.warning(
+                    f"Prompt is over the {self.max_prompt_tokens}-token budget before "
+                    "any tool call; allowing tool calls"
+                )
+            return {}
+
+        if not self.forced_final:
+            self.forced_final = True
+            logger.info(
+                f"Forcing final answer on turn {turn + 1}"
+                f"{' (prompt token budget reached)' if over_budget else ''}"
+            )
+            messages.append({"role": "system", "content": FINAL_TURN_INSTRUCTION})
+        return {"tool_choice": "none"}
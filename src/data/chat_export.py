@@ -0,0 +1,307 @@
+"""Streaming export and analytics over chat_sessions.
+
+Walks ``chat_sessions`` with a projected cursor and writes one row per message
+to gzip-compressed JSONL (or Parquet when pyarrow is installed), while
+collecting bounded-memory stats: most common questions, slowest answers,
+most used and most failing queries, and the filter fields queries use. Memory
+stays constant in the number of sessions and messages.
+
+    python -m src.data.chat_export --output exports/chats.jsonl.gz \
+        --stats exports/chat_stats.json
+"""
+
+import argparse
+import gzip
+import heapq
+import json
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.core.database import get_db
+from src.core.text_utils import normalize_question, parse_queries_used
+from src.data.columnar import arrow_available
+
+EXPORT_PROJECTION = {
+    "title": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "messages.role": 1,
+    "messages.content": 1,
+    "messages.timestamp": 1,
+    "messages.query_used": 1,
+    "messages.success": 1,
+    "messages.latency_ms": 1,
+    "messages.failed_queries": 1,
+}
+
+
+class BoundedCounter:
+    """Approximate top-k counter (Space-Saving) holding at most ``capacity`` keys.
+
+    Keys are grouped by count, so finding the rarest key to replace is O(1).
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self._by_count: Dict[int, Dict[str, None]] = {}
+        self._min_count = 0
+
+    def _move(self, key: str, old: int, new: int):
+        if old:
+            keys = self._by_count[old]
+            del keys[key]
+            if not keys:
+                del self._by_count[old]
+                if self._min_count == old:
+                    self._min_count = new
+        self._by_count.setdefault(new, {})[key] = None
+        self.counts[key] = new
+
+    def add(self, key: str):
+        if key in self.counts:
+            self._move(key, self.counts[key], self.counts[key] + 1)
+        elif len(self.counts) < self.capacity:
+            self._move(key, 0, 1)
+            self._min_count = 1
+        else:
+            # Replace the rarest key; its count is an upper bound on the newcomer's.
+            count = self._min_count
+            rarest = next(iter(self._by_count[count]))
+            del self.counts[rarest]
+            del self._by_count[count][rarest]
+            self._by_count[count][key] = None
+            self._move(key, count, count + 1)
+
+    def most_common(self, n: int) -> List[tuple]:
+        return Counter(self.counts).most_common(n)
+
+
+def _filter_fields(params: Dict[str, Any]) -> List[str]:
+    """Top-level fields a query filters on; candidates for indexes."""
+    query = params.get("query")
+    filters: List[Dict[str, Any]] = []
+    if params.get("operation") == "aggregate" and isinstance(query, list):
+        filters = [
+            stage["$match"]
+            for stage in query
+            if isinstance(stage, dict) and isinstance(stage.get("$match"), dict)
+        ]
+    elif isinstance(query, list) and query and isinstance(query[0], dict):
+        filters = [query[0]]
+    elif isinstance(query, dict):
+        filters = [query]
+    return [field for f in filters for field in f if not field.startswith("$")]
+
+
+class ChatAnalytics:
+
+    def __init__(self, top_n: int = 25, capacity: int = 1000):
+        self.top_n = top_n
+        self.sessions = 0
+        self.messages = 0
+        self.answers = 0
+        self.failed_answers = 0
+        self.questions = BoundedCounter(capacity)
+        self.queries = BoundedCounter(capacity)
+        self.failed_queries = BoundedCounter(capacity)
+        self.filter_fields: Counter = Counter()
+        self._slowest: List[tuple] = []
+
+    def add_session(self, session: Dict[str, Any]):
+        self.sessions += 1
+        last_question = None
+        for message in session.get("messages", []):
+            self.messages += 1
+            role = message.get("role")
+            if role == "user" and message.get("content"):
+                last_question = normalize_question(message["content"])
+                self.questions.add(last_question)
+                continue
+            if role != "assistant":
+                continue
+
+            self.answers += 1
+            if message.get("success") is False:
+                self.failed_answers += 1
+
+            for params in parse_queries_used(message.get("query_used")):
+                self.queries.add(json.dumps(params, sort_keys=True, default=str))
+                self.filter_fields.update(
+                    f"{params.get('collection')}.{field}"
+                    for field in _filter_fields(params)
+                )
+            for params in parse_queries_used(message.get("failed_queries")):
+                self.failed_queries.add(json.dumps(params, sort_keys=True, default=str))
+
+            latency = message.get("latency_ms")
+            if isinstance(latency, (int, float)):
+                entry = (latency, str(session.get("_id")), last_question)
+                if len(self._slowest) < self.top_n:
+                    heapq.heappush(self._slowest, entry)
+                else:
+                    heapq.heappushpop(self._slowest, entry)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "generated_at": datetime.utcnow().isoformat(),
+            "sessions": self.sessions,
+            "messages": self.messages,
+            "answers": self.answers,
+            "failed_answers": self.failed_answers,
+            "top_questions": [
+                {"question": q, "count": c}
+                for q, c in self.questions.most_common(self.top_n)
+            ],
+            "top_queries": [
+                {"query": json.loads(q), "count": c}
+                for q, c in self.queries.most_common(self.top_n)
+            ],
+            "top_failed_queries": [
+                {"query": json.loads(q), "count": c}
+                for q, c in self.failed_queries.most_common(self.top_n)
+            ],
+            "filter_fields": dict(self.filter_fields.most_common()),
+            "slowest_answers": [
+                {"latency_ms": latency, "chat_id": chat_id, "question": question}
+                for latency, chat_id, question in sorted(self._slowest, reverse=True)
+            ],
+        }
+
+
+def iter_sessions(batch_size: int = 200) -> Iterator[Dict[str, Any]]:
+    db = get_db()
+    cursor = db.chat_sessions.find({}, EXPORT_PROJECTION, batch_size=batch_size)
+    try:
+        yield from cursor
+    finally:
+        cursor.close()
+
+
+def iter_message_rows(session: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    chat_id = str(session.get("_id"))
+    for i, message in enumerate(session.get("messages", [])):
+        timestamp = message.get("timestamp")
+        query_used = message.get("query_used")
+        if isinstance(query_used, str):
+            query_used = [query_used]
+        yield {
+            "chat_id": chat_id,
+            "message_index": i,
+            "role": message.get("role"),
+            "content": message.get("content"),
+            "timestamp": (
+                timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp
+            ),
+            "query_used": query_used,
+            "success": message.get("success"),
+            "latency_ms": message.get("latency_ms"),
+            "failed_queries": message.get("failed_queries"),
+        }
+
+
+class _JsonlWriter:
+
+    def __init__(self, path: Path):
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+
+    def write(self, row: Dict[str, Any]):
+        self._file.write(json.dumps(row, default=str) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+
+    def __init__(self, path: Path, row_group_size: int = 10_000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow: pip install pyarrow")
+
+        self._pa = pa
+        self._schema = pa.schema(
+            [
+                ("chat_id", pa.string()),
+                ("message_index", pa.int32()),
+                ("role", pa.string()),
+                ("content", pa.string()),
+                ("timestamp", pa.string()),
+                ("query_used", pa.list_(pa.string())),
+                ("success", pa.bool_()),
+                ("latency_ms", pa.float64()),
+                ("failed_queries", pa.list_(pa.string())),
+            ]
+        )
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+        self._row_group_size = row_group_size
+        self._rows: List[Dict[str, Any]] = []
+
+    def write(self, row: Dict[str, Any]):
+        self._rows.append(row)
+        if len(self._rows) >= self._row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            table = self._pa.Table.from_pylist(self._rows, schema=self._schema)
+            self._writer.write_table(table)
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+def export_chats(
+    output_path: str,
+    stats_path: Optional[str] = None,
+    output_format: str = "jsonl",
+    top_n: int = 25,
+) -> Dict[str, Any]:
+    output = Path(output_path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    writer = _ParquetWriter(output) if output_format == "parquet" else _JsonlWriter(output)
+    analytics = ChatAnalytics(top_n=top_n)
+
+    try:
+        for session in iter_sessions():
+            analytics.add_session(session)
+            for row in iter_message_rows(session):
+                writer.write(row)
+    finally:
+        writer.close()
+
+    stats = analytics.to_dict()
+    if stats_path:
+        Path(stats_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(stats_path, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2, default=str)
+
+    print(
+        f"Exported {stats['messages']} messages from {stats['sessions']} sessions "
+        f"to {output}"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export chat_sessions with analytics")
+    parser.add_argument("--output", default="exports/chat_sessions.jsonl.gz")
+    parser.add_argument("--stats", default="exports/chat_stats.json")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+    if args.format == "parquet" and not arrow_available():
+        parser.error("--format parquet needs the optional pyarrow package (pip install pyarrow)")
+
+    db = get_db()
+    db.connect()
+    try:
+        export_chats(args.output, args.stats, args.format, args.top)
+    finally:
+        db.disconnect()
@@ -0,0 +1,134 @@
+"""Typed columnar intermediate of ingested CSV files.
+
+The first load of a source file also writes its normalized rows as
+zstd-compressed Arrow IPC parts, one per chunk, plus a manifest. Later
+rebuilds of the same file (same path, size, mtime, schema and null values)
+memory-map those parts and stream record batches straight into
+``insert_many``, skipping CSV parsing and normalization. Needs ``pyarrow``;
+without it ingestion always parses the CSV.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+ARROW_TYPES = {
+    "date": "timestamp[ms]",
+    "float": "float64",
+    "int": "int64",
+    "bool": "bool",
+    "str": "string",
+}
+
+MANIFEST = "manifest.json"
+
+# Part of every source key: bump when normalization changes what the same
+# CSV and null values produce, so stale intermediates are not reused.
+FORMAT_VERSION = 2
+
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _arrow_schema(columns: Iterable[str], schema: Dict[str, str]):
+    import pyarrow as pa
+
+    return pa.schema(
+        [(column, pa.type_for_alias(ARROW_TYPES[schema.get(column, "str")])) for column in columns]
+    )
+
+
+def source_key(csv_path: str, schema: Dict[str, str], null_values: Iterable[str]) -> str:
+    """Changes whenever the file or the way it is normalized changes."""
+    stat = os.stat(csv_path)
+    fingerprint = json.dumps(
+        [
+            FORMAT_VERSION,
+            str(Path(csv_path).resolve()),
+            stat.st_size,
+            stat.st_mtime_ns,
+            sorted(schema.items()),
+            sorted(null_values),
+        ]
+    )
+    digest = hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+    return f"{Path(csv_path).stem}-{digest}"
+
+
+def intermediate_dir(root: str, csv_path: str, schema: Dict[str, str], null_values: Iterable[str]) -> Path:
+    return Path(root) / source_key(csv_path, schema, null_values)
+
+
+def part_path(directory: Path, start: int) -> Path:
+    # Named by byte offset so parts sort in file order.
+    return directory / f"part-{start:012d}.arrow"
+
+
+def write_part(path: Path, columns: List[str], schema: Dict[str, str], records: List[Dict[str, Any]]) -> None:
+    """Write normalized records as one compressed Arrow IPC file."""
+    import pyarrow as pa
+
+    arrow_schema = _arrow_schema(columns, schema)
+    table = pa.Table.from_pylist(records, schema=arrow_schema)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.OSFile(str(tmp_path), "wb") as sink:
+        with pa.ipc.new_file(sink, arrow_schema, options=options) as writer:
+            writer.write_table(table, max_chunksize=10_000)
+    os.replace(tmp_path, path)
+
+
+def write_manifest(directory: Path, csv_path: str, parts: List[Path], report: Dict[str, Any]) -> None:
+    """Mark the intermediate complete; written only after every part succeeded."""
+    manifest = {
+        "source": str(csv_path),
+        "parts": [p.name for p in parts],
+        "report": report,
+    }
+    tmp_path = directory / (MANIFEST + ".tmp")
+    tmp_path.write_text(json.dumps(manifest))
+    os.replace(tmp_path, directory / MANIFEST)
+
+
+def read_manifest(directory: Path) -> Optional[Dict[str, Any]]:
+    path = directory / MANIFEST
+    if not path.exists():
+        return None
+    manifest = json.loads(path.read_text())
+    if not all((directory / name).exists() for name in manifest["parts"]):
+        return None
+    return manifest
+
+
+def iter_record_batches(path: Path, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Memory-map an Arrow part and yield it as lists of row dicts."""
+    import pyarrow as pa
+
+    with pa.memory_map(str(path), "r") as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            for offset in range(0, batch.num_rows, batch_size):
+                yield batch.slice(offset, batch_size).to_pylist()
+
+
+def read_table(directory: Path):
+    """Whole intermediate as one Arrow table, for analytical reads."""
+    import pyarrow as pa
+
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No complete intermediate in {directory}")
+    tables = []
+    for name in manifest["parts"]:
+        with pa.memory_map(str(directory / name), "r") as source:
+            tables.append(pa.ipc.open_file(source).read_all())
+    return pa.concat_tables(tables)
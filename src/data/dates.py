@@ -0,0 +1,114 @@
+"""Date parsing for CSV ingestion.
+
+Each date column's format is inferred once from its distinct values, and every
+distinct string is parsed once, since a snapshot file repeats the same handful
+of dates across thousands of rows. Exports use day-first dates with two-digit
+years (``01/08/23`` is 1 August 2023). ``%y`` maps 00-68 to 2000-2068. Cells
+with no date in them (the ``00:00.0`` time-only values in trades) and NULL
+sentinels become None, and parsed values are stored as real BSON dates.
+"""
+
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+# Day-first formats come before month-first ones: for ambiguous values such as
+# 01/08/23, the exports are dd/mm/yy.
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S",
+    "%d/%m/%y",
+    "%d/%m/%Y",
+    "%m/%d/%y",
+    "%m/%d/%Y",
+    "%Y/%m/%d",
+    "%d-%b-%y",
+    "%d-%b-%Y",
+]
+
+NULL_SENTINELS = {"", "NULL", "null", "None", "NaN", "nan", "N/A", "NA", "#N/A"}
+
+# Excel-mangled times such as "00:00.0" carry no date component.
+_TIME_ONLY = re.compile(r"^\d{1,2}:\d{2}(:\d{2})?(\.\d+)?$")
+
+
+def _parse(value: str, fmt: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, fmt)
+    except ValueError:
+        return None
+
+
+def is_missing_date(value: Optional[str]) -> bool:
+    if value is None:
+        return True
+    value = value.strip()
+    return value in NULL_SENTINELS or bool(_TIME_ONLY.match(value))
+
+
+def infer_date_format(values: Iterable[str], sample_size: int = 200) -> Optional[str]:
+    """First format in ``DATE_FORMATS`` that parses every sampled value."""
+    sample = []
+    for value in values:
+        if not is_missing_date(value):
+            sample.append(value.strip())
+            if len(sample) >= sample_size:
+                break
+    if not sample:
+        return None
+    for fmt in DATE_FORMATS:
+        if all(_parse(value, fmt) for value in sample):
+            return fmt
+    return None
+
+
+class DateColumnParser:
+
+    def __init__(self, column: str, fmt: Optional[str] = None):
+        self.column = column
+        self.format = fmt
+        self._cache: Dict[str, Optional[datetime]] = {}
+        self.parsed = 0
+        self.missing = 0
+        self.failed = 0
+
+    @classmethod
+    def from_values(cls, column: str, values: Iterable[str]) -> "DateColumnParser":
+        distinct = dict.fromkeys(v.strip() for v in values if v is not None)
+        return cls(column, infer_date_format(distinct))
+
+    def _parse_new(self, value: str) -> Optional[datetime]:
+        if self.format:
+            parsed = _parse(value, self.format)
+            if parsed:
+                return parsed
+        # Outlier in an otherwise consistent column (or no format inferred).
+        for fmt in DATE_FORMATS:
+            parsed = _parse(value, fmt)
+            if parsed:
+                return parsed
+        return None
+
+    def parse(self, value: Optional[str]) -> Optional[datetime]:
+        if is_missing_date(value):
+            self.missing += 1
+            return None
+        value = value.strip()
+        if value not in self._cache:
+            self._cache[value] = self._parse_new(value)
+        parsed = self._cache[value]
+        if parsed is None:
+            self.failed += 1
+        else:
+            self.parsed += 1
+        return parsed
+
+    def report(self) -> Dict[str, object]:
+        return {
+            "format": self.format,
+            "distinct": len(self._cache),
+            "parsed": self.parsed,
+            "missing": self.missing,
+            "failed": self.failed,
+        }
@@ -1,9 +1,45 @@
+import argparse
 import csv
+import glob
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
+from pymongo import ASCENDING
+from src.core.config import settings
 from src.core.database import get_db
+from src.core.schema_catalog import get_schema_catalog
+from src.data import columnar
+from src.data.dates import NULL_SENTINELS, DateColumnParser, infer_date_format
+from src.data.normalize import (
+    TEXT_NULL_VALUES,
+    ColumnNormalizer,
+    format_report,
+    merge_reports,
+    normalize_rows,
+)
+from src.data.timeseries import rebuild_timeseries
 
 
+STAGING_SUFFIX = "__staging"
+
+# Built on the staging collection so they are in place when it is swapped in.
+COLLECTION_INDEXES = {
+    'holdings': [
+        [('AsOfDate', ASCENDING)],
+        [('PortfolioName', ASCENDING), ('AsOfDate', ASCENDING)],
+    ],
+    'trades': [
+        [('TradeDate', ASCENDING)],
+        [('PortfolioName', ASCENDING), ('TradeDate', ASCENDING)],
+    ],
+}
+
 HOLDINGS_SCHEMA = {
     'AsOfDate': 'date',
     'OpenDate': 'date',
@@ -66,87 +102,297 @@ TRADES_SCHEMA = {
     'IsCustomAllocation': 'bool',
 }
 
+# Cell values stored as null in numeric and date columns. The exports write
+# missing identifiers, rates and dates as a literal "NULL"; text columns only
+# treat that and empty cells as null (see normalize.TEXT_NULL_VALUES).
+HOLDINGS_NULL_VALUES = NULL_SENTINELS
+TRADES_NULL_VALUES = {"", "NULL"}
 
-def convert_value(value, value_type):
-    if not value or value.strip() == '':
-        return None
-    
-    value = value.strip()
-    
-    if value_type == 'date':
-        for fmt in ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%Y/%m/%d']:
-            try:
-                return datetime.strptime(value, fmt)
-            except ValueError:
-                continue
-        return None
-    
-    if value_type == 'float':
-        try:
-            return float(value)
-        except ValueError:
-            return None
-    
-    if value_type == 'int':
-        try:
-            return int(value)
-        except ValueError:
-            return None
-    
-    if value_type == 'bool':
-        return value.lower() in ('true', '1', 'yes')
-    
-    return value
-
-
-def load_csv(csv_path, schema):
-    records = []
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            record = {}
-            for field, value in row.items():
-                field_type = schema.get(field, 'str')
-                record[field] = convert_value(value, field_type)
-            record['created_at'] = datetime.now(timezone.utc)
-            record['updated_at'] = datetime.now(timezone.utc)
-            records.append(record)
-    return records
+
+def convert_value(value, value_type, null_values=NULL_SENTINELS):
+    """Normalize a single cell without column context."""
+    date_parser = DateColumnParser('') if value_type == 'date' else None
+    null_values = set(null_values)
+    if value_type == 'str':
+        null_values &= TEXT_NULL_VALUES
+    return ColumnNormalizer('', value_type, null_values, date_parser)(value)
 
 
 def insert_batch(collection, records, batch_size=1000):
     total = 0
     for i in range(0, len(records), batch_size):
         batch = records[i:i + batch_size]
-        result = collection.insert_many(batch)
+        result = collection.insert_many(batch, ordered=False)
         total += len(result.inserted_ids)
     return total
 
 
-def load_holdings(csv_path):
-    records = load_csv(csv_path, HOLDINGS_SCHEMA)
+@dataclass(frozen=True)
+class Chunk:
+    """Byte range of a CSV file that starts and ends on a line boundary."""
+    path: str
+    start: int
+    end: int
+    header: tuple
+    # Arrow part to write after parsing, or to read instead of parsing.
+    part: Optional[str] = None
+    cached: bool = False
+
+
+def expand_paths(path_or_pattern):
+    """A CSV file, a directory of CSVs or a glob pattern, as sorted file paths."""
+    path = Path(path_or_pattern)
+    if path.is_dir():
+        return sorted(str(p) for p in path.glob('*.csv'))
+    if path.is_file():
+        return [str(path)]
+    return sorted(p for p in glob.glob(str(path_or_pattern)) if Path(p).is_file())
+
+
+def plan_chunks(csv_path, chunk_bytes):
+    """Split a CSV file into byte ranges that each hold whole records.
+
+    A newline ends a record only outside quotes, i.e. after an even number of
+    '"' bytes since the previous boundary, so quoted fields containing line
+    breaks are never cut across chunks. Finding the boundaries reads the
+    file once, sequentially.
+    """
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as f:
+        header = next(csv.reader([f.readline().decode('utf-8-sig')]), [])
+        chunks = []
+        start = f.tell()
+        while start < size:
+            quotes = f.read(chunk_bytes).count(b'"')
+            # Extend to the end of the record so no row is split across chunks.
+            while True:
+                line = f.readline()
+                quotes += line.count(b'"')
+                if not line or (quotes % 2 == 0 and line.endswith(b'\n')):
+                    break
+            end = f.tell()
+            chunks.append(Chunk(csv_path, start, end, tuple(header)))
+            start = end
+    return chunks
+
+
+def infer_date_formats(paths, schema, sample_rows=5000):
+    """Date format per date column, from the head of every file.
+
+    Chunks are parsed independently, so the format is fixed up front rather
+    than inferred from whichever rows a chunk happens to hold.
+    """
+    samples = {field: set() for field, field_type in schema.items() if field_type == 'date'}
+    for csv_path in paths:
+        with open(csv_path, 'r', encoding='utf-8-sig') as f:
+            for i, row in enumerate(csv.DictReader(f)):
+                if i >= sample_rows:
+                    break
+                for field, values in samples.items():
+                    if row.get(field) is not None:
+                        values.add(row[field].strip())
+    return {field: infer_date_format(values) for field, values in samples.items()}
+
+
+def _stamp(records):
+    now = datetime.now(timezone.utc)
+    for record in records:
+        record['created_at'] = now
+        record['updated_at'] = now
+    return records
+
+
+def ingest_chunk(chunk, schema, null_values, date_formats, target, batch_size):
+    """Parse one chunk and bulk-write it into ``target``; runs in a worker process."""
+    started = time.perf_counter()
+    result = {'path': chunk.path, 'start': chunk.start, 'end': chunk.end,
+              'rows': 0, 'inserted': 0, 'report': {}, 'error': None}
+    try:
+        collection = get_db().get_collection(target)
+        if chunk.cached:
+            # Already typed: stream record batches straight from the mapped file.
+            for records in columnar.iter_record_batches(Path(chunk.part), batch_size):
+                result['rows'] += len(records)
+                result['inserted'] += insert_batch(collection, _stamp(records), batch_size)
+        else:
+            with open(chunk.path, 'rb') as f:
+                f.seek(chunk.start)
+                data = f.read(chunk.end - chunk.start).decode('utf-8')
+            rows = list(csv.DictReader(io.StringIO(data), fieldnames=list(chunk.header)))
+            records, report = normalize_rows(rows, schema, null_values, date_formats)
+            if chunk.part:
+                try:
+                    columnar.write_part(Path(chunk.part), list(chunk.header), schema, records)
+                except Exception as e:
+                    # The intermediate is only a cache: still load the rows.
+                    result['part_error'] = f"{type(e).__name__}: {e}"
+            result['rows'] = len(rows)
+            result['report'] = report
+            result['inserted'] = insert_batch(collection, _stamp(records), batch_size)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - started
+    result['cached'] = chunk.cached
+    return result
+
+
+def _init_worker():
+    # Never reuse a client inherited from the parent process.
     db = get_db()
-    return insert_batch(db.holdings, records)
+    db.client = None
+    db.db = None
+    db.connect()
+
+
+def run_chunks(chunks, schema, null_values, date_formats, target, workers=None):
+    """Ingest ``chunks`` over a process pool, printing progress as they finish."""
+    workers = min(workers or settings.ingest_workers or os.cpu_count() or 1, len(chunks))
+    args = (schema, null_values, date_formats, target, settings.ingest_batch_size)
+    results = []
+
+    def progress(result):
+        results.append(result)
+        status = result['error'] or f"{result['rows']} rows in {result['seconds']:.1f}s"
+        source = 'arrow' if result.get('cached') else f"bytes {result['start']}-{result['end']}"
+        print(f"[{len(results)}/{len(chunks)}] {Path(result['path']).name} {source}: {status}")
 
+    if workers <= 1:
+        for chunk in chunks:
+            progress(ingest_chunk(chunk, *args))
+        return results
+
+    # Spawned workers start clean: no inherited sockets, locks or threads.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as pool:
+        futures = {pool.submit(ingest_chunk, chunk, *args): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                progress(future.result())
+            except Exception as e:
+                progress({'path': chunk.path, 'start': chunk.start, 'end': chunk.end,
+                          'rows': 0, 'inserted': 0, 'report': {},
+                          'error': f"{type(e).__name__}: {e}"})
+    return results
+
+
+def load_collection(csv_path, schema, collection_name, null_values=NULL_SENTINELS, workers=None):
+    """Load into a staging collection, then swap it in and bump the data version.
+
+    ``csv_path`` may be a file, a directory or a glob; files are split into
+    byte-range chunks that are parsed and written in parallel. Files loaded
+    before are read from their Arrow intermediate instead. Live queries
+    keep reading the previous data until the atomic rename, so a reload never
+    exposes a half-loaded collection, and any failed chunk aborts the swap.
+    """
+    started = time.perf_counter()
+    paths = expand_paths(csv_path)
+    if not paths:
+        print(f"No CSV files match {csv_path}; keeping the current {collection_name}")
+        return 0
 
-def load_trades(csv_path):
-    records = load_csv(csv_path, TRADES_SCHEMA)
     db = get_db()
-    return insert_batch(db.trades, records)
+    staging = db.get_collection(collection_name + STAGING_SUFFIX)
+    staging.drop()
+    chunk_bytes = int(settings.ingest_chunk_mb * 1024 * 1024)
+    use_arrow = bool(settings.ingest_intermediate_dir) and columnar.arrow_available()
+    if settings.ingest_intermediate_dir and not use_arrow:
+        print("pyarrow is not installed; parsing CSVs without an intermediate")
+
+    chunks, reports, to_parse, fresh = [], [], [], {}
+    for path in paths:
+        if not use_arrow:
+            to_parse.append(path)
+            chunks.extend(plan_chunks(path, chunk_bytes))
+            continue
+        directory = columnar.intermediate_dir(
+            settings.ingest_intermediate_dir, path, schema, null_values
+        )
+        manifest = columnar.read_manifest(directory)
+        if manifest is not None:
+            reports.append(manifest['report'])
+            chunks.extend(
+                Chunk(path, 0, 0, (), str(directory / name), cached=True)
+                for name in manifest['parts']
+            )
+            continue
+        to_parse.append(path)
+        fresh[path] = directory
+        chunks.extend(
+            Chunk(c.path, c.start, c.end, c.header, str(columnar.part_path(directory, c.start)))
+            for c in plan_chunks(path, chunk_bytes)
+        )
 
+    date_formats = infer_date_formats(to_parse, schema)
+    results = run_chunks(chunks, schema, null_values, date_formats, staging.name, workers)
 
-def ingest_data(holdings_path=None, trades_path=None):
+    # Publish an intermediate only once every chunk of its file succeeded.
+    for path, directory in fresh.items():
+        parsed = [r for r in results if r['path'] == path]
+        if any(r['error'] for r in parsed):
+            continue
+        report = merge_reports(r['report'] for r in parsed)
+        reports.append(report)
+        part_errors = [r['part_error'] for r in parsed if r.get('part_error')]
+        if part_errors:
+            print(f"Not caching {Path(path).name} as Arrow: {part_errors[0]}")
+            continue
+        parts = sorted(columnar.part_path(directory, r['start']) for r in parsed)
+        try:
+            columnar.write_manifest(directory, path, parts, report)
+        except OSError as e:
+            print(f"Not caching {Path(path).name} as Arrow: {e}")
+    reports.extend(r['report'] for r in results if r['path'] not in fresh and not r['cached'])
+
+    for line in format_report(collection_name, merge_reports(reports)):
+        print(line)
+    total = sum(r['inserted'] for r in results)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{collection_name}: {total} rows from {len(paths)} files "
+        f"({len(chunks)} chunks) in {elapsed:.1f}s, {total / max(elapsed, 1e-9):,.0f} rows/s"
+    )
+
+    errors = [r for r in results if r['error']]
+    if errors:
+        for r in errors:
+            print(f"FAILED {r['path']} bytes {r['start']}-{r['end']}: {r['error']}")
+        print(f"{len(errors)} chunks failed; keeping the current {collection_name}")
+        staging.drop()
+        return 0
+    if total == 0:
+        print(f"No records in {csv_path}; keeping the current {collection_name}")
+        return 0
+    for keys in COLLECTION_INDEXES.get(collection_name, []):
+        staging.create_index(keys)
+    db.swap_collection(staging.name, collection_name)
+    db.bump_data_version(collection_name)
+    get_schema_catalog().refresh(collection_name)
+    return total
+
+
+def load_holdings(csv_path, workers=None):
+    return load_collection(csv_path, HOLDINGS_SCHEMA, "holdings", HOLDINGS_NULL_VALUES, workers)
+
+
+def load_trades(csv_path, workers=None):
+    return load_collection(csv_path, TRADES_SCHEMA, "trades", TRADES_NULL_VALUES, workers)
+
+
+def ingest_data(holdings_path=None, trades_path=None, workers=None):
+    """Load holdings and trades from files, directories or glob patterns."""
     db = get_db()
     db.connect()
     
     total_holdings = 0
     total_trades = 0
     
-    if holdings_path and Path(holdings_path).exists():
-        total_holdings = load_holdings(holdings_path)
+    if holdings_path and expand_paths(holdings_path):
+        total_holdings = load_holdings(holdings_path, workers)
+        rebuild_timeseries()
     
-    if trades_path and Path(trades_path).exists():
-        total_trades = load_trades(trades_path)
+    if trades_path and expand_paths(trades_path):
+        total_trades = load_trades(trades_path, workers)
     
     print(f"Holdings: {total_holdings} | Trades: {total_trades}")
     
@@ -154,8 +400,13 @@ def ingest_data(holdings_path=None, trades_path=None):
 
 
 if __name__ == "__main__":
-    
-    holdings_csv = "./src/data/holdings.csv"
-    trades_csv = "./src/data/trades.csv"
-    
-    ingest_data(holdings_csv, trades_csv)
+    parser = argparse.ArgumentParser(description="Load holdings and trades CSVs into MongoDB")
+    parser.add_argument("--holdings", default="./src/data/holdings.csv",
+                        help="CSV file, directory or glob (e.g. 'drops/*_holdings.csv')")
+    parser.add_argument("--trades", default="./src/data/trades.csv",
+                        help="CSV file, directory or glob")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: INGEST_WORKERS or one per core)")
+    args = parser.parse_args()
+
+    ingest_data(args.holdings, args.trades, args.workers)
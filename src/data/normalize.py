@@ -0,0 +1,192 @@
+"""Typed normalization of CSV cells for ingestion.
+
+Every cell is converted to its schema type, and the NULL sentinels the exports
+use (``NULL``, ``N/A``, empty) are turned into real nulls. That way ``CloseDate:
+null`` matches and numeric fields are always doubles. Text columns only null
+``NULL`` and empty cells. Counts of nulls, cleaned values (thousands
+separators, ``(1.5)`` negatives, padding) and values that could not be
+converted are reported per column.
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.data.dates import NULL_SENTINELS, DateColumnParser, is_missing_date
+
+TRUE_VALUES = {"true", "1", "yes", "y", "t"}
+FALSE_VALUES = {"false", "0", "no", "n", "f"}
+
+# Text columns only null the exports' own placeholder: "NA", "None" and the
+# like can be real tickers, names or codes.
+TEXT_NULL_VALUES = {"", "NULL"}
+
+_NUMBER_NOISE = re.compile(r"[,\s$]")
+
+
+def _clean_number(value: str) -> Tuple[str, bool]:
+    """Strip separators and accounting negatives; returns (text, was_cleaned)."""
+    cleaned = _NUMBER_NOISE.sub("", value)
+    if cleaned.startswith("(") and cleaned.endswith(")"):
+        cleaned = "-" + cleaned[1:-1]
+    return cleaned, cleaned != value
+
+
+class ColumnNormalizer:
+
+    def __init__(
+        self,
+        column: str,
+        value_type: str,
+        null_values: Set[str],
+        date_parser: Optional[DateColumnParser] = None,
+    ):
+        self.column = column
+        self.value_type = value_type
+        self.null_values = null_values
+        self.date_parser = date_parser
+        self.values = 0
+        self.nulls = 0
+        self.coerced = 0
+        self.invalid = 0
+        self.invalid_examples: List[str] = []
+
+    def _invalid(self, value: str) -> None:
+        self.invalid += 1
+        if len(self.invalid_examples) < 3 and value not in self.invalid_examples:
+            self.invalid_examples.append(value)
+
+    def __call__(self, raw: Optional[str]) -> Any:
+        self.values += 1
+        value = raw.strip() if raw is not None else ""
+        if value in self.null_values:
+            self.nulls += 1
+            return None
+        # Each cell counts as coerced once, whether padded, cleaned or both.
+        coerced = raw != value
+        if coerced:
+            self.coerced += 1
+
+        if self.value_type == "date":
+            if is_missing_date(value):
+                # Time-only cells such as "00:00.0" carry no date.
+                self.nulls += 1
+                return None
+            parsed = self.date_parser.parse(value)
+            if parsed is None:
+                self._invalid(value)
+            return parsed
+
+        if self.value_type in ("float", "int"):
+            cleaned, was_cleaned = _clean_number(value)
+            try:
+                number = float(cleaned) if self.value_type == "float" else int(cleaned)
+            except ValueError:
+                self._invalid(value)
+                return None
+            if was_cleaned and not coerced:
+                self.coerced += 1
+            return number
+
+        if self.value_type == "bool":
+            lowered = value.lower()
+            if lowered in TRUE_VALUES:
+                return True
+            if lowered in FALSE_VALUES:
+                return False
+            self._invalid(value)
+            return None
+
+        return value
+
+    def report(self) -> Dict[str, Any]:
+        report: Dict[str, Any] = {
+            "type": self.value_type,
+            "values": self.values,
+            "nulls": self.nulls,
+            "coerced": self.coerced,
+            "invalid": self.invalid,
+        }
+        if self.invalid_examples:
+            report["invalid_examples"] = self.invalid_examples
+        if self.date_parser is not None:
+            report["format"] = self.date_parser.format
+        return report
+
+
+def build_normalizers(
+    rows: List[Dict[str, str]],
+    schema: Dict[str, str],
+    null_values: Iterable[str] = NULL_SENTINELS,
+    date_formats: Optional[Dict[str, Optional[str]]] = None,
+) -> Dict[str, ColumnNormalizer]:
+    null_values = set(null_values)
+    columns = list(rows[0]) if rows else []
+    normalizers = {}
+    for column in columns:
+        value_type = schema.get(column, "str")
+        date_parser = None
+        if value_type == "date" and date_formats and column in date_formats:
+            # Format inferred up front for the whole file (chunked loads).
+            date_parser = DateColumnParser(column, date_formats[column])
+        elif value_type == "date":
+            # Infer the column's date format once from its distinct values.
+            date_parser = DateColumnParser.from_values(
+                column, (row.get(column) for row in rows)
+            )
+        column_nulls = null_values & TEXT_NULL_VALUES if value_type == "str" else null_values
+        normalizers[column] = ColumnNormalizer(column, value_type, column_nulls, date_parser)
+    return normalizers
+
+
+def normalize_rows(
+    rows: List[Dict[str, str]],
+    schema: Dict[str, str],
+    null_values: Iterable[str] = NULL_SENTINELS,
+    date_formats: Optional[Dict[str, Optional[str]]] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Convert raw CSV rows to typed records; returns (records, per-column report)."""
+    normalizers = build_normalizers(rows, schema, null_values, date_formats)
+    records = [
+        {column: normalizers[column](value) for column, value in row.items() if column in normalizers}
+        for row in rows
+    ]
+    return records, {column: n.report() for column, n in normalizers.items()}
+
+
+def merge_reports(
+    reports: Iterable[Dict[str, Dict[str, Any]]]
+) -> Dict[str, Dict[str, Any]]:
+    """Combine the per-column reports of several files or chunks."""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for report in reports:
+        for column, stats in report.items():
+            total = merged.get(column)
+            if total is None:
+                merged[column] = dict(stats, invalid_examples=list(stats.get("invalid_examples", [])))
+                continue
+            for key in ("values", "nulls", "coerced", "invalid"):
+                total[key] += stats[key]
+            examples = total["invalid_examples"]
+            for example in stats.get("invalid_examples", []):
+                if len(examples) < 3 and example not in examples:
+                    examples.append(example)
+            total["format"] = total.get("format") or stats.get("format")
+    return merged
+
+
+def format_report(name: str, report: Dict[str, Dict[str, Any]]) -> List[str]:
+    """One line per column that needed any normalization."""
+    lines = []
+    for column, stats in report.items():
+        if not (stats["nulls"] or stats["coerced"] or stats["invalid"]):
+            continue
+        line = (
+            f"{name}:{column} [{stats['type']}] nulls={stats['nulls']} "
+            f"coerced={stats['coerced']} invalid={stats['invalid']}"
+        )
+        if stats.get("format"):
+            line += f" format={stats['format']}"
+        if stats.get("invalid_examples"):
+            line += f" e.g. {stats['invalid_examples']}"
+        lines.append(line)
+    return lines
@@ -0,0 +1,242 @@
+"""Bucketed time-series views of the daily holdings snapshots.
+
+``holdings`` stores one row per position per ``AsOfDate``. For range and trend
+questions the rows are rolled up into one document per month per
+security/portfolio, with aligned daily arrays, so a monthly trend reads a
+handful of bucket documents instead of every snapshot row.
+
+- ``holdings_timeseries``: one bucket per (PortfolioName, SecurityId,
+  DirectionName, month)
+- ``portfolio_timeseries``: one bucket per (PortfolioName, month)
+"""
+
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING
+
+from src.core.change_watcher import ChangeEvent, get_change_watcher
+from src.core.config import settings
+from src.core.database import get_db
+
+logger = logging.getLogger(__name__)
+
+SECURITY_TIMESERIES = "holdings_timeseries"
+PORTFOLIO_TIMESERIES = "portfolio_timeseries"
+
+SERIES_FIELDS = ["Qty", "Price", "MV_Base", "PL_DTD", "PL_MTD", "PL_QTD", "PL_YTD"]
+SUMMED_FIELDS = ["MV_Base", "PL_DTD", "PL_MTD", "PL_QTD", "PL_YTD"]
+
+
+def _bucket_stages(
+    daily_key: Dict[str, Any],
+    daily_fields: Dict[str, Any],
+    series: List[str],
+    built_at: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    bucket_key = {k: f"$_id.{k}" for k in daily_key if k != "date"}
+    bucket_key["month"] = {"$dateTrunc": {"date": "$_id.date", "unit": "month"}}
+
+    bucket_fields: Dict[str, Any] = {
+        "dates": {"$push": "$_id.date"},
+        "start": {"$min": "$_id.date"},
+        "end": {"$max": "$_id.date"},
+        "count": {"$sum": 1},
+    }
+    for name in daily_fields:
+        if name in series:
+            bucket_fields[name] = {"$push": f"${name}"}
+        else:
+            bucket_fields[name] = {"$last": f"${name}"}
+
+    # The bucket key doubles as _id, so a refresh replaces buckets in place.
+    flatten: Dict[str, Any] = {"_id": 1}
+    flatten.update({k: f"$_id.{k}" for k in bucket_key})
+    flatten.update({k: 1 for k in bucket_fields})
+    flatten["built_at"] = {"$literal": built_at or datetime.now(timezone.utc)}
+
+    return [
+        # Snapshots whose AsOfDate did not parse as a date are left out.
+        {"$match": {"AsOfDate": {"$type": "date"}}},
+        # Fixes which row "$last" (e.g. Price) takes when several share a day.
+        {"$sort": {"AsOfDate": 1, "_id": 1}},
+        {"$group": {"_id": daily_key, **daily_fields}},
+        {"$sort": {"_id.date": 1}},
+        {"$group": {"_id": bucket_key, **bucket_fields}},
+        {"$project": flatten},
+    ]
+
+
+def security_timeseries_pipeline(built_at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    daily_key = {
+        "PortfolioName": "$PortfolioName",
+        "SecurityId": "$SecurityId",
+        "DirectionName": "$DirectionName",
+        "date": "$AsOfDate",
+    }
+    daily_fields: Dict[str, Any] = {
+        "SecName": {"$last": "$SecName"},
+        "SecurityTypeName": {"$last": "$SecurityTypeName"},
+        "Qty": {"$sum": "$Qty"},
+        "Price": {"$last": "$Price"},
+    }
+    daily_fields.update({f: {"$sum": f"${f}"} for f in SUMMED_FIELDS})
+    return _bucket_stages(daily_key, daily_fields, SERIES_FIELDS, built_at) + [
+        {"$out": SECURITY_TIMESERIES}
+    ]
+
+
+def portfolio_timeseries_pipeline(built_at: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    daily_key = {"PortfolioName": "$PortfolioName", "date": "$AsOfDate"}
+    daily_fields: Dict[str, Any] = {
+        "positions": {"$sum": 1},
+        "active_positions": {
+            "$sum": {"$cond": [{"$eq": [{"$ifNull": ["$CloseDate", None]}, None]}, 1, 0]}
+        },
+    }
+    daily_fields.update({f: {"$sum": f"${f}"} for f in SUMMED_FIELDS})
+    series = SUMMED_FIELDS + ["positions", "active_positions"]
+    return _bucket_stages(daily_key, daily_fields, series, built_at) + [
+        {"$out": PORTFOLIO_TIMESERIES}
+    ]
+
+
+def ensure_timeseries_indexes():
+    db = get_db()
+    db.get_collection(SECURITY_TIMESERIES).create_index(
+        [("PortfolioName", ASCENDING), ("SecurityId", ASCENDING), ("month", ASCENDING)]
+    )
+    db.get_collection(SECURITY_TIMESERIES).create_index([("month", ASCENDING)])
+    db.get_collection(PORTFOLIO_TIMESERIES).create_index(
+        [("PortfolioName", ASCENDING), ("month", ASCENDING)]
+    )
+
+
+def rebuild_timeseries():
+    """Recompute both bucket collections from ``holdings``.
+
+    ``$out`` swaps the target collection atomically, so readers see either the
+    previous buckets or the new ones, never a partial rebuild.
+    """
+    db = get_db()
+    db.holdings.aggregate(security_timeseries_pipeline(), allowDiskUse=True)
+    db.holdings.aggregate(portfolio_timeseries_pipeline(), allowDiskUse=True)
+    ensure_timeseries_indexes()
+
+    security_buckets = db.get_collection(SECURITY_TIMESERIES).estimated_document_count()
+    portfolio_buckets = db.get_collection(PORTFOLIO_TIMESERIES).estimated_document_count()
+    if not portfolio_buckets and db.holdings.find_one({}, {"_id": 1}):
+        logger.warning(
+            "Time series are empty: no holdings row has a date-typed AsOfDate "
+            "(reload the data so dates are parsed at ingestion)"
+        )
+    logger.info(
+        f"Rebuilt time series: {security_buckets} security buckets, "
+        f"{portfolio_buckets} portfolio buckets"
+    )
+    return security_buckets, portfolio_buckets
+
+
+def _month_bounds(date: datetime) -> Tuple[datetime, datetime]:
+    start = datetime(date.year, date.month, 1)
+    if date.month == 12:
+        return start, datetime(date.year + 1, 1, 1)
+    return start, datetime(date.year, date.month + 1, 1)
+
+
+def refresh_timeseries(portfolio: str, month: datetime):
+    """Recompute the buckets of one portfolio and month in place.
+
+    New buckets replace the old ones by key, and only buckets this run did not
+    rebuild (e.g. a security no longer held that month) are deleted after,
+    so readers never see the month missing; full reloads still go through
+    ``$out``.
+    """
+    db = get_db()
+    start, end = _month_bounds(month)
+    now = datetime.now(timezone.utc)
+    # BSON dates keep milliseconds; the stored stamp must compare equal.
+    built_at = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    match = {"$match": {"PortfolioName": portfolio, "AsOfDate": {"$gte": start, "$lt": end}}}
+    for target, pipeline in (
+        (SECURITY_TIMESERIES, security_timeseries_pipeline(built_at)),
+        (PORTFOLIO_TIMESERIES, portfolio_timeseries_pipeline(built_at)),
+    ):
+        merge = {"into": target, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}
+        db.holdings.aggregate([match] + pipeline[:-1] + [{"$merge": merge}], allowDiskUse=True)
+        db.get_collection(target).delete_many(
+            {"PortfolioName": portfolio, "month": start, "built_at": {"$ne": built_at}}
+        )
+
+
+class RollupRefresher:
+    """Debounced refresh of the buckets touched by writes to ``holdings``."""
+
+    def __init__(self, debounce_seconds: Optional[float] = None):
+        self.debounce_seconds = (
+            settings.rollup_refresh_debounce_seconds
+            if debounce_seconds is None
+            else debounce_seconds
+        )
+        self._lock = threading.Lock()
+        self._pending: Set[Tuple[str, datetime]] = set()
+        self._full = False
+        self._timer: Optional[threading.Timer] = None
+        self.refreshed = 0
+        self.rebuilds = 0
+
+    def on_change(self, event: ChangeEvent):
+        if event.collection != "holdings" or event.collection_wide:
+            # Reloads rebuild the buckets themselves after the swap.
+            return
+        with self._lock:
+            if event.portfolio is None or event.date is None:
+                self._full = True
+            else:
+                self._pending.add((event.portfolio, _month_bounds(event.date)[0]))
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            pending, full = self._pending, self._full
+            self._pending, self._full, self._timer = set(), False, None
+        try:
+            if full:
+                rebuild_timeseries()
+                self.rebuilds += 1
+            else:
+                for portfolio, month in sorted(pending):
+                    refresh_timeseries(portfolio, month)
+                self.refreshed += len(pending)
+                if pending:
+                    logger.info(f"Refreshed {len(pending)} portfolio-month buckets")
+        except Exception as e:
+            logger.error(f"Time-series refresh failed: {e}")
+        # Results read from the buckets between the holdings write and this
+        # refresh were cached from the old buckets; announce the new ones.
+        watcher = get_change_watcher()
+        for target in (SECURITY_TIMESERIES, PORTFOLIO_TIMESERIES):
+            if full:
+                watcher.publish(ChangeEvent(target, "reload"))
+            for portfolio, month in sorted(pending):
+                watcher.publish(ChangeEvent(target, "refresh", portfolio, month))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "refreshed": self.refreshed,
+                "rebuilds": self.rebuilds,
+            }
+
+
+rollup_refresher = RollupRefresher()
+
+
+def get_rollup_refresher() -> RollupRefresher:
+    return rollup_refresher
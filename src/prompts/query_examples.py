@@ -0,0 +1,266 @@
+"""Verified question -> tool call pairs used as few-shot examples.
+
+Every example uses real field names, native ``null`` for open positions and
+pipeline stages as objects, so the model copies a working shape instead of
+discovering it through failed tool calls.
+"""
+
+import json
+from typing import Any, Dict, List
+
+QUERY_EXAMPLES: List[Dict[str, Any]] = [
+    {
+        "question": "How many active positions does Garfield have?",
+        "tool_call": {
+            "collection": "holdings",
+            "operation": "countDocuments",
+            "query": [{"PortfolioName": "Garfield", "CloseDate": None}],
+        },
+    },
+    {
+        "question": "What are the top 5 portfolios by YTD P&L?",
+        "tool_call": {
+            "collection": "holdings",
+            "operation": "aggregate",
+            "query": [
+                {"$match": {"CloseDate": None}},
+                {"$group": {"_id": "$PortfolioName", "totalPL_YTD": {"$sum": "$PL_YTD"}}},
+                {"$sort": {"totalPL_YTD": -1}},
+                {"$limit": 5},
+            ],
+        },
+    },
+    {
+        "question": "Show me the top 10 holdings by market value",
+        "tool_call": {
+            "collection": "holdings",
+            "operation": "aggregate",
+            "query": [
+                {"$match": {"CloseDate": None}},
+                {"$sort": {"MV_Base": -1}},
+                {"$limit": 10},
+                {
+                    "$project": {
+                        "_id": 0,
+                        "SecName": 1,
+                        "PortfolioName": 1,
+                        "SecurityTypeName": 1,
+                        "MV_Base": 1,
+                    }
+                },
+            ],
+        },
+    },
+    {
+        "question": "Break down market value by security type",
+        "tool_call": {
+            "collection": "holdings",
+            "operation": "aggregate",
+            "query": [
+                {"$match": {"CloseDate": None}},
+                {"$group": {"_id": "$SecurityTypeName", "totalMV": {"$sum": "$MV_Base"}}},
+                {"$sort": {"totalMV": -1}},
+            ],
+        },
+    },
+    {
+        "question": "What is the MTD P&L by strategy for MNC Investment Fund?",
+        "tool_call": {
+            "collection": "holdings",
+            "operation": "aggregate",
+            "query": [
+                {"$match": {"PortfolioName": "MNC Investment Fund", "CloseDate": None}},
+                {
+                    "$group": {
+                        "_id": "$StrategyRefShortName",
+                        "totalPL_MTD": {"$sum": "$PL_MTD"},
+                    }
+                },
+                {"$sort": {"totalPL_MTD": -1}},
+            ],
+        },
+    },
+    {
+        "question": "Compare long and short exposure across portfolios",
+        "tool_call": {
+            "collection": "holdings",
+            "operation": "aggregate",
+            "query": [
+                {"$match": {"CloseDate": None}},
+                {
+                    "$group": {
+                        "_id": {
+                            "portfolio": "$PortfolioName",
+                            "direction": "$DirectionName",
+                        },
+                        "totalMV": {"$sum": "$MV_Base"},
+                    }
+                },
+                {"$sort": {"_id.portfolio": 1}},
+            ],
+        },
+    },
+    {
+        "question": "Which positions lost the most money this year?",
+        "tool_call": {
+            "collection": "holdings",
+            "operation": "find",
+            "query": [{"CloseDate": None}],
+            "options": {
+                "sort": {"PL_YTD": 1},
+                "limit": 5,
+                "projection": {
+                    "_id": 0,
+                    "SecName": 1,
+                    "PortfolioName": 1,
+                    "PL_YTD": 1,
+                },
+            },
+        },
+    },
+    {
+        "question": "What securities do we hold in bonds?",
+        "tool_call": {
+            "collection": "holdings",
+            "operation": "distinct",
+            "query": [{"SecurityTypeName": "Bond", "CloseDate": None}],
+            "field": "SecName",
+        },
+    },
+    {
+        "question": "How did market value change over the month for each portfolio?",
+        "tool_call": {
+            "collection": "portfolio_timeseries",
+            "operation": "aggregate",
+            "query": [
+                {"$sort": {"month": -1}},
+                {
+                    "$group": {
+                        "_id": "$PortfolioName",
+                        "month": {"$first": "$month"},
+                        "startMV": {"$first": {"$arrayElemAt": ["$MV_Base", 0]}},
+                        "endMV": {"$first": {"$arrayElemAt": ["$MV_Base", -1]}},
+                    }
+                },
+                {"$addFields": {"changeMV": {"$subtract": ["$endMV", "$startMV"]}}},
+                {"$sort": {"changeMV": -1}},
+            ],
+        },
+    },
+    {
+        "question": "Show the daily price and quantity history of a security",
+        "tool_call": {
+            "collection": "holdings_timeseries",
+            "operation": "find",
+            "query": [{"SecName": "EJ0445951"}],
+            "options": {
+                "sort": {"month": 1},
+                "projection": {
+                    "_id": 0,
+                    "PortfolioName": 1,
+                    "month": 1,
+                    "dates": 1,
+                    "Price": 1,
+                    "Qty": 1,
+                },
+            },
+        },
+    },
+    {
+        "question": "Count the number of trades by type",
+        "tool_call": {
+            "collection": "trades",
+            "operation": "aggregate",
+            "query": [
+                {"$group": {"_id": "$TradeTypeName", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+            ],
+        },
+    },
+    {
+        "question": "What is the total principal traded per portfolio?",
+        "tool_call": {
+            "collection": "trades",
+            "operation": "aggregate",
+            "query": [
+                {
+                    "$group": {
+                        "_id": "$PortfolioName",
+                        "totalPrincipal": {"$sum": "$Principal"},
+                        "trades": {"$sum": 1},
+                    }
+                },
+                {"$sort": {"totalPrincipal": -1}},
+            ],
+        },
+    },
+    {
+        "question": "Which counterparties do we trade with the most?",
+        "tool_call": {
+            "collection": "trades",
+            "operation": "aggregate",
+            "query": [
+                {"$group": {"_id": "$Counterparty", "trades": {"$sum": 1}}},
+                {"$sort": {"trades": -1}},
+                {"$limit": 5},
+            ],
+        },
+    },
+    {
+        "question": "Show the largest buy trades in equities",
+        "tool_call": {
+            "collection": "trades",
+            "operation": "find",
+            "query": [{"TradeTypeName": "Buy", "SecurityType": "Equity"}],
+            "options": {
+                "sort": {"Principal": -1},
+                "limit": 5,
+                "projection": {
+                    "_id": 0,
+                    "Name": 1,
+                    "PortfolioName": 1,
+                    "Quantity": 1,
+                    "Price": 1,
+                    "Principal": 1,
+                },
+            },
+        },
+    },
+    {
+        "question": "How many buy trades did HoldCo 1 make?",
+        "tool_call": {
+            "collection": "trades",
+            "operation": "countDocuments",
+            "query": [{"PortfolioName": "HoldCo 1", "TradeTypeName": "Buy"}],
+        },
+    },
+    {
+        "question": "What was the total market value of Heather on 1 August 2023?",
+        "tool_call": {
+            "collection": "holdings",
+            "operation": "aggregate",
+            "query": [
+                {
+                    "$match": {
+                        "PortfolioName": "Heather",
+                        "AsOfDate": {"$date": "2023-08-01"},
+                    }
+                },
+                {"$group": {"_id": None, "total_MV_Base": {"$sum": "$MV_Base"}}},
+            ],
+        },
+    },
+]
+
+
+def format_examples(examples: List[Dict[str, Any]]) -> str:
+    blocks = []
+    for example in examples:
+        blocks.append(
+            f"User: \"{example['question']}\"\n"
+            f"Tool Call:\n{json.dumps(example['tool_call'], indent=2)}"
+        )
+    return (
+        "VERIFIED QUERY EXAMPLES (closest to the current question; "
+        "reuse their field names and shapes):\n\n" + "\n\n".join(blocks)
+    )
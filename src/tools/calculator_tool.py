@@ -1,6 +1,16 @@
+"""Calculator tool: safe arithmetic over numbers and stored result columns."""
+
+import ast
+import functools
 import logging
 import json
-from typing import Dict, Any
+import math
+import operator
+from typing import Dict, Any, Callable, List, Optional, Union
+
+import numpy as np
+
+from src.core.result_store import get_current_store
 
 logger = logging.getLogger(__name__)
 
@@ -8,40 +18,324 @@ CALCULATOR_TOOL_SCHEMA = {
     "type": "function",
     "function": {
         "name": "execute_calculator",
-        "description": "Perform mathematical calculations. Supports basic arithmetic (+, -, *, /) and math functions",
+        "description": (
+            "Perform mathematical calculations over numbers or whole arrays in one call. "
+            "Supports +, -, *, /, //, %, **, indexing (x[0], x[-1]) and functions: "
+            "abs, round, min, max, pow, sqrt, log, exp, sum, mean, median, std, "
+            "count, cumsum, weighted_average(values, weights), "
+            "pct_change(old, new), returns(series), weights(values). "
+            "Arithmetic on arrays is element-wise; aggregates skip missing (null) values. "
+            "Columns of earlier query results can be used directly by handle, "
+            "e.g. 'sum(r1.MV_Base)' or 'weighted_average(r1.Price, r1.Qty)'."
+        ),
         "parameters": {
             "type": "object",
             "properties": {
                 "expression": {
                     "type": "string",
-                    "description": "The mathematical expression to evaluate (e.g., '2 + 2', '15 * 0.2').",
-                }
+                    "description": "The mathematical expression to evaluate (e.g., '2 + 2', 'sum(mv) / count(mv)').",
+                },
+                "expressions": {
+                    "type": ["object", "null"],
+                    "description": (
+                        "Batch of named expressions evaluated in order, e.g. "
+                        "{'total': 'sum(mv)', 'weight': 'mv / total'}. "
+                        "Later expressions can reference earlier names."
+                    ),
+                    "additionalProperties": {"type": "string"},
+                },
+                "variables": {
+                    "type": ["object", "null"],
+                    "description": (
+                        "Named numbers, lists of numbers, or result column references "
+                        "used in the expressions, e.g. {'mv': [100, 250.5, 75]} or "
+                        "{'mv': 'r1.MV_Base', 'group': 'r2._id.portfolio'}."
+                    ),
+                },
             },
-            "required": ["expression"],
         },
     },
 }
 
+MAX_EXPONENT = 1000
+
+_BINARY_OPS: Dict[type, Callable] = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide,
+    ast.Mod: np.mod,
+}
+
+_UNARY_OPS: Dict[type, Callable] = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+
+def _power(base, exponent):
+    if np.any(np.abs(exponent) > MAX_EXPONENT):
+        raise ValueError(f"Exponent too large (max {MAX_EXPONENT})")
+    return np.power(np.asarray(base, dtype=float), exponent)
+
+
+def _reduce(fn: Callable, elementwise: Callable) -> Callable:
+    # min(x) reduces an array, min(a, b, ...) compares element-wise.
+    def wrapper(*args):
+        if len(args) == 1:
+            return fn(args[0])
+        return functools.reduce(elementwise, args)
+
+    return wrapper
+
+
+def _round(value, digits=0):
+    return np.round(value, int(digits))
+
+
+def _count(values):
+    return int(np.count_nonzero(~np.isnan(np.asarray(values, dtype=float))))
+
+
+def _weighted_average(values, weights):
+    values = np.asarray(values, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    present = ~(np.isnan(values) | np.isnan(weights))
+    values, weights = values[present], weights[present]
+    total = np.sum(weights)
+    if total == 0:
+        raise ValueError("weighted_average weights sum to zero")
+    return np.sum(values * weights) / total
+
+
+def _pct_change(old, new):
+    old = np.asarray(old, dtype=float)
+    return (np.asarray(new, dtype=float) - old) / np.abs(old) * 100
+
+
+def _returns(series):
+    series = np.asarray(series, dtype=float)
+    return (series[1:] - series[:-1]) / np.abs(series[:-1]) * 100
+
+
+def _weights(values):
+    values = np.asarray(values, dtype=float)
+    return values / np.nansum(values)
+
+
+FUNCTIONS: Dict[str, Callable] = {
+    "abs": np.abs,
+    "round": _round,
+    "min": _reduce(np.nanmin, np.fmin),
+    "max": _reduce(np.nanmax, np.fmax),
+    "pow": _power,
+    "sqrt": np.sqrt,
+    "log": np.log,
+    "exp": np.exp,
+    "sum": np.nansum,
+    "mean": np.nanmean,
+    "median": np.nanmedian,
+    "std": np.nanstd,
+    "count": _count,
+    "cumsum": np.cumsum,
+    "weighted_average": _weighted_average,
+    "pct_change": _pct_change,
+    "returns": _returns,
+    "weights": _weights,
+}
+
+CONSTANTS = {"pi": math.pi, "e": math.e}
+
+
+def _compile_node(node: ast.AST) -> Callable[[Dict[str, Any]], Any]:
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body)
+
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ValueError(f"Unsupported constant: {node.value!r}")
+        value = node.value
+        return lambda env: value
 
-def execute_calculator(expression: str) -> str:
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in CONSTANTS:
+            value = CONSTANTS[name]
+            return lambda env: value
+
+        def lookup(env):
+            if name not in env:
+                raise ValueError(f"Unknown variable: {name}")
+            return env[name]
+
+        return lookup
+
+    if isinstance(node, ast.Attribute):
+        # r1.MV_Base -> column of a stored query result
+        parts = []
+        while isinstance(node, ast.Attribute):
+            parts.append(node.attr)
+            node = node.value
+        if not isinstance(node, ast.Name) or any(p.startswith("__") for p in parts):
+            raise ValueError("Unsupported syntax: attribute access")
+        reference = ".".join([node.id] + parts[::-1])
+        return lambda env: _resolve_reference(reference)
+
+    if isinstance(node, ast.List):
+        items = [_compile_node(item) for item in node.elts]
+        return lambda env: np.array([item(env) for item in items], dtype=float)
+
+    if isinstance(node, ast.BinOp):
+        left = _compile_node(node.left)
+        right = _compile_node(node.right)
+        if isinstance(node.op, ast.Pow):
+            return lambda env: _power(left(env), right(env))
+        op = _BINARY_OPS.get(type(node.op))
+        if op is None:
+            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+        return lambda env: op(left(env), right(env))
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile_node(node.operand)
+        op = _UNARY_OPS.get(type(node.op))
+        if op is None:
+            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+        return lambda env: op(operand(env))
+
+    if isinstance(node, ast.Subscript):
+        target = _compile_node(node.value)
+        index = _compile_node(node.slice)
+        return lambda env: np.asarray(target(env))[_index(index(env))]
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            name = getattr(node.func, "id", type(node.func).__name__)
+            raise ValueError(
+                f"Unsupported function: {name}. "
+                f"Allowed functions: {', '.join(sorted(FUNCTIONS))}"
+            )
+        if node.keywords:
+            raise ValueError("Keyword arguments are not supported")
+        fn = FUNCTIONS[node.func.id]
+        args = [_compile_node(arg) for arg in node.args]
+        return lambda env: fn(*(arg(env) for arg in args))
+
+    raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+
+
+@functools.lru_cache(maxsize=512)
+def compile_expression(expression: str) -> Callable[[Dict[str, Any]], Any]:
+    """Parse and validate ``expression`` once; returns an evaluator over variables."""
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {e.msg}")
+    return _compile_node(tree)
+
+
+def _index(value: Any) -> int:
+    if np.ndim(value) != 0 or isinstance(value, bool) or not float(value).is_integer():
+        raise ValueError(f"Index must be an integer, got {_to_json(value)!r}")
+    return int(value)
+
+
+def _non_finite(value: Any) -> bool:
+    return np.ndim(value) == 0 and not np.isfinite(value)
+
+
+def _resolve_reference(reference: str) -> np.ndarray:
+    store = get_current_store()
+    if store is None:
+        raise ValueError(f"No stored results available for reference: {reference}")
+    return _to_array(store.column(reference))
+
+
+def _to_array(value: Any) -> Any:
+    if isinstance(value, str):
+        return _resolve_reference(value)
+    if isinstance(value, (list, tuple)):
+        return np.array([np.nan if v is None else v for v in value], dtype=float)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Variables must be numbers or lists of numbers, got {value!r}")
+    return value
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return [_to_json(v) for v in value.tolist()]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def evaluate(expression: str, variables: Optional[Dict[str, Any]] = None) -> Any:
+    env = {name: _to_array(value) for name, value in (variables or {}).items()}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return compile_expression(expression)(env)
+
+
+def evaluate_batch(
+    expressions: Union[Dict[str, str], List[str]],
+    variables: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    if isinstance(expressions, list):
+        expressions = {f"result_{i + 1}": expr for i, expr in enumerate(expressions)}
+
+    env = {name: _to_array(value) for name, value in (variables or {}).items()}
+    results = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name, expression in expressions.items():
+            env[name] = compile_expression(expression)(env)
+            results[name] = env[name]
+    return results
+
+
+def execute_calculator(
+    expression: Optional[str] = None,
+    expressions: Optional[Union[Dict[str, str], List[str]]] = None,
+    variables: Optional[Dict[str, Any]] = None,
+) -> str:
     try:
-        allowed_names = {
-            "abs": abs,
-            "round": round,
-            "min": min,
-            "max": max,
-            "pow": pow,
-        }
+        if expressions:
+            results = evaluate_batch(expressions, variables)
+            logger.info(f"Calculator evaluated batch of {len(results)} expressions")
+            response = {
+                "success": True,
+                "results": {k: _to_json(v) for k, v in results.items() if not _non_finite(v)},
+            }
+            errors = {
+                k: "Result is not a finite number (division by zero?)"
+                for k, v in results.items()
+                if _non_finite(v)
+            }
+            if errors:
+                response["errors"] = errors
+            return json.dumps(response)
+
+        if not expression:
+            raise ValueError("Provide 'expression' or 'expressions'")
 
-        result = eval(expression, {"__builtins__": None}, allowed_names)
+        result = evaluate(expression, variables)
+        if _non_finite(result):
+            raise ValueError("Result is not a finite number (division by zero?)")
+        result = _to_json(result)
 
         logger.info(f"Calculator executed: {expression} = {result}")
 
         return json.dumps({"success": True, "result": result, "expression": expression})
 
     except Exception as e:
-        logger.error(f"Calculator failed for expression '{expression}': {e}")
-        return json.dumps({"success": False, "error": str(e), "expression": expression})
+        logger.error(f"Calculator failed for expression '{expression or expressions}': {e}")
+        return json.dumps(
+            {
+                "success": False,
+                "error": str(e),
+                "expression": expression or expressions,
+            }
+        )
 
 
 def get_tool_schema() -> Dict[str, Any]:
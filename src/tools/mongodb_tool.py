@@ -1,15 +1,50 @@
 """MongoDB query tool for LLM function calling."""
 
+import itertools
 import logging
-from typing import Dict, Any, List, Union, Optional
-from datetime import datetime
+from typing import Dict, Any, List, Union, Optional, Tuple
+from datetime import datetime, timezone
 from bson import json_util
 import json
-from src.core.database import get_db
+from src.core.change_watcher import DATE_FIELDS, PORTFOLIO_FIELD, ChangeEvent
+from src.core.database import DERIVED_COLLECTIONS, get_db
+from src.core.pagination import (
+    decode_token,
+    encode_token,
+    get_cursor_registry,
+    keyset_filter,
+    keyset_sort,
+    sort_values,
+    with_sort_fields,
+)
 from src.core.query_validator import query_validator
+from src.core.result_summary import (
+    SUMMARY_GROUP_FIELDS,
+    SUMMARY_NUMERIC_FIELDS,
+    detect_fields,
+    format_summary,
+    summary_facet,
+)
+from src.core.result_store import get_current_store, summarize_rows
+from src.core.scheduler import SchedulerBusy, get_scheduler
+from src.core.cache import TTLCache
+from src.core.cache_store import get_cache_store
+from src.core.config import settings
+from src.core.single_flight import SingleFlight, canonical_key
 
 logger = logging.getLogger(__name__)
 
+# Stands in for the summary when the database could not compute one.
+SUMMARY_FAILED = "summary_failed"
+
+query_flight = SingleFlight("mongodb_query")
+query_result_cache = TTLCache(
+    "mongodb_query",
+    max_entries=settings.query_cache_max_entries,
+    ttl_seconds=settings.query_cache_ttl_seconds,
+    store=get_cache_store,
+)
+
 MONGODB_TOOL_SCHEMA = {
     "type": "function",
     "function": {
@@ -20,7 +55,10 @@ MONGODB_TOOL_SCHEMA = {
             "properties": {
                 "collection": {
                     "type": "string",
-                    "description": "Collection name: 'holdings' or 'trades'",
+                    "description": (
+                        "Collection name: 'holdings', 'trades', "
+                        "'holdings_timeseries' or 'portfolio_timeseries'"
+                    ),
                 },
                 "operation": {
                     "type": "string",
@@ -29,7 +67,10 @@ MONGODB_TOOL_SCHEMA = {
                 },
                 "query": {
                     "type": "array",
-                    "description": "always wrap query in array even for find/count/distinct and aggregate",
+                    "description": (
+                        "always wrap query in array even for find/count/distinct and aggregate. "
+                        'Write dates as {"$date": "YYYY-MM-DD"}'
+                    ),
                     "items": {"type": "object"},
                 },
                 "options": {
@@ -40,6 +81,23 @@ MONGODB_TOOL_SCHEMA = {
                     "type": ["string", "null"],
                     "description": "Field for distinct operation",
                 },
+                "summarize": {
+                    "type": ["string", "null"],
+                    "enum": ["auto", "always", "never", None],
+                    "description": (
+                        "auto (default): results over the row threshold come back as "
+                        "database-computed totals, top groups and histograms plus a "
+                        "sample; a small limit (e.g. top 10) always returns rows. "
+                        "never: always return rows"
+                    ),
+                },
+                "cursor": {
+                    "type": ["string", "null"],
+                    "description": (
+                        "next_cursor from a previous result, to fetch the next page. "
+                        "Repeat the same collection, operation, query and options"
+                    ),
+                },
             },
             "required": ["collection", "operation", "query"],
         },
@@ -47,12 +105,413 @@ MONGODB_TOOL_SCHEMA = {
 }
 
 
+def _normalize_pipeline(query: Any) -> List[Dict[str, Any]]:
+    pipeline = query if isinstance(query, list) else [query]
+
+    normalized_pipeline = []
+    for i, stage in enumerate(pipeline):
+        if isinstance(stage, str):
+            try:
+                parsed_stage = json.loads(stage)
+                logger.info(f"Converted pipeline stage {i} from JSON string to dict")
+                normalized_pipeline.append(parsed_stage)
+            except json.JSONDecodeError:
+                raise ValueError(
+                    f"Pipeline stage {i} is an invalid JSON string. "
+                    f"Each stage must be a valid dictionary/object or JSON string."
+                )
+        elif not isinstance(stage, dict):
+            raise ValueError(
+                f"Pipeline stage {i} must be a dictionary/object, got {type(stage).__name__}"
+            )
+        else:
+            normalized_pipeline.append(stage)
+
+    return normalized_pipeline
+
+
+def _decode_dates(value: Any) -> Any:
+    """Turn extended-JSON ``{"$date": "2023-08-01"}`` values into datetimes."""
+    if isinstance(value, dict):
+        if len(value) == 1 and isinstance(value.get("$date"), str):
+            try:
+                parsed = datetime.fromisoformat(value["$date"].replace("Z", "+00:00"))
+            except ValueError:
+                raise ValueError(
+                    f"Invalid $date value: {value['$date']!r} (use YYYY-MM-DD)"
+                )
+            # Stored dates are naive UTC.
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed
+        return {k: _decode_dates(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode_dates(v) for v in value]
+    return value
+
+
+def _unwrap_filter(query: Any) -> Dict[str, Any]:
+    # The tool schema asks for the query wrapped in an array for every
+    # operation, but find/countDocuments/distinct take a single filter.
+    if isinstance(query, list):
+        return query[0] if query else {}
+    return query or {}
+
+
+def _field_values(condition: Any) -> Optional[List[str]]:
+    """Exact values a filter condition allows, or None if it is not a plain match."""
+    if isinstance(condition, str):
+        return [condition]
+    if isinstance(condition, dict) and len(condition) == 1:
+        if isinstance(condition.get("$eq"), str):
+            return [condition["$eq"]]
+        values = condition.get("$in")
+        if isinstance(values, list) and all(isinstance(v, str) for v in values):
+            return sorted(values)
+    return None
+
+
+def _date_range(condition: Any) -> Optional[Tuple[Optional[datetime], Optional[datetime]]]:
+    if isinstance(condition, datetime):
+        return condition, condition
+    if not isinstance(condition, dict):
+        return None
+    low = condition.get("$gte", condition.get("$gt"))
+    high = condition.get("$lte", condition.get("$lt"))
+    if not isinstance(low, datetime) and not isinstance(high, datetime):
+        return None
+    return (
+        low if isinstance(low, datetime) else None,
+        high if isinstance(high, datetime) else None,
+    )
+
+
+def _joined_collections(value: Any) -> List[str]:
+    """Collections read by ``$lookup``/``$graphLookup``/``$unionWith`` stages."""
+    joined: List[str] = []
+    if isinstance(value, list):
+        for item in value:
+            joined.extend(_joined_collections(item))
+    elif isinstance(value, dict):
+        for name, spec in value.items():
+            if name in ("$lookup", "$graphLookup") and isinstance(spec, dict):
+                joined.append(spec.get("from"))
+            elif name == "$unionWith":
+                joined.append(spec.get("coll") if isinstance(spec, dict) else spec)
+            joined.extend(_joined_collections(spec))
+    return [c for c in joined if isinstance(c, str)]
+
+
+def query_scope(collection: str, operation: str, query: Any) -> Dict[str, Any]:
+    """What a query result depends on: collections read, portfolios, dates.
+
+    Only top-level conditions of the filter (or of an aggregation's leading
+    ``$match``) narrow the scope; anything else depends on the whole collection.
+    Collections joined in by the pipeline are always depended on as a whole.
+    """
+    source = DERIVED_COLLECTIONS.get(collection, collection)
+    joined = []
+    if operation == "aggregate":
+        first = query[0] if isinstance(query, list) and query else {}
+        conditions = first.get("$match", {}) if isinstance(first, dict) else {}
+        for name in _joined_collections(query):
+            for dependency in (name, DERIVED_COLLECTIONS.get(name, name)):
+                if dependency not in joined and dependency not in (collection, source):
+                    joined.append(dependency)
+    else:
+        conditions = _unwrap_filter(query)
+    if not isinstance(conditions, dict):
+        conditions = {}
+    date_field = DATE_FIELDS.get(collection)
+    return {
+        "collection": source,
+        "queried": collection,
+        "joined": sorted(joined),
+        "portfolios": _field_values(conditions.get(PORTFOLIO_FIELD)),
+        "dates": _date_range(conditions.get(date_field)) if date_field else None,
+    }
+
+
+def _scope_affected(scope: Any, event: ChangeEvent) -> bool:
+    if not isinstance(scope, dict):
+        return False
+    if event.collection in scope.get("joined", []):
+        return True
+    if event.collection not in (scope.get("collection"), scope.get("queried")):
+        return False
+    if event.collection_wide:
+        return True
+    portfolios = scope["portfolios"]
+    if portfolios is not None and event.portfolio is not None and event.portfolio not in portfolios:
+        return False
+    dates = scope["dates"]
+    if dates is not None and event.date is not None:
+        low, high = dates
+        if (low and event.date < low) or (high and event.date > high):
+            return False
+    return True
+
+
+def invalidate_query_cache(event: ChangeEvent) -> int:
+    """Change-watcher subscriber: evict cached results the write may affect."""
+    evicted = query_result_cache.evict_where(lambda scope: _scope_affected(scope, event))
+    if evicted:
+        logger.info(f"Evicted {evicted} cached results after {event}")
+    return evicted
+
+
+def _read_page(cursor: Any, read_ahead: List[Any], size: int) -> Tuple[List[Any], List[Any]]:
+    """Up to ``size`` rows, plus one row read ahead to tell whether more exist."""
+    rows = list(read_ahead)
+    rows.extend(itertools.islice(cursor, size + 1 - len(rows)))
+    return rows[:size], rows[size:]
+
+
+def _next_token(
+    cursor: Any,
+    page: List[Any],
+    read_ahead: List[Any],
+    page_key: str,
+    after: Optional[List[Any]],
+    offset: int,
+    pageable: bool,
+) -> Optional[str]:
+    if not pageable or not page or not read_ahead:
+        # Never hand out a token for an empty page: it could be followed forever.
+        cursor.close()
+        return None
+    return encode_token(
+        {
+            "key": page_key,
+            "after": after,
+            "offset": offset,
+            "cursor": get_cursor_registry().put(page_key, cursor, read_ahead),
+        }
+    )
+
+
+def _summarize(
+    coll: Any, collection: str, pipeline: List[Dict[str, Any]], sample: List[Dict[str, Any]]
+) -> Optional[Dict[str, Any]]:
+    """Totals, top groups and histograms over everything ``pipeline`` yields.
+
+    Returns None when the database cannot compute them.
+    """
+    if collection in SUMMARY_NUMERIC_FIELDS and not any(
+        "$group" in stage or "$project" in stage for stage in pipeline
+    ):
+        numeric = SUMMARY_NUMERIC_FIELDS[collection]
+        group = SUMMARY_GROUP_FIELDS[collection]
+    else:
+        # Reshaped aggregation output: summarize the fields it actually has.
+        detected = detect_fields(sample)
+        numeric, group = detected["numeric"], detected["group"]
+    try:
+        facet = list(
+            coll.aggregate(pipeline + [summary_facet(numeric, group)], allowDiskUse=True)
+        )
+    except Exception as e:
+        # e.g. the $facet document or memory limit on a wide result: the caller
+        # falls back to returning rows.
+        logger.warning(f"Summary of {collection} failed, returning rows instead: {e}")
+        return None
+    return format_summary(facet[0] if facet else {}, numeric, group)
+
+
+def _run_query(
+    collection: str,
+    operation: str,
+    query: Any,
+    options: Dict[str, Any],
+    field: Optional[str],
+    page_token: Optional[str] = None,
+    summarize: Optional[str] = None,
+) -> Tuple[List[Any], int, Optional[str], Optional[Dict[str, Any]]]:
+    db = get_db()
+    coll = db.get_collection(collection)
+    registry = get_cursor_registry()
+
+    results = []
+    count = 0
+    next_token = None
+    summary = None
+    summarize = summarize or "auto"
+    threshold = settings.summarize_threshold_rows
+    sample_rows = settings.summary_sample_rows
+
+    page_key = canonical_key(
+        collection, operation, query, options.get("sort"), options.get("projection"), field
+    )
+    state = decode_token(page_token) if page_token else None
+    if state is not None and state["key"] != page_key:
+        raise ValueError(
+            "cursor belongs to a different query; repeat the same collection, "
+            "operation, query and options as the page it came from"
+        )
+    live = registry.take(state.get("cursor"), page_key) if state else None
+    offset = state["offset"] if state else options.get("skip", 0)
+    # An explicit limit ("top 3 by MV_Base") is the whole answer: continuation
+    # tokens (and their open cursors) only for pages the size cap cut short.
+    pageable = bool(state) or options.get("clamped", False)
+
+    # A page of at most ``limit`` rows ("top 10 by MV_Base") is never too
+    # large, however many rows match.
+    if summarize == "auto" and options["limit"] <= threshold:
+        summarize = "never"
+
+    summary_failed = False
+    if operation == "find" and not state and summarize != "never":
+        conditions = _unwrap_filter(query)
+        skip = options.get("skip", 0)
+        if summarize == "always":
+            matched = None
+        else:
+            # Capped count: cheap even when the filter matches millions of rows.
+            matched = coll.count_documents(conditions, skip=skip, limit=threshold + 1)
+        if matched is None or matched > threshold:
+            sort = list(options["sort"].items()) if options.get("sort") else [("_id", 1)]
+            results = list(
+                coll.find(conditions, options.get("projection"))
+                .sort(sort)
+                .skip(skip)
+                .limit(sample_rows)
+            )
+            # Describe the rows the query selects: after its skip and, unless
+            # the limit is only the size cap, up to its limit.
+            pipeline: List[Dict[str, Any]] = [{"$match": conditions}]
+            if skip or not options.get("clamped"):
+                pipeline.append({"$sort": dict(sort)})
+            if skip:
+                pipeline.append({"$skip": skip})
+            if not options.get("clamped"):
+                pipeline.append({"$limit": options["limit"]})
+            summary = _summarize(coll, collection, pipeline, results)
+            if summary is None:
+                summary_failed = True
+            else:
+                count = summary["count"]
+
+    if operation == "find" and summary is None:
+        size = options["limit"]
+        spec = keyset_sort(options.get("sort"))
+        projection, hidden = with_sort_fields(options.get("projection"), spec)
+        if live:
+            cursor, read_ahead = live
+        else:
+            conditions = _unwrap_filter(query)
+            keyset = bool(state and state.get("after")) and None not in state["after"]
+            if keyset:
+                # Keyset page: an index range scan, whatever the depth.
+                conditions = {"$and": [conditions, keyset_filter(spec, state["after"])]}
+            cursor = coll.find(conditions, projection).sort(spec)
+            if state and not keyset:
+                # Null sort keys cannot be range-compared; fall back to skip.
+                cursor = cursor.skip(offset)
+            elif not state and "skip" in options:
+                cursor = cursor.skip(options["skip"])
+            cursor = cursor.batch_size(size + 1)
+            read_ahead = []
+
+        results, read_ahead = _read_page(cursor, read_ahead, size)
+        after = sort_values(results[-1], spec) if results else None
+        next_token = _next_token(
+            cursor, results, read_ahead, page_key, after, offset + len(results), pageable
+        )
+        for row in results:
+            for name in hidden:
+                row.pop(name, None)
+        count = len(results)
+
+    elif operation == "aggregate":
+        pipeline = list(query)
+
+        has_limit = any("$limit" in stage for stage in pipeline)
+        if has_limit:
+            results = list(coll.aggregate(pipeline))
+        else:
+            size = options.get("limit", 1000)
+            if live:
+                cursor, read_ahead = live
+            else:
+                if state:
+                    pipeline.append({"$skip": offset})
+                cursor = coll.aggregate(pipeline, batchSize=size + 1)
+                read_ahead = []
+            results, read_ahead = _read_page(cursor, read_ahead, size)
+            too_large = len(results) > threshold
+            if not state and (summarize == "always" or (summarize == "auto" and too_large)):
+                summary = _summarize(coll, collection, list(query), results)
+                summary_failed = summary is None
+            if summary is not None:
+                cursor.close()
+                results = results[:sample_rows]
+            else:
+                next_token = _next_token(
+                    cursor, results, read_ahead, page_key, None, offset + len(results), pageable
+                )
+        count = summary["count"] if summary else len(results)
+
+    elif operation == "countDocuments":
+        count = coll.count_documents(_unwrap_filter(query))
+        results = [{"count": count}]
+
+    elif operation == "distinct":
+        if not field:
+            raise ValueError("Field name required for distinct operation")
+        values = coll.distinct(field, _unwrap_filter(query))
+        results = [{"values": values, "count": len(values)}]
+        count = len(values)
+
+    summary = json.loads(json_util.dumps(summary)) if summary else None
+    if summary_failed:
+        summary = {SUMMARY_FAILED: True}
+    return json.loads(json_util.dumps(results)), count, next_token, summary
+
+
+def _run_and_cache(
+    key: str,
+    collection: str,
+    operation: str,
+    query: Any,
+    options: Dict[str, Any],
+    field: Optional[str],
+    page_token: Optional[str] = None,
+    summarize: Optional[str] = None,
+) -> Tuple[List[Any], int, Optional[str], Optional[Dict[str, Any]]]:
+    result = _run_query(
+        collection, operation, query, options, field, page_token, summarize
+    )
+    # Results read after a reload must not be filed under the pinned version.
+    db = get_db()
+    if db.is_version_current(collection):
+        tag = query_scope(collection, operation, query)
+        tag["data_version"] = db.get_data_version(collection)
+        query_result_cache.set(key, result, tag=tag)
+    return result
+
+
+def warm_query_cache() -> int:
+    """Restore persisted results computed from the current data versions."""
+    versions = get_db().get_live_data_versions(max_age_ms=0)
+
+    def is_current(tag: Any) -> bool:
+        return isinstance(tag, dict) and tag.get("data_version") == versions.get(
+            tag.get("collection"), 0
+        )
+
+    loaded = query_result_cache.warm(is_current)
+    logger.info(f"Warm start: restored {loaded} cached query results")
+    return loaded
+
+
 def execute_mongodb_query(
     collection: str,
     operation: str,
     query: Dict = {},
     options: Optional[Dict[str, Any]] = None,
     field: Optional[str] = None,
+    cursor: Optional[str] = None,
+    summarize: Optional[str] = None,
 ) -> str:
     try:
         params = {
@@ -65,76 +524,38 @@ def execute_mongodb_query(
 
         options = query_validator.apply_safety_limits(options or {})
 
-        db = get_db()
-        coll = db.get_collection(collection)
+        if operation == "aggregate":
+            query = _normalize_pipeline(query)
+        query = _decode_dates(query)
 
-        results = []
-        count = 0
+        # Keyed on the data version (pinned for the whole LLM run), so a reload
+        # never serves results computed from the previous data.
+        db = get_db()
+        data_version = db.get_data_version(collection)
+        key = canonical_key(
+            collection, operation, query, options, field, data_version, cursor, summarize
+        )
+        cached = query_result_cache.get(key)
+        if cached is not None:
+            results_json, count, next_cursor, summary = cached
+            source = "cache"
+        else:
+            # Only real database work counts against the user's query budget.
+            get_scheduler().charge_db(operation, query)
 
-        if operation == "find":
-            cursor = coll.find(
-                query[0] if isinstance(query, list) else query,
-                options.get("projection"),
+            # Identical queries issued concurrently (e.g. many analysts asking
+            # the same question) share a single round trip to MongoDB.
+            (results_json, count, next_cursor, summary), shared = query_flight.do(
+                key,
+                lambda: _run_and_cache(
+                    key, collection, operation, query, options, field, cursor, summarize
+                ),
             )
-            if "sort" in options:
-                cursor = cursor.sort(list(options["sort"].items()))
-            if "limit" in options:
-                cursor = cursor.limit(options["limit"])
-            if "skip" in options:
-                cursor = cursor.skip(options["skip"])
-
-            results = list(cursor)
-            count = len(results)
-
-        elif operation == "aggregate":
-            pipeline = query if isinstance(query, list) else [query]
-
-            normalized_pipeline = []
-            for i, stage in enumerate(pipeline):
-                if isinstance(stage, str):
-                    try:
-                        parsed_stage = json.loads(stage)
-                        logger.info(
-                            f"Converted pipeline stage {i} from JSON string to dict"
-                        )
-                        normalized_pipeline.append(parsed_stage)
-                    except json.JSONDecodeError:
-                        raise ValueError(
-                            f"Pipeline stage {i} is an invalid JSON string. "
-                            f"Each stage must be a valid dictionary/object or JSON string."
-                        )
-                elif not isinstance(stage, dict):
-                    raise ValueError(
-                        f"Pipeline stage {i} must be a dictionary/object, got {type(stage).__name__}"
-                    )
-                else:
-                    normalized_pipeline.append(stage)
-
-            pipeline = normalized_pipeline
-
-            has_limit = any("$limit" in stage for stage in pipeline)
-            if not has_limit:
-                pipeline.append({"$limit": options.get("limit", 1000)})
-
-            results = list(coll.aggregate(pipeline))
-            count = len(results)
-
-        elif operation == "countDocuments":
-            count = coll.count_documents(query if isinstance(query, list) else query)
-            results = [{"count": count}]
-
-        elif operation == "distinct":
-            if not field:
-                raise ValueError("Field name required for distinct operation")
-            values = coll.distinct(field, query if isinstance(query, list) else query)
-            results = [{"values": values, "count": len(values)}]
-            count = len(values)
-
-        results_json = json.loads(json_util.dumps(results))
+            source = "shared in-flight" if shared else "database"
 
         logger.info(
             f"Query executed successfully: {collection}.{operation}, "
-            f"returned {count} results"
+            f"returned {count} results ({source})"
         )
 
         response_dict = {
@@ -145,15 +566,80 @@ def execute_mongodb_query(
                 "collection": collection,
                 "operation": operation,
                 "executed_at": datetime.utcnow().isoformat(),
+                "data_version": data_version,
             },
         }
 
+        if next_cursor:
+            response_dict["has_more"] = True
+            response_dict["next_cursor"] = next_cursor
+
+        # Read fresh: a reload by another process must not go unnoticed for
+        # the registry's cache lifetime.
+        if source != "cache" and not db.is_version_current(collection, max_age_ms=0):
+            # The collection was swapped after this run pinned its version;
+            # LLMEngine restarts the run on the new data.
+            logger.warning(
+                f"{collection} was reloaded during this answer "
+                f"(pinned version {data_version})"
+            )
+            response_dict["query_info"]["data_version_changed"] = True
+
+        # Inside an LLM run, keep the full result server-side and only send a
+        # preview plus column stats when it is large; the calculator can pull
+        # whole columns by handle (e.g. "r1.MV_Base").
+        if summary is not None and summary.get(SUMMARY_FAILED):
+            # The summary could not be computed; these are plain rows.
+            response_dict["summarized"] = False
+            summary = None
+        if summary is not None:
+            response_dict["summarized"] = True
+            response_dict["summary"] = summary
+            response_dict["note"] = (
+                f"{count} rows matched; 'summary' holds totals, top groups and "
+                f"histograms computed over all of them, 'data' is a sample of "
+                f"{len(results_json)}. Answer from the summary; rerun with "
+                f"summarize='never' only if individual rows are needed."
+            )
+
+        store = get_current_store()
+        if store is not None and summary is None:
+            handle = store.put(results_json)
+            response_dict["result_id"] = handle
+            inline_rows = settings.result_inline_rows
+            if len(results_json) > inline_rows:
+                response_dict["data"] = results_json[:inline_rows]
+                response_dict["truncated"] = True
+                response_dict["summary"] = summarize_rows(results_json)
+                response_dict["note"] = (
+                    f"Showing {inline_rows} of {len(results_json)} rows. The full "
+                    f"result is stored as '{handle}'; pass columns to "
+                    f"execute_calculator like {handle}.FIELD instead of copying values."
+                )
+        if next_cursor:
+            response_dict["note"] = (
+                response_dict.get("note", "") + " More rows match: repeat the query "
+                "with cursor=next_cursor for the next page instead of using skip."
+            ).strip()
+
         return json.dumps(response_dict)
 
     except ValueError as e:
         logger.warning(f"Query validation failed: {e}")
         return json.dumps({"success": False, "error": str(e), "data": [], "count": 0})
 
+    except SchedulerBusy as e:
+        return json.dumps(
+            {
+                "success": False,
+                "error": str(e),
+                "busy": True,
+                "retry_after": e.retry_after,
+                "data": [],
+                "count": 0,
+            }
+        )
+
     except Exception as e:
         logger.error(f"Query execution failed: {e}")
         return json.dumps(
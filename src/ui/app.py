@@ -1,16 +1,25 @@
 import streamlit as st
 from datetime import datetime
 import json
-from typing import Optional, List, Dict, Any
+import threading
+import time
+import uuid
+from typing import Optional, List, Dict, Any, Tuple
 from bson import ObjectId
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
+from src.core.config import settings
 from src.core.database import get_db
 from src.core.llm_engine import get_llm_engine
-from src.core.chat_model import ChatSession
+from src.core.chat_model import ChatRecord
+from src.core.prefetcher import get_prefetcher
+from src.core.change_watcher import get_change_watcher
+from src.core.schema_catalog import get_schema_catalog
+from src.data.timeseries import get_rollup_refresher
+from src.tools.mongodb_tool import invalidate_query_cache, warm_query_cache
 
 import logging
 from dotenv import load_dotenv
@@ -78,6 +87,14 @@ def init_database():
     try:
         db = get_db()
         db.connect()
+        db.ensure_indexes()
+        watcher = get_change_watcher()
+        watcher.subscribe(invalidate_query_cache)
+        watcher.subscribe(get_rollup_refresher().on_change)
+        watcher.subscribe(get_schema_catalog().on_change)
+        watcher.start()
+        # Restore cached results from before the restart without delaying startup.
+        threading.Thread(target=warm_query_cache, name="cache-warm", daemon=True).start()
         return db
     except Exception as e:
         st.error(f"Failed to connect to database: {e}")
@@ -90,43 +107,92 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 if "chat_title" not in st.session_state:
     st.session_state.chat_title = "New Chat"
+if "older_message_count" not in st.session_state:
+    st.session_state.older_message_count = 0
+if "visible_messages" not in st.session_state:
+    st.session_state.visible_messages = settings.chat_render_window
+if "message_blocks" not in st.session_state:
+    st.session_state.message_blocks = {}
+if "chat_list_pages" not in st.session_state:
+    st.session_state.chat_list_pages = 1
 if "db_initialized" not in st.session_state:
     st.session_state.db = init_database()
     st.session_state.llm = get_llm_engine()
+    # Rate limits and fair queuing are per browser session.
+    st.session_state.user_id = uuid.uuid4().hex
     st.session_state.db_initialized = True
 
 
 def create_new_chat() -> Optional[str]:
     try:
         db = st.session_state.db
-        chat_session = ChatSession()
-        chat_dict = chat_session.to_dict()
-        insert_result = db.chat_sessions.insert_one(chat_dict)
+        insert_result = db.chat_sessions.insert_one(ChatRecord().to_document())
+        invalidate_chat_list()
         return str(insert_result.inserted_id)
     except Exception as e:
         st.error(f"Error creating new chat: {e}")
         return None
 
 
-def load_chat_history(chat_id: str) -> Optional[Dict[str, Any]]:
+def _message_from_doc(doc: Dict[str, Any], message_id: str) -> Dict[str, Any]:
+    # Documents in chat_sessions are written by this app, so they are read
+    # back as plain dicts without rebuilding pydantic models.
+    timestamp = doc.get("timestamp")
+    return {
+        "id": message_id,
+        "role": doc.get("role"),
+        "content": doc.get("content"),
+        "timestamp": (
+            timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp
+        ),
+        "query_used": doc.get("query_used"),
+    }
+
+
+def new_message(role: str, content: str, query_used: Any = None) -> Dict[str, Any]:
+    return {
+        "id": uuid.uuid4().hex,
+        "role": role,
+        "content": content,
+        "timestamp": datetime.now().isoformat(),
+        "query_used": query_used,
+    }
+
+
+def load_chat_history(
+    chat_id: str, limit: int = settings.chat_render_window
+) -> Optional[Dict[str, Any]]:
+    """Load the title and only the newest ``limit`` messages of a chat."""
     try:
         db = st.session_state.db
-        chat_doc = db.chat_sessions.find_one({"_id": ObjectId(chat_id)})
-        if not chat_doc:
+        docs = list(
+            db.chat_sessions.aggregate(
+                [
+                    {"$match": {"_id": ObjectId(chat_id)}},
+                    {
+                        "$project": {
+                            "title": 1,
+                            "total": {"$size": {"$ifNull": ["$messages", []]}},
+                            "messages": {
+                                "$slice": [{"$ifNull": ["$messages", []]}, -limit]
+                            },
+                        }
+                    },
+                ]
+            )
+        )
+        if not docs:
             return None
 
-        chat_session = ChatSession.from_dict(chat_doc)
+        chat_doc = docs[0]
+        older = chat_doc["total"] - len(chat_doc["messages"])
         return {
             "chat_id": chat_id,
-            "title": chat_session.title,
+            "title": chat_doc.get("title", "New Chat"),
+            "older_message_count": older,
             "messages": [
-                {
-                    "role": msg.role,
-                    "content": msg.content,
-                    "timestamp": msg.timestamp.isoformat(),
-                    "query_used": msg.query_used,
-                }
-                for msg in chat_session.messages
+                _message_from_doc(msg, f"{chat_id}:{older + i}")
+                for i, msg in enumerate(chat_doc["messages"])
             ],
         }
     except Exception as e:
@@ -134,38 +200,107 @@ def load_chat_history(chat_id: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def list_all_chats() -> List[Dict[str, Any]]:
-    try:
-        db = st.session_state.db
-        chats = list(db.chat_sessions.find().sort("updated_at", -1))
+def load_older_messages(chat_id: str, older: int, limit: int) -> List[Dict[str, Any]]:
+    """Fetch up to ``limit`` messages that precede the ``older``-th one."""
+    start = max(older - limit, 0)
+    chat_doc = st.session_state.db.chat_sessions.find_one(
+        {"_id": ObjectId(chat_id)},
+        {"_id": 0, "messages": {"$slice": [start, older - start]}},
+    )
+    if not chat_doc:
+        return []
+    return [
+        _message_from_doc(msg, f"{chat_id}:{start + i}")
+        for i, msg in enumerate(chat_doc.get("messages", []))
+    ]
+
+
+@st.cache_data(ttl=settings.chat_list_cache_ttl_seconds, show_spinner=False)
+def list_chats_page(
+    after: Optional[Tuple[str, str]] = None,
+    page_size: int = settings.chat_list_page_size,
+) -> Tuple[List[Dict[str, Any]], Optional[Tuple[str, str]]]:
+    """One page of the sidebar listing, newest first.
 
-        return [
+    ``after`` is the (updated_at, _id) of the last chat of the previous page.
+    Only titles, counts and timestamps are read; messages never leave the server.
+    """
+    db = get_db()
+    pipeline = []
+    if after:
+        updated_at, chat_id = datetime.fromisoformat(after[0]), ObjectId(after[1])
+        pipeline.append(
             {
-                "id": str(chat["_id"]),
-                "title": chat.get("title", "New Chat"),
-                "message_count": len(chat.get("messages", [])),
-                "created_at": (
-                    chat.get("created_at").isoformat()
-                    if chat.get("created_at")
-                    else None
-                ),
-                "updated_at": (
-                    chat.get("updated_at").isoformat()
-                    if chat.get("updated_at")
-                    else None
-                ),
+                "$match": {
+                    "$or": [
+                        {"updated_at": {"$lt": updated_at}},
+                        {"updated_at": updated_at, "_id": {"$lt": chat_id}},
+                    ]
+                }
+            }
+        )
+    pipeline += [
+        {"$sort": {"updated_at": -1, "_id": -1}},
+        {"$limit": page_size + 1},
+        {
+            "$project": {
+                "title": 1,
+                "created_at": 1,
+                "updated_at": 1,
+                "message_count": {"$size": {"$ifNull": ["$messages", []]}},
             }
-            for chat in chats
-        ]
+        },
+    ]
+    chats = list(db.chat_sessions.aggregate(pipeline))
+
+    page = [
+        {
+            "id": str(chat["_id"]),
+            "title": chat.get("title", "New Chat"),
+            "message_count": chat.get("message_count", 0),
+            "created_at": (
+                chat.get("created_at").isoformat()
+                if chat.get("created_at")
+                else None
+            ),
+            "updated_at": (
+                chat.get("updated_at").isoformat()
+                if chat.get("updated_at")
+                else None
+            ),
+        }
+        for chat in chats[:page_size]
+    ]
+    next_cursor = None
+    if len(chats) > page_size and page[-1]["updated_at"]:
+        next_cursor = (page[-1]["updated_at"], page[-1]["id"])
+    return page, next_cursor
+
+
+def list_chats(pages: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """The first ``pages`` pages of chats, and whether more remain."""
+    chats: List[Dict[str, Any]] = []
+    cursor = None
+    try:
+        for _ in range(pages):
+            page, cursor = list_chats_page(cursor)
+            chats.extend(page)
+            if cursor is None:
+                break
     except Exception as e:
         st.error(f"Error loading chats: {e}")
-        return []
+    return chats, cursor is not None
+
+
+def invalidate_chat_list():
+    list_chats_page.clear()
 
 
 def delete_chat(chat_id: str) -> bool:
     try:
         db = st.session_state.db
         result = db.chat_sessions.delete_one({"_id": ObjectId(chat_id)})
+        invalidate_chat_list()
         return result.deleted_count > 0
     except Exception as e:
         st.error(f"Error deleting chat: {e}")
@@ -184,33 +319,62 @@ def process_user_query(
             if not chat_doc:
                 st.error("Chat session not found")
                 return None
-            chat_session = ChatSession.from_dict(chat_doc)
+            chat_record = ChatRecord.from_document(chat_doc)
         else:
-            chat_session = ChatSession()
+            chat_record = ChatRecord()
 
-        history = [
-            {"role": msg.role, "content": msg.content} for msg in chat_session.messages
-        ]
+        started = time.perf_counter()
+        result = llm.process_query(
+            user_message, chat_record.history(), user_id=st.session_state.user_id
+        )
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        if result.get("busy"):
+            # Shed under load: show the notice but keep it out of the history.
+            return {
+                "answer": result["answer"],
+                "query_used": None,
+                "data": None,
+                "chat_id": chat_id,
+                "success": False,
+            }
 
-        result = llm.process_query(user_message, history)
+        # Warm the cache with the likely follow-up queries while the user is
+        # reading this answer.
+        prefetcher = get_prefetcher()
+        previous_queries = next(
+            (
+                msg.query_used
+                for msg in reversed(chat_record.messages)
+                if msg.role == "assistant" and msg.query_used
+            ),
+            None,
+        )
+        prefetcher.observe(previous_queries, result.get("query_used"))
+        prefetcher.prefetch_after(result.get("query_used"))
 
-        chat_session.add_message("user", user_message)
-        chat_session.add_message(
+        now = datetime.utcnow()
+        chat_record.add_message("user", user_message, now=now)
+        chat_record.add_message(
             "assistant",
             result["answer"],
             query_used=result.get("query_used"),
             data=result.get("data"),
+            now=now,
+            success=result["success"],
+            latency_ms=round(latency_ms, 1),
+            failed_queries=result.get("failed_queries"),
         )
 
-        chat_dict = chat_session.to_dict()
-        if chat_session.id:
+        if chat_record.id:
             db.chat_sessions.update_one(
-                {"_id": ObjectId(chat_session.id)}, {"$set": chat_dict}
+                {"_id": ObjectId(chat_record.id)}, chat_record.pending_update()
             )
-            final_chat_id = chat_session.id
+            final_chat_id = chat_record.id
         else:
-            insert_result = db.chat_sessions.insert_one(chat_dict)
+            insert_result = db.chat_sessions.insert_one(chat_record.to_document())
             final_chat_id = str(insert_result.inserted_id)
+        invalidate_chat_list()
 
         return {
             "answer": result["answer"],
@@ -254,13 +418,16 @@ with st.sidebar:
         if chat_id:
             st.session_state.current_chat_id = chat_id
             st.session_state.messages = []
+            st.session_state.older_message_count = 0
             st.session_state.chat_title = "New Chat"
+            st.session_state.visible_messages = settings.chat_render_window
+            st.session_state.message_blocks = {}
             st.rerun()
 
     st.markdown("---")
 
     st.subheader(" Chat History")
-    chats = list_all_chats()
+    chats, has_more = list_chats(st.session_state.chat_list_pages)
 
     if chats:
         for chat in chats:
@@ -278,6 +445,11 @@ with st.sidebar:
                         st.session_state.current_chat_id = chat["id"]
                         st.session_state.chat_title = history["title"]
                         st.session_state.messages = history["messages"]
+                        st.session_state.older_message_count = history[
+                            "older_message_count"
+                        ]
+                        st.session_state.visible_messages = settings.chat_render_window
+                        st.session_state.message_blocks = {}
                         st.rerun()
             with col2:
                 if st.button("X", key=f"delete_{chat['id']}"):
@@ -285,8 +457,14 @@ with st.sidebar:
                         if st.session_state.current_chat_id == chat["id"]:
                             st.session_state.current_chat_id = None
                             st.session_state.messages = []
+                            st.session_state.older_message_count = 0
                             st.session_state.chat_title = "New Chat"
+                            st.session_state.visible_messages = settings.chat_render_window
+                            st.session_state.message_blocks = {}
                         st.rerun()
+        if has_more and st.button("Load more", use_container_width=True):
+            st.session_state.chat_list_pages += 1
+            st.rerun()
     else:
         st.info("No chat history yet. Start a new chat!")
 
@@ -311,40 +489,85 @@ with st.sidebar:
 
 st.title(st.session_state.chat_title)
 
-for message in st.session_state.messages:
-    role = message["role"]
-    content = message.get("content")
+def get_message_block(message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Render-ready view of a message, computed once per message ID."""
+    blocks = st.session_state.message_blocks
+    message_id = message.get("id")
+    if message_id in blocks:
+        return blocks[message_id]
 
+    block = None
     # Skip messages with None content (function call intermediates)
-    if not content:
-        continue
+    if message.get("content"):
+        queries = message.get("query_used") if message["role"] == "assistant" else None
+        if isinstance(queries, str):
+            queries = [queries]
+        block = {
+            "role": message["role"],
+            "content": message["content"],
+            "queries": queries or [],
+            "expander_label": (
+                f"🔍 View MongoDB Query ({len(queries)})"
+                if queries and len(queries) > 1
+                else "🔍 View MongoDB Query"
+            ),
+        }
+    if message_id:
+        blocks[message_id] = block
+    return block
+
+
+def show_older_messages():
+    window = settings.chat_render_window
+    st.session_state.visible_messages += window
+    missing = st.session_state.visible_messages - len(st.session_state.messages)
+    if missing > 0 and st.session_state.older_message_count:
+        older = load_older_messages(
+            st.session_state.current_chat_id,
+            st.session_state.older_message_count,
+            max(missing, window),
+        )
+        st.session_state.messages = older + st.session_state.messages
+        st.session_state.older_message_count -= len(older)
 
-    with st.chat_message(role):
-        st.markdown(content)
 
-        if role == "assistant" and message.get("query_used"):
-            queries = message["query_used"]
-            if isinstance(queries, str):
-                queries = [queries]
+@st.fragment
+def render_history():
+    # Clicking "Show older messages" reruns only this fragment.
+    hidden = (
+        max(len(st.session_state.messages) - st.session_state.visible_messages, 0)
+        + st.session_state.older_message_count
+    )
+    if hidden:
+        st.button(f"Show older messages ({hidden})", on_click=show_older_messages)
 
-            with st.expander(
-                f"🔍 View MongoDB Query ({len(queries)})"
-                if len(queries) > 1
-                else "🔍 View MongoDB Query"
-            ):
-                for i, query in enumerate(queries):
-                    if len(queries) > 1:
-                        st.markdown(f"**Query {i+1}**")
-                    st.code(query, language="json")
+    messages = st.session_state.messages
+    visible = st.session_state.visible_messages
+    for message in messages[-visible:]:
+        block = get_message_block(message)
+        if block is None:
+            continue
+
+        with st.chat_message(block["role"]):
+            st.markdown(block["content"])
+
+            queries = block["queries"]
+            if queries:
+                with st.expander(block["expander_label"]):
+                    for i, query in enumerate(queries):
+                        if len(queries) > 1:
+                            st.markdown(f"**Query {i+1}**")
+                        st.code(query, language="json")
+
+
+render_history()
 
 
 if "example_query" in st.session_state:
     user_input = st.session_state.example_query
     del st.session_state.example_query
 
-    st.session_state.messages.append(
-        {"role": "user", "content": user_input, "timestamp": datetime.now().isoformat()}
-    )
+    st.session_state.messages.append(new_message("user", user_input))
 
     with st.spinner("🤔 Thinking..."):
         result = process_user_query(user_input, st.session_state.current_chat_id)
@@ -354,15 +577,13 @@ if "example_query" in st.session_state:
             st.session_state.current_chat_id = result["chat_id"]
 
         st.session_state.messages.append(
-            {
-                "role": "assistant",
-                "content": result["answer"],
-                "timestamp": datetime.now().isoformat(),
-                "query_used": result.get("query_used"),
-            }
+            new_message("assistant", result["answer"], result.get("query_used"))
         )
 
-        if len(st.session_state.messages) == 2:
+        if (
+            len(st.session_state.messages) == 2
+            and not st.session_state.older_message_count
+        ):
             st.session_state.chat_title = user_input[:50] + (
                 "..." if len(user_input) > 50 else ""
             )
@@ -372,9 +593,7 @@ if "example_query" in st.session_state:
 user_input = st.chat_input("Ask a question about your stock holdings and trades...")
 
 if user_input:
-    st.session_state.messages.append(
-        {"role": "user", "content": user_input, "timestamp": datetime.now().isoformat()}
-    )
+    st.session_state.messages.append(new_message("user", user_input))
 
     with st.spinner("🤔 Thinking..."):
         result = process_user_query(user_input, st.session_state.current_chat_id)
@@ -384,15 +603,13 @@ if user_input:
             st.session_state.current_chat_id = result["chat_id"]
 
         st.session_state.messages.append(
-            {
-                "role": "assistant",
-                "content": result["answer"],
-                "timestamp": datetime.now().isoformat(),
-                "query_used": result.get("query_used"),
-            }
+            new_message("assistant", result["answer"], result.get("query_used"))
         )
 
-        if len(st.session_state.messages) == 2:
+        if (
+            len(st.session_state.messages) == 2
+            and not st.session_state.older_message_count
+        ):
             st.session_state.chat_title = user_input[:50] + (
                 "..." if len(user_input) > 50 else ""
             )
@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.tools.calculator_tool import evaluate, execute_calculator  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    [
+        ("2 + 3 * 4", 14),
+        ("-(7 // 2) % 5", 2),
+        ("2 ** 10", 1024),
+        ("round(sqrt(16) + pi, 2)", 7.14),
+        ("max(1, 5, 3)", 5),
+    ],
+)
+def test_whitelisted_arithmetic(expression, expected):
+    assert evaluate(expression) == pytest.approx(expected)
+
+
+def test_arrays_and_indexing():
+    assert evaluate("sum(mv * 2)", {"mv": [1, 2, None]}) == 6
+    assert evaluate("mv[-1]", {"mv": [1, 2, 3]}) == 3
+    with pytest.raises(ValueError, match="Index must be an integer"):
+        evaluate("mv[0.5]", {"mv": [1, 2, 3]})
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "__import__('os')",
+        "open('/etc/passwd')",
+        "abs.__call__(1)",
+        "(1).real",
+        "x.__class__",
+        "r1.MV_Base.__class__",
+        "[].copy()",
+        "lambda: 1",
+        "1 if 1 else 2",
+        "'text'",
+        "sum(x, start=1)",
+        "1 < 2",
+    ],
+)
+def test_rejects_nodes_outside_the_whitelist(expression):
+    with pytest.raises(ValueError):
+        evaluate(expression, {"x": 1})
+
+
+def test_tool_reports_rejections_and_non_finite_results():
+    rejected = json.loads(execute_calculator(expression="__import__('os').getcwd()"))
+    assert rejected["success"] is False
+    assert "Unsupported function" in rejected["error"]
+
+    batch = json.loads(
+        execute_calculator(expressions={"ok": "1 + 1", "bad": "1 / 0"})
+    )
+    assert batch["results"] == {"ok": 2}
+    assert "bad" in batch["errors"]
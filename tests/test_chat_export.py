@@ -0,0 +1,45 @@
+import os
+import random
+from collections import Counter
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.data.chat_export import BoundedCounter  # noqa: E402
+
+
+def _stream(seed=7, length=5000):
+    rng = random.Random(seed)
+    heavy = ["q1"] * 900 + ["q2"] * 600 + ["q3"] * 400
+    tail = [f"rare{rng.randrange(2000)}" for _ in range(length - len(heavy))]
+    stream = heavy + tail
+    rng.shuffle(stream)
+    return stream
+
+
+def test_exact_below_capacity():
+    counter = BoundedCounter(capacity=10)
+    for key in "abacabad":
+        counter.add(key)
+    assert counter.most_common(2) == [("a", 4), ("b", 2)]
+
+
+def test_space_saving_error_bounds():
+    capacity = 50
+    stream = _stream()
+    counter = BoundedCounter(capacity)
+    for key in stream:
+        counter.add(key)
+    true = Counter(stream)
+    bound = len(stream) / capacity
+
+    assert len(counter.counts) == capacity
+    # Once full, the counters always add up to the stream length.
+    assert sum(counter.counts.values()) == len(stream)
+    assert counter._min_count == min(counter.counts.values())
+    for key, count in counter.counts.items():
+        assert true[key] <= count <= true[key] + bound
+    # Every key more frequent than N / capacity is kept.
+    for key, count in true.items():
+        if count > bound:
+            assert key in counter.counts
+    assert [key for key, _ in counter.most_common(3)] == ["q1", "q2", "q3"]
@@ -0,0 +1,49 @@
+import csv
+import io
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.data.ingestion import plan_chunks  # noqa: E402
+
+ROWS = [
+    ["1", "Plain", "10"],
+    ["2", "Line one\nline two", "20"],
+    ["3", 'Says "hi"\r\nand, leaves', "30"],
+    ["4", "Ends with newline\n", "40"],
+    ["5", '"\n"', "50"],
+    ["6", "", "60"],
+] * 5
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "trades.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["TradeId", "Comment", "Qty"])
+        writer.writerows(ROWS)
+    return str(path)
+
+
+def _read(chunk):
+    with open(chunk.path, "rb") as f:
+        f.seek(chunk.start)
+        data = f.read(chunk.end - chunk.start).decode("utf-8")
+    return list(csv.reader(io.StringIO(data, newline="")))
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 7, 16, 50, 1 << 20])
+def test_chunks_split_on_record_boundaries(csv_path, chunk_bytes):
+    chunks = plan_chunks(csv_path, chunk_bytes)
+
+    assert chunks[0].header == ("TradeId", "Comment", "Qty")
+    assert chunks[-1].end == os.path.getsize(csv_path)
+    for previous, following in zip(chunks, chunks[1:]):
+        assert previous.end == following.start
+    # Parsed one by one, the chunks give back exactly the file's rows.
+    assert [row for chunk in chunks for row in _read(chunk)] == ROWS
+    if chunk_bytes == 1:
+        assert len(chunks) == len(ROWS)
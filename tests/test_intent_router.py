@@ -0,0 +1,98 @@
+import contextlib
+import json
+import os
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.core import intent_router as router_module  # noqa: E402
+from src.core.intent_router import IntentRouter  # noqa: E402
+from src.core.scheduler import SchedulerBusy  # noqa: E402
+
+
+class FakeCatalog:
+
+    def __init__(self, close_date_types):
+        self.fields = {
+            "PortfolioName": {"types": ["string"], "values": ["Garnet", "HoldCo 1"]},
+            "CloseDate": {"types": close_date_types},
+            "AsOfDate": {"types": ["date"]},
+        }
+
+    def get(self, collection):
+        return {"fields": self.fields}
+
+    def enum_values(self, collection, field):
+        return self.fields[field].get("values")
+
+
+class FakeDB:
+
+    @contextlib.contextmanager
+    def pin_data_versions(self):
+        yield {}
+
+
+@pytest.fixture
+def executed(monkeypatch):
+    calls = []
+
+    def execute(**params):
+        calls.append(params)
+        return json.dumps({"success": True, "data": [{"count": 42}]})
+
+    monkeypatch.setattr(router_module, "execute_mongodb_query", execute)
+    monkeypatch.setattr(router_module, "get_db", lambda: FakeDB())
+    return calls
+
+
+def _router(monkeypatch, close_date_types):
+    catalog = FakeCatalog(close_date_types)
+    monkeypatch.setattr(router_module, "get_schema_catalog", lambda: catalog)
+    router = IntentRouter()
+    router.enabled = True
+    return router
+
+
+def test_match_extracts_slots(monkeypatch):
+    router = _router(monkeypatch, ["date"])
+    matched = router.match("How many active holdings are there in garnet?")
+
+    assert matched["template"].name == "active_holdings_count"
+    assert matched["slots"] == {"portfolio": "Garnet"}
+    assert matched["confidence"] == 1.0
+
+
+def test_route_answers_matched_template(monkeypatch, executed):
+    router = _router(monkeypatch, ["date"])
+    result = router.route("How many active holdings in Garnet?")
+
+    assert result["fast_path"] == "active_holdings_count"
+    assert "42 active holdings in Garnet" in result["answer"]
+    assert executed == [
+        {
+            "collection": "holdings",
+            "operation": "countDocuments",
+            "query": {"CloseDate": None, "PortfolioName": "Garnet"},
+        }
+    ]
+
+
+def test_route_falls_back_when_dates_are_strings(monkeypatch, executed):
+    # A CloseDate loaded as text is never null, so the template would answer 0.
+    router = _router(monkeypatch, ["string"])
+
+    assert router.route("How many active holdings in Garnet?") is None
+    assert executed == []
+    assert router.get_stats()["hits"] == 0
+
+
+def test_route_sheds_when_the_query_budget_is_spent(monkeypatch):
+    router = _router(monkeypatch, ["date"])
+    busy = {"success": False, "error": "Query budget exhausted", "busy": True, "retry_after": 3}
+    monkeypatch.setattr(router_module, "execute_mongodb_query", lambda **p: json.dumps(busy))
+    monkeypatch.setattr(router_module, "get_db", lambda: FakeDB())
+
+    with pytest.raises(SchedulerBusy):
+        router.route("How many active holdings in Garnet?")
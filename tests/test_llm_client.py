@@ -0,0 +1,102 @@
+import argparse
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import openai
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from benchmarks.fake_llm_server import FakeLLMHandler  # noqa: E402
+from src.core.llm_client import (  # noqa: E402
+    CircuitBreaker,
+    CircuitOpenError,
+    ResilientLLMClient,
+)
+
+
+def test_breaker_lets_one_trial_through_when_half_open():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # A failed trial reopens the circuit for another full reset period.
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.before_call()
+
+
+class RateLimitedOnce(FakeLLMHandler):
+
+    def do_POST(self):
+        super().do_POST()
+        self.config.rate_limit_rate = 0.0
+
+
+@pytest.fixture
+def fake_server():
+    def start(retry_after):
+        RateLimitedOnce.config = argparse.Namespace(
+            latency_ms=0, slow_ms=0, slow_rate=0.0, error_rate=0.0,
+            rate_limit_rate=1.0, retry_after=retry_after,
+        )
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimitedOnce)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        client = ResilientLLMClient(
+            openai.OpenAI(
+                api_key="test",
+                base_url=f"http://127.0.0.1:{server.server_port}/v1",
+                max_retries=0,
+            )
+        )
+        client.max_retries = 2
+        client.backoff_base = 0.001
+        client.hedge_enabled = False
+        return client
+
+    servers = []
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_client_waits_for_retry_after(fake_server):
+    client = fake_server(retry_after=0.5)
+    started = time.monotonic()
+    response = client.create(model="fake", messages=[{"role": "user", "content": "hi"}])
+
+    assert time.monotonic() - started >= 0.5
+    assert response.choices[0].message.content == "Echo: hi"
+    assert client.get_stats()["retries"] == 1
+    assert client.breaker.state == "closed"
+
+
+def test_client_gives_up_when_retry_after_is_too_long(fake_server):
+    client = fake_server(retry_after=60)
+    client.retry_after_max = 5
+    started = time.monotonic()
+    with pytest.raises(openai.RateLimitError):
+        client.create(model="fake", messages=[{"role": "user", "content": "hi"}])
+
+    assert time.monotonic() - started < 5
+    assert client.get_stats()["retries"] == 0
@@ -0,0 +1,48 @@
+import os
+from datetime import datetime
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.core.pagination import keyset_filter, keyset_sort, sort_values  # noqa: E402
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def _pages(coll, sort, size):
+    # Pages the way the query tool does: keyset after a non-null key, skip
+    # after a null one.
+    spec = keyset_sort(sort)
+    rows, after = [], None
+    while True:
+        if after is None:
+            cursor = coll.find({}).sort(spec).skip(len(rows))
+        else:
+            cursor = coll.find(keyset_filter(spec, after)).sort(spec)
+        page = list(cursor.limit(size))
+        if not page:
+            return rows
+        rows.extend(doc["_id"] for doc in page)
+        values = sort_values(page[-1], spec)
+        after = None if None in values else values
+
+
+@pytest.mark.parametrize("direction", [1, -1])
+def test_keyset_pages_keep_null_and_missing_keys(direction):
+    coll = mongomock.MongoClient().db.holdings
+    coll.insert_many(
+        [
+            {"_id": 1, "CloseDate": datetime(2023, 1, 1)},
+            {"_id": 2, "CloseDate": datetime(2023, 3, 1)},
+            {"_id": 3, "CloseDate": datetime(2023, 2, 1)},
+            {"_id": 4, "CloseDate": None},
+            {"_id": 5, "CloseDate": None},
+            {"_id": 6},
+        ]
+    )
+    sort = {"CloseDate": direction}
+    expected = [doc["_id"] for doc in coll.find().sort(keyset_sort(sort))]
+
+    for size in (1, 2, 4):
+        assert _pages(coll, sort, size) == expected
@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from src.core import scheduler as scheduler_module  # noqa: E402
+from src.core.scheduler import FairScheduler, SchedulerBusy, TokenBucket  # noqa: E402
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_at_its_rate(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module.time, "monotonic", clock)
+    bucket = TokenBucket(per_minute=60)
+
+    assert bucket.take(60) == 0
+    assert bucket.take(1) == pytest.approx(1.0)
+    clock.now += 0.5
+    assert bucket.take(1) == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.take(1) == 0
+
+    # Refill stops at capacity however long the bucket sat idle.
+    clock.now += 3600
+    assert bucket.full
+    assert bucket.take(61) == pytest.approx(1.0)
+
+    # Usage above the estimate leaves the bucket in debt.
+    bucket.take(60)
+    bucket.adjust(-30)
+    assert bucket.take(1) == pytest.approx(31.0)
+
+
+def _scheduler():
+    scheduler = FairScheduler()
+    scheduler.max_concurrent = 1
+    scheduler.max_queue = 10
+    scheduler.max_wait = 5
+    return scheduler
+
+
+def test_waiting_runs_are_admitted_in_fair_order():
+    scheduler = _scheduler()
+    admitted = []
+    threads = []
+
+    def run(user):
+        with scheduler.llm_slot(user):
+            admitted.append(user)
+
+    with scheduler.llm_slot("holder"):
+        # a1-a3 queue before b1, yet b1 is not stuck behind all of a's runs.
+        for user in ["a", "a", "a", "b"]:
+            queued = len(scheduler._queue)
+            thread = threading.Thread(target=run, args=(user,))
+            thread.start()
+            threads.append(thread)
+            while len(scheduler._queue) == queued:
+                time.sleep(0.001)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert admitted == ["a", "b", "a", "a"]
+
+
+def test_sheds_when_the_queue_is_full():
+    scheduler = _scheduler()
+    scheduler.max_queue = 0
+    with scheduler.llm_slot("holder"):
+        with pytest.raises(SchedulerBusy):
+            with scheduler.llm_slot("other"):
+                pass
+    assert scheduler.get_stats()["shed"]["queue_full"] == 1